@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+"""
+Time decoding a large GitHub repos payload: response.json() (get_json as
+it was: bytes to text, then the stdlib json), the stdlib json from bytes,
+utils.loads with the installed backend, and utils.loads keeping only the
+fields GithubOrgClient reads. Also measure the memory each result holds
+and the peak while decoding.
+
+Run from the project directory:
+    python benchmarks/json_decode.py [repos]
+"""
+import json
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import requests
+
+from client import GithubOrgClient
+from utils import JSON_BACKEND, loads
+
+URL_KEYS = [
+    "url", "html_url", "forks_url", "keys_url", "collaborators_url",
+    "teams_url", "hooks_url", "issue_events_url", "events_url",
+    "assignees_url", "branches_url", "tags_url", "blobs_url", "git_tags_url",
+    "git_refs_url", "trees_url", "statuses_url", "languages_url",
+    "stargazers_url", "contributors_url", "subscribers_url",
+    "subscription_url", "commits_url", "git_commits_url", "comments_url",
+    "issue_comment_url", "contents_url", "compare_url", "merges_url",
+    "archive_url", "downloads_url", "issues_url", "pulls_url",
+    "milestones_url", "notifications_url", "labels_url", "releases_url",
+    "deployments_url", "git_url", "ssh_url", "clone_url", "svn_url",
+]
+
+
+def repo(i):
+    """
+    A repo shaped like those of the GitHub API
+    """
+    name = f"repo-{i}"
+    base = f"https://api.github.com/repos/google/{name}"
+    payload = {
+        "id": 1000000 + i,
+        "node_id": f"MDEwOlJlcG9zaXRvcnk{i:08d}",
+        "name": name,
+        "full_name": f"google/{name}",
+        "private": False,
+        "owner": {
+            "login": "google", "id": 1342004, "node_id": "MDEyOk9yZ2FuaXph",
+            "avatar_url": "https://avatars.githubusercontent.com/u/1342004",
+            "gravatar_id": "", "url": "https://api.github.com/users/google",
+            "html_url": "https://github.com/google", "type": "Organization",
+            "site_admin": False,
+        },
+        "description": f"Description of {name}, an example repository.",
+        "fork": i % 7 == 0,
+        "created_at": "2012-06-11T04:25:58Z",
+        "updated_at": "2024-01-12T10:30:01Z",
+        "pushed_at": "2024-01-10T23:17:45Z",
+        "homepage": None,
+        "size": 1234 + i,
+        "stargazers_count": i * 3,
+        "watchers_count": i * 3,
+        "language": "Python",
+        "has_issues": True,
+        "has_wiki": True,
+        "forks_count": i,
+        "open_issues_count": i % 50,
+        "topics": ["example", "benchmark", f"topic-{i % 10}"],
+        "visibility": "public",
+        "default_branch": "main",
+        "permissions": {"admin": False, "push": False, "pull": True},
+        "license": None if i % 5 == 0 else {
+            "key": "apache-2.0", "name": "Apache License 2.0",
+            "spdx_id": "Apache-2.0",
+            "url": "https://api.github.com/licenses/apache-2.0",
+            "node_id": "MDc6TGljZW5zZTI=",
+        },
+    }
+    payload.update((key, f"{base}/{key[:-4]}") for key in URL_KEYS)
+    return payload
+
+
+def measure(decode):
+    """
+    Seconds to decode (best of 3), bytes the result holds, and bytes at
+    the peak of decoding
+    """
+    best = None
+    for _ in range(3):
+        start = time.perf_counter()
+        decode()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    tracemalloc.start()
+    result = decode()
+    held, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del result
+    return best, held, peak
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    body = json.dumps([repo(i) for i in range(count)]).encode()
+    response = requests.Response()
+    response.status_code = 200
+    response.headers["Content-Type"] = "application/json; charset=utf-8"
+    response._content = body
+    fields = GithubOrgClient.REPO_FIELDS
+    print(f"{count} repos, {len(body) / 2 ** 20:.1f} MiB of JSON, "
+          f"backend {JSON_BACKEND}")
+    expected = [
+        [repo.get("name") for repo in payload
+         if GithubOrgClient.has_license(repo, "apache-2.0")]
+        for payload in [json.loads(body)]
+    ]
+    for label, decode in [
+        ("response.json()", response.json),
+        ("json.loads(bytes)", lambda: json.loads(body)),
+        (f"loads, {JSON_BACKEND}", lambda: loads(body)),
+        (f"loads, {JSON_BACKEND}, fields", lambda: loads(body, fields)),
+    ]:
+        payload = decode()
+        assert [
+            [repo.get("name") for repo in payload
+             if GithubOrgClient.has_license(repo, "apache-2.0")]
+        ] == expected
+        del payload
+        elapsed, held, peak = measure(decode)
+        print(f"  {label:26} {elapsed * 1000:8.1f} ms  "
+              f"holds {held / 2 ** 20:7.1f} MiB  peak {peak / 2 ** 20:7.1f} MiB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""
+Time utils.memoize against the decorator it replaced (a dict shared by
+every instance, keyed on str(args) + str(kwargs)) on cache hits, and
+count the wrong results each returns, and what each still holds, after
+many short-lived instances.
+
+Run from the project directory:
+    python benchmarks/memoize.py [instances]
+"""
+import gc
+import os
+import sys
+import timeit
+from functools import wraps
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils import memoize
+
+
+def memoize_unbounded(func):
+    """
+    The decorator utils.memoize replaced
+    """
+    cache = {}
+
+    @wraps(func)
+    def memoized_func(*args, **kwargs):
+        key = str(args) + str(kwargs)
+        if key not in cache:
+            cache[key] = func(*args, **kwargs)
+        return cache[key]
+    memoized_func.cache = cache
+    return memoized_func
+
+
+class Old:
+    """
+    A client memoized the old way
+    """
+    def __init__(self, name):
+        self.name = name
+
+    @property
+    @memoize_unbounded
+    def org(self):
+        return {"login": self.name}
+
+    @memoize_unbounded
+    def public_repos(self, license=None):
+        return [self.name, license]
+
+
+class New:
+    """
+    A client memoized with utils.memoize
+    """
+    def __init__(self, name):
+        self.name = name
+
+    @memoize
+    def org(self):
+        return {"login": self.name}
+
+    @memoize
+    def public_repos(self, license=None):
+        return [self.name, license]
+
+
+def main():
+    instances = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    print("cache hit, ns per call")
+    for label, cls in [("str(args) dict", Old), ("utils.memoize", New)]:
+        client = cls("google")
+        client.org
+        client.public_repos("mit")
+        for name, run in [
+            ("property", lambda: client.org),
+            ("method(arg)", lambda: client.public_repos("mit")),
+        ]:
+            number = 200000
+            best = min(timeit.repeat(run, number=number, repeat=5))
+            print(f"  {label:16} {name:12} {best / number * 1e9:8.0f}")
+    del client
+    print(f"{instances} instances, each used once and dropped:")
+    for label, cls, cached in [
+        ("str(args) dict", Old, lambda: len(Old.public_repos.cache)),
+        ("utils.memoize", New,
+         lambda: New.public_repos.cache_info().currsize),
+    ]:
+        # A new instance can reuse a dropped one's address, and so its
+        # repr and its str(args) key.
+        stale = sum(
+            cls(f"org{i}").public_repos()[0] != f"org{i}"
+            for i in range(instances)
+        )
+        gc.collect()
+        alive = sum(isinstance(obj, cls) for obj in gc.get_objects())
+        print(f"  {label:16} {stale:8} stale results, {cached():8} cached, "
+              f"{alive} instances alive")
+
+if __name__ == "__main__":
+    main()
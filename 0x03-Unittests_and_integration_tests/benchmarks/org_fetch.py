@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+"""
+Time fetching the public repos of many orgs from a local stand-in server
+that answers each request after a fixed latency: one at a time with a new
+connection per request (get_json as it was), one at a time over pooled
+connections, and concurrently with AsyncGithubOrgClient.
+
+Run from the project directory:
+    python benchmarks/org_fetch.py [orgs] [latency_ms]
+"""
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import requests
+
+from client import AsyncGithubOrgClient, GithubOrgClient
+from fake_server import FakeGithubServer
+from utils import get_json
+
+
+def get_json_unpooled(url):
+    """
+    get_json as it was: a new connection and no timeout per call
+    """
+    return requests.get(url).json()
+
+
+def fetch_sequential(org_names, get):
+    """
+    GithubOrgClient.public_repos for each org in turn, through `get`:
+    the org, then its repos
+    """
+    repos = {}
+    for name in org_names:
+        org = get(GithubOrgClient.ORG_URL.format(org=name))
+        repos[name] = [repo.get("name") for repo in get(org["repos_url"])]
+    return repos
+
+
+def main():
+    orgs = int(sys.argv[1]) if len(sys.argv) > 1 else 100
+    latency = (float(sys.argv[2]) if len(sys.argv) > 2 else 20) / 1000
+    with FakeGithubServer(latency=latency) as server:
+        org_names = [f"org{i}" for i in range(orgs)]
+        for name in org_names:
+            server.add_org(name, [
+                {"name": f"{name}-repo{j}", "license": {"key": "mit"}}
+                for j in range(30)
+            ])
+        GithubOrgClient.ORG_URL = AsyncGithubOrgClient.ORG_URL = server.org_url
+        print(f"{orgs} orgs, {latency * 1000:.0f} ms per response")
+        runs = [
+            ("sequential, new connections",
+             lambda: fetch_sequential(org_names, get_json_unpooled)),
+            ("sequential, pooled", lambda: fetch_sequential(org_names, get_json)),
+        ] + [
+            (f"async, {n} at a time", lambda n=n: asyncio.run(
+                AsyncGithubOrgClient.fetch_public_repos(org_names, max_concurrency=n)))
+            for n in (10, 50)
+        ]
+        expected = None
+        for label, run in runs:
+            connections = server.connections
+            start = time.perf_counter()
+            repos = run()
+            elapsed = time.perf_counter() - start
+            expected = expected or repos
+            assert repos == expected
+            print(f"{label:28} {elapsed * 1000:9.1f} ms  "
+                  f"{server.connections - connections:4} connections")
+
+
+if __name__ == "__main__":
+    main()
@@ -2,7 +2,10 @@
 """
 Client module
 """
-from utils import get_json, memoize
+import asyncio
+from utils import (
+    AsyncJSONClient, get_json, iter_json_pages, memoize, prefetch as prefetched
+)
 
 
 class GithubOrgClient:
@@ -10,11 +13,12 @@ class GithubOrgClient:
     Github Org Client
     """
     ORG_URL = "https://api.github.com/orgs/{org}"
+    # All that is read of each repo.
+    REPO_FIELDS = ("name", "license.key")
 
     def __init__(self, org_name):
         self._org_name = org_name
 
-    @property
     @memoize
     def org(self):
         """
@@ -30,16 +34,36 @@ class GithubOrgClient:
         return self.org.get("repos_url")
 
     @memoize
-    def public_repos(self):
+    def public_repos(self, license=None):
         """
-        Public repos
+        Public repos, only those with `license` if given
         """
         repos_url = self._public_repos_url
         if repos_url:
             repos = get_json(repos_url)
-            return [repo.get("name") for repo in repos]
+            return [
+                repo.get("name") for repo in repos
+                if license is None or self.has_license(repo, license)
+            ]
         return []
 
+    def iter_public_repos(self, license=None, prefetch=False):
+        """
+        Yield the names of the public repos, only those with `license` if
+        given, page by page over every page of repos_url. With `prefetch`
+        the next page is fetched while the current one is consumed.
+        """
+        repos_url = self._public_repos_url
+        if not repos_url:
+            return
+        pages = iter_json_pages(repos_url, fields=self.REPO_FIELDS)
+        if prefetch:
+            pages = prefetched(pages)
+        for repos in pages:
+            for repo in repos:
+                if license is None or self.has_license(repo, license):
+                    yield repo.get("name")
+
     @staticmethod
     def has_license(repo, license_key):
         """
@@ -48,4 +72,54 @@ class GithubOrgClient:
         licenses = repo.get("license")
         if licenses and licenses.get("key") == license_key:
             return True
-        return False
\ No newline at end of file
+        return False
+
+
+class AsyncGithubOrgClient:
+    """
+    Github Org Client for asyncio code, sharing an AsyncJSONClient with
+    other clients so many orgs can be fetched at once
+    """
+    ORG_URL = GithubOrgClient.ORG_URL
+    REPO_FIELDS = GithubOrgClient.REPO_FIELDS
+    has_license = staticmethod(GithubOrgClient.has_license)
+
+    def __init__(self, org_name, http):
+        self._org_name = org_name
+        self._http = http
+        self._org = None
+
+    async def org(self):
+        """
+        Get org data, fetched once however many callers wait for it
+        """
+        if self._org is None:
+            self._org = asyncio.ensure_future(
+                self._http.get_json(self.ORG_URL.format(org=self._org_name)))
+        return await self._org
+
+    async def public_repos(self, license=None):
+        """
+        Public repos, only those with `license` if given
+        """
+        repos_url = (await self.org()).get("repos_url")
+        if not repos_url:
+            return []
+        repos = await self._http.get_json(repos_url, self.REPO_FIELDS)
+        return [
+            repo.get("name") for repo in repos
+            if license is None or self.has_license(repo, license)
+        ]
+
+    @classmethod
+    async def fetch_public_repos(cls, org_names, license=None,
+                                 max_concurrency=10):
+        """
+        Public repos of every org in `org_names`, fetched concurrently,
+        as a dict of org name to repo names
+        """
+        async with AsyncJSONClient(max_concurrency) as http:
+            clients = [cls(org_name, http) for org_name in org_names]
+            repos = await asyncio.gather(
+                *(client.public_repos(license) for client in clients))
+        return dict(zip(org_names, repos))
@@ -0,0 +1,181 @@
+#!/usr/bin/env python3
+"""
+A local stand-in for the GitHub API, for tests and benchmarks
+"""
+import hashlib
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class FakeGithubHandler(BaseHTTPRequestHandler):
+    """
+    Serve the JSON payloads of FakeGithubServer.routes over keep-alive
+    HTTP/1.1 connections
+    """
+    protocol_version = "HTTP/1.1"
+    # Headers and body go out in separate writes; with Nagle's algorithm
+    # the body waits on the client's delayed ACK of the headers.
+    disable_nagle_algorithm = True
+
+    def setup(self):
+        super().setup()
+        with self.server.fake.lock:
+            self.server.fake.connections += 1
+
+    def do_GET(self):
+        """
+        Serve a route, or 404
+        """
+        fake = self.server.fake
+        with fake.lock:
+            fake.requests.append(self.path)
+            fake.active += 1
+            fake.max_active = max(fake.max_active, fake.active)
+        try:
+            if fake.latency:
+                time.sleep(fake.latency)
+            if self.path in fake.routes:
+                body = json.dumps(fake.routes[self.path]).encode()
+                headers = {}
+                if self.path in fake.next_pages:
+                    next_url = fake.url(fake.next_pages[self.path])
+                    headers["Link"] = f'<{next_url}>; rel="next"'
+                if fake.etags:
+                    headers["ETag"] = f'"{hashlib.sha1(body).hexdigest()}"'
+                if fake.last_modified:
+                    headers["Last-Modified"] = fake.last_modified
+                if self.is_not_modified(headers):
+                    with fake.lock:
+                        fake.not_modified += 1
+                    self.send_body(304, b"", headers)
+                else:
+                    self.send_body(200, body, headers)
+            else:
+                self.send_json(404, {"message": "Not Found"})
+        finally:
+            with fake.lock:
+                fake.active -= 1
+
+    def is_not_modified(self, headers):
+        """
+        Whether the request's validators match the response `headers`
+        """
+        if "If-None-Match" in self.headers:
+            return self.headers["If-None-Match"] == headers.get("ETag")
+        return (
+            "If-Modified-Since" in self.headers
+            and self.headers["If-Modified-Since"] == headers.get(
+                "Last-Modified"))
+
+    def send_json(self, status, payload, headers=None):
+        """
+        Send `payload` as the JSON body of the response
+        """
+        self.send_body(status, json.dumps(payload).encode(), headers)
+
+    def send_body(self, status, body, headers=None):
+        """
+        Send a JSON response with `body`
+        """
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class FakeGithubServer:
+    """
+    An HTTP server on a free local port serving `routes` (path to JSON
+    payload), each response delayed by `latency` seconds, with a Link
+    rel="next" header on the paths in `next_pages`. Responses carry an
+    ETag (unless `etags` is false) and `last_modified` if set, and
+    conditional requests matching them get a 304. Records the paths
+    requested, the number of connections opened, the most requests served
+    at once and the number of 304s.
+    """
+    handler_class = FakeGithubHandler
+
+    def __init__(self, routes=None, latency=0, etags=True,
+                 last_modified=None):
+        self.routes = dict(routes or {})
+        self.latency = latency
+        self.etags = etags
+        self.last_modified = last_modified
+        self.not_modified = 0
+        self.next_pages = {}
+        self.requests = []
+        self.connections = 0
+        self.active = 0
+        self.max_active = 0
+        self.lock = threading.Lock()
+        self._httpd = None
+
+    @property
+    def base_url(self):
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def url(self, path):
+        """
+        The absolute URL of `path` on this server
+        """
+        return self.base_url + path
+
+    @property
+    def org_url(self):
+        """
+        A GithubOrgClient.ORG_URL pointing at this server
+        """
+        return self.url("/orgs/{org}")
+
+    def add_org(self, org_name, repos):
+        """
+        Serve an org whose repos_url lists `repos`
+        """
+        repos_path = f"/orgs/{org_name}/repos"
+        self.routes[f"/orgs/{org_name}"] = {
+            "login": org_name, "repos_url": self.url(repos_path)}
+        self.routes[repos_path] = repos
+
+    def add_pages(self, path, pages):
+        """
+        Serve `pages` as one list paginated like the GitHub API: the first
+        at `path`, the rest at `path?page=2` and on, each linking the next
+        """
+        paths = [path] + [
+            f"{path}?page={number}" for number in range(2, len(pages) + 1)]
+        for page_path, page in zip(paths, pages):
+            self.routes[page_path] = page
+        self.next_pages.update(zip(paths, paths[1:]))
+
+    def start(self):
+        """
+        Start serving from a background thread
+        """
+        self._httpd = ThreadingHTTPServer(
+            ("127.0.0.1", 0), self.handler_class)
+        self._httpd.daemon_threads = True
+        self._httpd.fake = self
+        threading.Thread(target=self._httpd.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        """
+        Stop serving
+        """
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
@@ -13,4 +13,22 @@ repos_payload = [
 
 expected_repos = ["repo1", "repo2"]
 
-apache2_repos = ["repo1"]
\ No newline at end of file
+apache2_repos = ["repo1"]
+
+paged_repos_payload = [
+    [
+        {"name": "repo1", "license": {"key": "apache-2.0"}},
+        {"name": "repo2", "license": {"key": "mit"}},
+    ],
+    [
+        {"name": "repo3", "license": None},
+        {"name": "repo4", "license": {"key": "apache-2.0"}},
+    ],
+    [
+        {"name": "repo5", "license": {"key": "bsd-3-clause"}},
+    ],
+]
+
+expected_paged_repos = ["repo1", "repo2", "repo3", "repo4", "repo5"]
+
+apache2_paged_repos = ["repo1", "repo4"]
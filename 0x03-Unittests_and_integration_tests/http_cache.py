@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+"""
+An on-disk cache of HTTP responses, revalidated with conditional requests
+"""
+import hashlib
+import json
+import os
+import tempfile
+import requests
+
+VALIDATORS = {"ETag": "If-None-Match", "Last-Modified": "If-Modified-Since"}
+KEPT_HEADERS = ("ETag", "Last-Modified", "Link", "Content-Type")
+
+
+class HTTPCache:
+    """
+    Keep the body of each 200 response carrying an ETag or Last-Modified
+    in `directory`, one file per URL. Later GETs of the URL send them as
+    If-None-Match / If-Modified-Since, and a 304 answer is served from the
+    file. When the files take more than `max_size` bytes, the least
+    recently used are deleted. Their total size is tracked as responses
+    are stored, so the directory is only scanned when it may be over the
+    limit; files written by other processes count from the next scan.
+    """
+
+    def __init__(self, directory, max_size=50 * 1024 * 1024):
+        self.directory = directory
+        self.max_size = max_size
+        self.size = None  # bytes cached, unknown until the first scan
+        os.makedirs(directory, exist_ok=True)
+
+    def path(self, url):
+        """
+        The file caching `url`
+        """
+        name = hashlib.sha256(url.encode()).hexdigest()
+        return os.path.join(self.directory, name + ".cache")
+
+    def get(self, session, url, timeout=None):
+        """
+        GET `url` with `session`, conditionally if it is cached. A 304
+        comes back as the cached 200 response.
+        """
+        cached = self.load(url)
+        headers = {}
+        if cached is not None:
+            headers = {
+                VALIDATORS[name]: value
+                for name, value in cached.headers.items()
+                if name in VALIDATORS
+            }
+        response = session.get(url, headers=headers, timeout=timeout)
+        if response.status_code == 304 and cached is not None:
+            try:
+                os.utime(self.path(url))
+            except OSError:
+                # Evicted or replaced since load(); the copy in hand is
+                # still the one the server validated.
+                pass
+            return cached
+        if response.status_code == 200 and any(
+                name in response.headers for name in VALIDATORS):
+            self.store(url, response)
+        return response
+
+    def load(self, url):
+        """
+        The cached response for `url`, or None
+        """
+        try:
+            with open(self.path(url), "rb") as file:
+                meta = json.loads(file.readline())
+                body = file.read()
+        except (OSError, ValueError):
+            return None
+        response = requests.Response()
+        response.url = url
+        response.status_code = 200
+        response.headers.update(meta["headers"])
+        response._content = body
+        return response
+
+    def store(self, url, response):
+        """
+        Cache `response` for `url`, then evict down to max_size if the
+        cache may have outgrown it
+        """
+        meta = {
+            "url": url,
+            "headers": {
+                name: response.headers[name]
+                for name in KEPT_HEADERS if name in response.headers
+            },
+        }
+        path = self.path(url)
+        try:
+            replaced = os.stat(path).st_size
+        except OSError:
+            replaced = 0
+        fd, tmp = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as file:
+                file.write(json.dumps(meta).encode() + b"\n")
+                file.write(response.content)
+                written = file.tell()
+            os.replace(tmp, path)
+        except BaseException:
+            os.unlink(tmp)
+            raise
+        if self.size is None or (
+                self.size + written - replaced > self.max_size):
+            self.evict()
+        else:
+            self.size += written - replaced
+
+    def evict(self):
+        """
+        Delete least recently used files until the rest fit in max_size
+        """
+        entries = []
+        with os.scandir(self.directory) as scan:
+            for entry in scan:
+                if entry.name.endswith(".cache"):
+                    stat = entry.stat()
+                    entries.append((stat.st_mtime, stat.st_size, entry.path))
+        size = sum(entry_size for _, entry_size, _ in entries)
+        for _, entry_size, path in sorted(entries):
+            if size <= self.max_size:
+                break
+            try:
+                os.unlink(path)
+            except FileNotFoundError:
+                pass
+            size -= entry_size
+        self.size = size
+
+    def clear(self):
+        """
+        Delete every cached response
+        """
+        with os.scandir(self.directory) as scan:
+            for entry in scan:
+                if entry.name.endswith(".cache"):
+                    os.unlink(entry.path)
+        self.size = 0
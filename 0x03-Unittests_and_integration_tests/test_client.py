@@ -2,10 +2,18 @@
 """
 Test client
 """
+import asyncio
+import json
+import time
 import unittest
 from parameterized import parameterized, parameterized_class
 from unittest.mock import patch, PropertyMock, Mock
-from client import GithubOrgClient
+from client import AsyncGithubOrgClient, GithubOrgClient
+from fake_server import FakeGithubServer
+from fixtures import (
+    apache2_paged_repos, expected_paged_repos, paged_repos_payload
+)
+from utils import AsyncJSONClient
 
 
 class TestGithubOrgClient(unittest.TestCase):
@@ -80,15 +88,16 @@ class TestIntegrationGithubOrgClient(unittest.TestCase):
     @classmethod
     def setUpClass(cls):
         """Set up class fixtures."""
-        cls.get_patcher = patch('requests.get')
+        cls.get_patcher = patch('requests.Session.get')
         cls.mock_get = cls.get_patcher.start()
 
-        def side_effect(url):
-            """Side effect function for mocking requests.get."""
+        def side_effect(url, **kwargs):
+            """Side effect function for mocking Session.get."""
             if '/orgs/' in url and '/repos' not in url:
-                return Mock(json=lambda: cls.org_payload)
+                payload = cls.org_payload
             else:
-                return Mock(json=lambda: cls.repos_payload)
+                payload = cls.repos_payload
+            return Mock(content=json.dumps(payload).encode())
 
         cls.mock_get.side_effect = side_effect
 
@@ -110,3 +119,107 @@ class TestIntegrationGithubOrgClient(unittest.TestCase):
             if client.has_license(repo, "apache-2.0")
         ]
         self.assertEqual(apache_repos, self.apache2_repos)
+        self.assertEqual(client.public_repos(license="apache-2.0"),
+                         self.apache2_repos)
+
+
+class TestIterPublicRepos(unittest.TestCase):
+    """
+    Test GithubOrgClient.iter_public_repos against paginated repos
+    """
+    def setUp(self):
+        """Serve the repos in pages."""
+        self.server = FakeGithubServer().start()
+        self.addCleanup(self.server.stop)
+        self.server.add_pages("/orgs/google/repos", paged_repos_payload)
+        patcher = patch('client.GithubOrgClient._public_repos_url',
+                        new_callable=PropertyMock,
+                        return_value=self.server.url("/orgs/google/repos"))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    @parameterized.expand([
+        (None, False, expected_paged_repos),
+        (None, True, expected_paged_repos),
+        ("apache-2.0", False, apache2_paged_repos),
+        ("apache-2.0", True, apache2_paged_repos),
+    ])
+    def test_iter_public_repos(self, license, prefetch, expected):
+        """Test every page is followed, and repos filtered by license."""
+        client = GithubOrgClient("google")
+        repos = client.iter_public_repos(license, prefetch=prefetch)
+        self.assertEqual(list(repos), expected)
+        self.assertEqual(len(self.server.requests), len(paged_repos_payload))
+
+    def test_pages_are_fetched_lazily(self):
+        """Test a page is only fetched once the previous one is consumed."""
+        repos = GithubOrgClient("google").iter_public_repos()
+        self.assertEqual(next(repos), "repo1")
+        self.assertEqual(self.server.requests, ["/orgs/google/repos"])
+        self.assertEqual([next(repos), next(repos)], ["repo2", "repo3"])
+        self.assertEqual(len(self.server.requests), 2)
+
+    def test_prefetch_fetches_next_page(self):
+        """Test prefetch fetches one page ahead of the consumer."""
+        repos = GithubOrgClient("google").iter_public_repos(prefetch=True)
+        self.assertEqual(next(repos), "repo1")
+        deadline = time.monotonic() + 5
+        while len(self.server.requests) < 2 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        self.assertEqual(self.server.requests, [
+            "/orgs/google/repos", "/orgs/google/repos?page=2"])
+        repos.close()
+
+    @patch('client.GithubOrgClient._public_repos_url',
+           new_callable=PropertyMock, return_value=None)
+    def test_no_repos_url(self, mock_public_repos_url):
+        """Test an org without repos_url has no repos."""
+        client = GithubOrgClient("google")
+        self.assertEqual(list(client.iter_public_repos()), [])
+        self.assertEqual(self.server.requests, [])
+
+
+class TestAsyncGithubOrgClient(unittest.TestCase):
+    """
+    Test AsyncGithubOrgClient against a local stand-in server
+    """
+    def setUp(self):
+        """Serve three orgs."""
+        self.server = FakeGithubServer(latency=0.01).start()
+        self.addCleanup(self.server.stop)
+        for i in range(3):
+            self.server.add_org(f"org{i}", [
+                {"name": f"repo{i}a", "license": {"key": "apache-2.0"}},
+                {"name": f"repo{i}b", "license": None},
+            ])
+        patcher = patch.object(
+            AsyncGithubOrgClient, "ORG_URL", self.server.org_url)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_fetch_public_repos(self):
+        """Test repos of many orgs are fetched, and filtered by license."""
+        repos = asyncio.run(AsyncGithubOrgClient.fetch_public_repos(
+            ["org0", "org1", "org2"], max_concurrency=3))
+        self.assertEqual(repos["org1"], ["repo1a", "repo1b"])
+        licensed = asyncio.run(AsyncGithubOrgClient.fetch_public_repos(
+            ["org0", "org2"], license="apache-2.0"))
+        self.assertEqual(licensed, {"org0": ["repo0a"], "org2": ["repo2a"]})
+
+    def test_org_is_fetched_once(self):
+        """Test concurrent callers share one org request."""
+        async def run():
+            async with AsyncJSONClient() as http:
+                client = AsyncGithubOrgClient("org0", http)
+                return await asyncio.gather(
+                    client.org(), client.org(), client.public_repos())
+
+        org, again, repos = asyncio.run(run())
+        self.assertIs(org, again)
+        self.assertEqual(repos, ["repo0a", "repo0b"])
+        self.assertEqual(self.server.requests.count("/orgs/org0"), 1)
+
+    def test_missing_org(self):
+        """Test an org without repos_url has no repos."""
+        repos = asyncio.run(AsyncGithubOrgClient.fetch_public_repos(["nope"]))
+        self.assertEqual(repos, {"nope": []})
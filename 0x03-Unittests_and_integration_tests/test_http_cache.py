@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+"""
+Test http_cache
+"""
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+import utils
+from fake_server import FakeGithubServer
+from fixtures import expected_paged_repos, paged_repos_payload
+from http_cache import HTTPCache
+from utils import get_json, iter_json_pages
+
+
+class TestHTTPCache(unittest.TestCase):
+    """
+    Test HTTPCache through get_json against a local stand-in server
+    """
+    def setUp(self):
+        """Serve an org, and cache responses in a temporary directory."""
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.directory = tmp.name
+        self.server = FakeGithubServer().start()
+        self.addCleanup(self.server.stop)
+        self.server.add_org("google", [{"name": "repo1"}])
+        self.url = self.server.url("/orgs/google/repos")
+        self.use_cache(HTTPCache(self.directory))
+
+    def use_cache(self, cache):
+        """Make get_json go through `cache`."""
+        patcher = patch.object(utils, "http_cache", cache)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        return cache
+
+    def test_not_modified_is_served_from_disk(self):
+        """Test a repeated request is revalidated and answered from disk."""
+        self.assertEqual(get_json(self.url), [{"name": "repo1"}])
+        self.assertEqual(get_json(self.url), [{"name": "repo1"}])
+        self.assertEqual(len(self.server.requests), 2)
+        self.assertEqual(self.server.not_modified, 1)
+
+    def test_not_modified_after_eviction(self):
+        """Test a 304 is served even if the file went after it was read."""
+        get_json(self.url)
+        with patch("http_cache.os.utime", side_effect=FileNotFoundError):
+            self.assertEqual(get_json(self.url), [{"name": "repo1"}])
+        self.assertEqual(self.server.not_modified, 1)
+
+    def test_modified_is_downloaded_again(self):
+        """Test a changed resource replaces the cached one."""
+        get_json(self.url)
+        self.server.routes["/orgs/google/repos"] = [{"name": "repo2"}]
+        self.assertEqual(get_json(self.url), [{"name": "repo2"}])
+        self.assertEqual(get_json(self.url), [{"name": "repo2"}])
+        self.assertEqual(self.server.not_modified, 1)
+
+    def test_last_modified(self):
+        """Test Last-Modified is used when there is no ETag."""
+        self.server.etags = False
+        self.server.last_modified = "Mon, 01 Jan 2024 00:00:00 GMT"
+        get_json(self.url)
+        self.assertEqual(get_json(self.url), [{"name": "repo1"}])
+        self.assertEqual(self.server.not_modified, 1)
+        self.server.last_modified = "Tue, 02 Jan 2024 00:00:00 GMT"
+        self.server.routes["/orgs/google/repos"] = [{"name": "repo2"}]
+        self.assertEqual(get_json(self.url), [{"name": "repo2"}])
+        self.assertEqual(self.server.not_modified, 1)
+
+    def test_cache_persists(self):
+        """Test a new cache over the same directory reuses the responses."""
+        get_json(self.url)
+        self.use_cache(HTTPCache(self.directory))
+        self.assertEqual(get_json(self.url), [{"name": "repo1"}])
+        self.assertEqual(self.server.not_modified, 1)
+
+    def test_uncacheable_responses(self):
+        """Test responses without validators, and errors, are not kept."""
+        self.server.etags = False
+        get_json(self.url)
+        self.server.etags = True
+        get_json(self.server.url("/orgs/missing"))
+        self.assertEqual(os.listdir(self.directory), [])
+
+    def test_pages_keep_links(self):
+        """Test pages answered from disk still link to the next page."""
+        self.server.add_pages("/orgs/google/repos", paged_repos_payload)
+        for _ in range(2):
+            names = [
+                repo["name"]
+                for page in iter_json_pages(self.url) for repo in page
+            ]
+            self.assertEqual(names, expected_paged_repos)
+        self.assertEqual(self.server.not_modified, len(paged_repos_payload))
+
+    def test_least_recently_used_are_evicted(self):
+        """Test the cache is kept under max_size, oldest use out first."""
+        cache = HTTPCache(self.directory)
+        for name in ("a", "b", "c"):
+            self.server.add_org(name, [{"name": name * 100}])
+            get_json(self.server.url(f"/orgs/{name}/repos"))
+        paths = {
+            name: cache.path(self.server.url(f"/orgs/{name}/repos"))
+            for name in ("a", "b", "c")
+        }
+        entry_size = os.path.getsize(paths["a"])
+        os.utime(paths["a"], (1000, 1000))
+        os.utime(paths["b"], (3000, 3000))
+        os.utime(paths["c"], (2000, 2000))
+        cache.max_size = 2 * entry_size
+        cache.evict()
+        self.assertFalse(os.path.exists(paths["a"]))
+        self.assertTrue(os.path.exists(paths["b"]))
+        self.assertTrue(os.path.exists(paths["c"]))
+
+    def test_evicts_only_past_max_size(self):
+        """Test stores under max_size do not scan the directory."""
+        cache = self.use_cache(HTTPCache(self.directory))
+        for name in ("a", "b", "c", "d"):
+            self.server.add_org(name, [{"name": name * 100}])
+        get_json(self.server.url("/orgs/a/repos"))
+        entry_size = cache.size
+        cache.max_size = 3 * entry_size
+        with patch.object(cache, "evict", wraps=cache.evict) as evict:
+            get_json(self.server.url("/orgs/b/repos"))
+            get_json(self.server.url("/orgs/c/repos"))
+            self.assertEqual(evict.call_count, 0)
+            get_json(self.server.url("/orgs/d/repos"))
+            self.assertEqual(evict.call_count, 1)
+        self.assertEqual(cache.size, 3 * entry_size)
+        self.assertEqual(len(os.listdir(self.directory)), 3)
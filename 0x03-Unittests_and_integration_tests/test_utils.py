@@ -2,10 +2,20 @@
 """
 Test utils
 """
+import asyncio
+import gc
+import json
+import threading
+import time
 import unittest
+import weakref
 from parameterized import parameterized
 from unittest.mock import patch, Mock
-from utils import access_nested_map, get_json, memoize
+from fake_server import FakeGithubServer
+from utils import (
+    DEFAULT_TIMEOUT, JSON_BACKEND, AsyncJSONClient, CacheInfo,
+    access_nested_map, get_json, loads, memoize, project
+)
 
 
 class TestAccessNestedMap(unittest.TestCase):
@@ -40,16 +50,117 @@ class TestGetJson(unittest.TestCase):
         ("http://example.com", {"payload": True}),
         ("http://holberton.io", {"payload": False}),
     ])
-    @patch('utils.requests.get')
-    def test_get_json(self, test_url, test_payload, mock_get):
+    @patch('utils.get_session')
+    def test_get_json(self, test_url, test_payload, mock_get_session):
         """Test get_json returns expected payload."""
-        mock_response = Mock()
-        mock_response.json.return_value = test_payload
+        mock_response = Mock(content=json.dumps(test_payload).encode())
+        mock_get = mock_get_session.return_value.get
         mock_get.return_value = mock_response
         result = get_json(test_url)
-        mock_get.assert_called_once_with(test_url)
+        mock_get.assert_called_once_with(test_url, timeout=DEFAULT_TIMEOUT)
         self.assertEqual(result, test_payload)
 
+    def test_get_json_reuses_connections(self):
+        """Test get_json keeps its connection alive between calls."""
+        with FakeGithubServer({"/a": {"a": 1}, "/b": [2]}) as server:
+            self.assertEqual(get_json(server.url("/a")), {"a": 1})
+            self.assertEqual(get_json(server.url("/b")), [2])
+            self.assertEqual(get_json(server.url("/a")), {"a": 1})
+            self.assertEqual(server.connections, 1)
+
+
+class TestLoads(unittest.TestCase):
+    """
+    Test loads and project
+    """
+    def test_loads(self):
+        """Test JSON is decoded from bytes."""
+        self.assertIn(JSON_BACKEND, ("orjson", "ujson", "json"))
+        self.assertEqual(loads('{"a": ["\u00e9", 1.5, null]}'.encode()),
+                         {"a": ["\u00e9", 1.5, None]})
+
+    @parameterized.expand([
+        ({"name": "a", "id": 1}, ("name",), {"name": "a"}),
+        ({"id": 1}, ("name",), {}),
+        (
+            {"name": "a", "license": {"key": "mit", "url": "x"}},
+            ("name", "license.key"),
+            {"name": "a", "license": {"key": "mit"}},
+        ),
+        (
+            {"name": "a", "license": None},
+            ("name", "license.key"),
+            {"name": "a", "license": None},
+        ),
+        (
+            {"owner": {"login": "g", "id": 2}},
+            ("owner.login",),
+            {"owner": {"login": "g"}},
+        ),
+        (
+            {"owner": {"login": "g", "id": 2}},
+            ("owner", "owner.login"),
+            {"owner": {"login": "g", "id": 2}},
+        ),
+        (
+            [{"name": "a", "id": 1}, {"name": "b", "id": 2}],
+            ("name",),
+            [{"name": "a"}, {"name": "b"}],
+        ),
+    ])
+    def test_project(self, payload, fields, expected):
+        """Test only the given fields are kept."""
+        self.assertEqual(project(payload, fields), expected)
+        self.assertEqual(
+            loads(json.dumps(payload).encode(), fields), expected)
+
+
+class TestAsyncJSONClient(unittest.TestCase):
+    """
+    Test AsyncJSONClient
+    """
+    def test_concurrency_is_bounded(self):
+        """Test requests overlap, but never more than max_concurrency."""
+        routes = {f"/{i}": {"n": i} for i in range(12)}
+        with FakeGithubServer(routes, latency=0.05) as server:
+            async def fetch_all():
+                async with AsyncJSONClient(max_concurrency=4) as http:
+                    return await asyncio.gather(
+                        *(http.get_json(server.url(path)) for path in routes))
+
+            results = asyncio.run(fetch_all())
+            self.assertEqual(results, list(routes.values()))
+            self.assertLessEqual(server.max_active, 4)
+            self.assertGreater(server.max_active, 1)
+            self.assertLessEqual(server.connections, 4)
+
+    def test_close_does_not_block_the_loop(self):
+        """Test closing waits off the loop, then closes worker sessions."""
+        with FakeGithubServer({"/a": {"a": 1}}, latency=0.2) as server:
+            async def run():
+                ticks = 0
+
+                async def tick():
+                    nonlocal ticks
+                    while True:
+                        ticks += 1
+                        await asyncio.sleep(0.01)
+
+                http = AsyncJSONClient(max_concurrency=2)
+                request = asyncio.ensure_future(
+                    http.get_json(server.url("/a")))
+                await asyncio.sleep(0.05)
+                ticker = asyncio.ensure_future(tick())
+                with patch("requests.Session.close") as close:
+                    await http.aclose()
+                ticker.cancel()
+                return await request, ticks, close.call_count
+
+            result, ticks, closed = asyncio.run(run())
+            self.assertEqual(result, {"a": 1})
+            self.assertGreater(ticks, 3)
+            self.assertEqual(closed, 1)
+
 
 class TestMemoize(unittest.TestCase):
     """
@@ -73,3 +184,158 @@ class TestMemoize(unittest.TestCase):
             self.assertEqual(result1, 42)
             self.assertEqual(result2, 42)
             mock_method.assert_called_once()
+
+    def test_memoize_method_arguments(self):
+        """Test methods with arguments are cached per instance and args."""
+        calls = []
+
+        class TestClass:
+            @memoize
+            def double(self, x, scale=2):
+                calls.append((self, x, scale))
+                return x * scale
+
+        first, second = TestClass(), TestClass()
+        self.assertEqual(first.double(3), 6)
+        self.assertEqual(first.double(3), 6)
+        self.assertEqual(first.double(3, scale=3), 9)
+        self.assertEqual(second.double(3), 6)
+        self.assertEqual(len(calls), 3)
+        self.assertEqual(TestClass.double.cache_info(),
+                         CacheInfo(hits=1, misses=3, maxsize=128, currsize=3))
+
+    def test_memoize_lru_bound(self):
+        """Test the least recently used result is evicted first."""
+        @memoize(maxsize=2)
+        def square(x):
+            return x * x
+
+        square(1)
+        square(2)
+        square(1)
+        square(3)
+        square(1)
+        square(2)
+        self.assertEqual(square.cache_info(),
+                         CacheInfo(hits=2, misses=4, maxsize=2, currsize=2))
+
+    def test_memoize_ttl(self):
+        """Test results expire after ttl seconds."""
+        now = [100.0]
+        values = iter(range(10))
+
+        @memoize(ttl=5)
+        def next_value():
+            return next(values)
+
+        next_value.timer = lambda: now[0]
+        self.assertEqual(next_value(), 0)
+        now[0] += 4
+        self.assertEqual(next_value(), 0)
+        now[0] += 2
+        self.assertEqual(next_value(), 1)
+
+    def test_memoize_ttl_purges_expired(self):
+        """Test expired results are dropped without a maxsize."""
+        now = [100.0]
+
+        @memoize(maxsize=None, ttl=5)
+        def square(x):
+            return x * x
+
+        square.timer = lambda: now[0]
+        for x in range(3):
+            square(x)
+        now[0] += 6
+        square(3)
+        self.assertEqual(square.cache_info().currsize, 1)
+
+    def test_memoize_releases_instances(self):
+        """Test the cache neither keeps instances alive nor outlives them."""
+        class TestClass:
+            @memoize
+            def value(self):
+                return object()
+
+        instance = TestClass()
+        instance.value
+        ref = weakref.ref(instance)
+        del instance
+        gc.collect()
+        self.assertIsNone(ref())
+        self.assertEqual(TestClass.value.cache_info().currsize, 0)
+
+    def test_memoize_single_flight(self):
+        """Test concurrent misses on one key share one call."""
+        calls = []
+        results = []
+
+        @memoize
+        def slow(x):
+            calls.append(x)
+            time.sleep(0.05)
+            return x + 1
+
+        threads = [
+            threading.Thread(target=lambda: results.append(slow(1)))
+            for _ in range(8)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(calls, [1])
+        self.assertEqual(results, [2] * 8)
+
+    def test_memoize_does_not_cache_exceptions(self):
+        """Test a call that raised is made again."""
+        outcomes = iter([ValueError("boom"), 42])
+
+        @memoize
+        def flaky():
+            outcome = next(outcomes)
+            if isinstance(outcome, Exception):
+                raise outcome
+            return outcome
+
+        with self.assertRaises(ValueError):
+            flaky()
+        self.assertEqual(flaky(), 42)
+        self.assertEqual(flaky(), 42)
+
+    def test_memoize_explicit_method(self):
+        """Test property=False keeps a self-only method callable."""
+        class TestClass:
+            calls = 0
+
+            @memoize(property=False)
+            def refresh(self):
+                """Refresh."""
+                TestClass.calls += 1
+                return TestClass.calls
+
+        instance = TestClass()
+        self.assertEqual(instance.refresh(), 1)
+        self.assertEqual(instance.refresh(), 1)
+        self.assertEqual(instance.refresh.__name__, "refresh")
+        self.assertEqual(instance.refresh.__doc__, "Refresh.")
+        self.assertIs(instance.refresh.__self__, instance)
+
+    def test_memoize_slots(self):
+        """Test instances without weak references are cached too."""
+        class TestClass:
+            __slots__ = ("value",)
+
+            def __init__(self, value):
+                self.value = value
+
+            @memoize
+            def doubled(self):
+                return self.value * 2
+
+        instance = TestClass(21)
+        self.assertEqual(instance.doubled, 42)
+        self.assertEqual(instance.doubled, 42)
+        self.assertEqual(TestClass.doubled.cache_info().hits, 1)
+        TestClass.doubled.cache_clear(instance)
+        self.assertEqual(TestClass.doubled.cache_info().currsize, 0)
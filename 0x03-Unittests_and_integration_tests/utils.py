@@ -2,8 +2,38 @@
 """
 Utils module
 """
+import asyncio
+import inspect
+import threading
+import time
+import weakref
 import requests
-from functools import wraps
+from collections import OrderedDict, namedtuple
+from concurrent.futures import Future, ThreadPoolExecutor
+from functools import lru_cache, partial, update_wrapper
+from types import MethodType
+
+# Decode JSON straight from response bytes with the fastest parser
+# installed.
+try:
+    from orjson import loads as _loads
+    JSON_BACKEND = "orjson"
+except ImportError:
+    try:
+        from ujson import loads as _loads
+        JSON_BACKEND = "ujson"
+    except ImportError:
+        from json import loads as _loads
+        JSON_BACKEND = "json"
+
+DEFAULT_TIMEOUT = 10
+
+# An http_cache.HTTPCache for get_json to revalidate responses against
+# instead of downloading them again, or None.
+http_cache = None
+
+_local = threading.local()
+_DONE = object()
 
 
 def access_nested_map(nested_map, path):
@@ -17,23 +47,356 @@ def access_nested_map(nested_map, path):
     return nested_map
 
 
-def get_json(url):
+def get_session():
+    """
+    Get this thread's requests.Session, whose connection pool keeps
+    connections alive between calls
+    """
+    session = getattr(_local, "session", None)
+    if session is None:
+        session = _local.session = requests.Session()
+    return session
+
+
+def loads(data, fields=None):
+    """
+    Decode JSON from bytes, keeping only `fields` if given (see project)
+    """
+    payload = _loads(data)
+    if fields is None:
+        return payload
+    return project(payload, fields)
+
+
+def project(payload, fields):
+    """
+    Keep only `fields` of a map, or of each map in a list: key names,
+    dotted for keys of nested maps, e.g. ("name", "license.key")
+    """
+    return _project(payload, _field_tree(tuple(fields)))
+
+
+@lru_cache(maxsize=64)
+def _field_tree(fields):
+    """
+    `fields` as nested dicts of keys, None for keys kept whole
+    """
+    tree = {}
+    for field in fields:
+        *parents, last = field.split(".")
+        node = tree
+        for key in parents:
+            node = node.setdefault(key, {})
+            if node is None:
+                break
+        else:
+            node[last] = None
+    return tree
+
+
+def _project(value, tree):
+    if isinstance(value, list):
+        return [_project(item, tree) for item in value]
+    if not isinstance(value, dict):
+        return value
+    return {
+        key: value[key] if subtree is None else _project(value[key], subtree)
+        for key, subtree in tree.items() if key in value
+    }
+
+
+def fetch(url, timeout=DEFAULT_TIMEOUT):
+    """
+    GET URL over a pooled keep-alive connection, through http_cache if set
+    """
+    if http_cache is None:
+        return get_session().get(url, timeout=timeout)
+    return http_cache.get(get_session(), url, timeout)
+
+
+def get_json(url, timeout=DEFAULT_TIMEOUT, fields=None):
+    """
+    Get JSON from URL over a pooled keep-alive connection, only `fields`
+    of it if given
+    """
+    return loads(fetch(url, timeout).content, fields)
+
+
+def iter_json_pages(url, timeout=DEFAULT_TIMEOUT, fields=None):
+    """
+    Get the JSON of each page of a paginated URL in turn, following the
+    Link rel="next" headers, one request per page as it is needed
+    """
+    while url:
+        response = fetch(url, timeout)
+        yield loads(response.content, fields)
+        url = response.links.get("next", {}).get("url")
+
+
+def prefetch(iterable):
     """
-    Get JSON from URL
+    Iterate over `iterable` one item ahead: the next item is computed on
+    a worker thread while the caller works on the current one
     """
-    response = requests.get(url)
-    return response.json()
+    iterator = iter(iterable)
+    with ThreadPoolExecutor(1, thread_name_prefix="prefetch") as executor:
+        future = executor.submit(next, iterator, _DONE)
+        while True:
+            item = future.result()
+            if item is _DONE:
+                return
+            future = executor.submit(next, iterator, _DONE)
+            yield item
 
 
-def memoize(func):
+class AsyncJSONClient:
     """
-    Memoize decorator
+    Get JSON from asyncio code, many URLs at a time.
+
+    Requests run on `max_concurrency` worker threads, each with its own
+    pooled session, and a semaphore bounds how many are in flight.
+    """
+
+    def __init__(self, max_concurrency=10, timeout=DEFAULT_TIMEOUT):
+        self.max_concurrency = max_concurrency
+        self.timeout = timeout
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._executor = ThreadPoolExecutor(
+            max_concurrency, thread_name_prefix="get_json")
+        self._sessions = set()
+
+    async def get_json(self, url, fields=None):
+        """
+        Get JSON from URL without blocking the event loop
+        """
+        async with self._semaphore:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(
+                self._executor, partial(self._get_json, url, fields))
+
+    def _get_json(self, url, fields):
+        self._sessions.add(get_session())
+        return get_json(url, self.timeout, fields)
+
+    def close(self):
+        """
+        Stop the worker threads, waiting for requests in flight, and
+        close their sessions
+        """
+        self._executor.shutdown(wait=True)
+        # The workers have exited, so nothing uses the sessions any more.
+        for session in self._sessions:
+            session.close()
+        self._sessions.clear()
+
+    async def aclose(self):
+        """
+        close() without blocking the event loop
+        """
+        await asyncio.get_running_loop().run_in_executor(None, self.close)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.aclose()
+
+
+CacheInfo = namedtuple("CacheInfo", "hits misses maxsize currsize")
+
+_KWARGS = object()
+_MISSING = object()
+
+
+class Memoized:
+    """
+    A memoized function or method (see memoize).
+
+    Results are cached per instance, in a store dropped when the instance
+    is garbage collected, keyed on the other arguments, which must be
+    hashable. Instances that cannot be weakly referenced (__slots__
+    without __weakref__) are held by their store instead, until
+    cache_clear(). Each store keeps at most `maxsize` results (None for no
+    bound), least recently used first out, each for at most `ttl`
+    seconds (None for no expiry). Concurrent calls missing on the same
+    key make one call of `func` and share its result or exception.
+    """
+    timer = staticmethod(time.monotonic)
+
+    def __init__(self, func, maxsize=128, ttl=None, is_property=None):
+        update_wrapper(self, func)
+        self.func = func
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        if is_property is None:
+            params = list(inspect.signature(func).parameters.values())
+            is_property = len(params) == 1 and params[0].kind in (
+                params[0].POSITIONAL_ONLY, params[0].POSITIONAL_OR_KEYWORD)
+        self.is_property = is_property
+
+        def method(instance, *args, **kwargs):
+            return self._call(instance, *args, **kwargs)
+        self._method = update_wrapper(method, func)
+        self._stores = {}
+        self._pending = {}
+        self._lock = threading.Lock()
+
+    def __get__(self, instance, owner=None):
+        if instance is None:
+            return self
+        if self.is_property:
+            return self._call(instance)
+        return MethodType(self._method, instance)
+
+    def __call__(self, *args, **kwargs):
+        return self._call(None, *args, **kwargs)
+
+    def _new_store(self, instance):
+        """
+        An empty store for the results of `instance`
+        """
+        if instance is None:
+            ref = None
+        else:
+            try:
+                ref = weakref.ref(
+                    instance, partial(self._forget, id(instance)))
+            except TypeError:
+                # Holding the instance keeps its id from being reused.
+                ref = instance
+        self._stores[id(instance)] = ref, OrderedDict()
+        return self._stores[id(instance)][1]
+
+    def _forget(self, instance_id, ref=None):
+        """
+        Drop the store of a garbage collected instance
+        """
+        self._stores.pop(instance_id, None)
+
+    def _call(self, instance, *args, **kwargs):
+        """
+        The cached result of func(instance, *args, **kwargs), or of
+        func(*args, **kwargs) if `instance` is None
+        """
+        key = args
+        if kwargs:
+            key += (_KWARGS,) + tuple(sorted(kwargs.items()))
+        # Hits take no lock: each step is one atomic dict operation.
+        store = self._stores.get(id(instance))
+        if store is not None:
+            value = self._cached(store[1], key)
+            if value is not _MISSING:
+                return value
+        with self._lock:
+            store = self._stores.get(id(instance))
+            store = self._new_store(instance) if store is None else store[1]
+            value = self._cached(store, key)
+            if value is not _MISSING:
+                return value
+            pending = self._pending.get((id(instance), key))
+            if pending is not None:
+                self.hits += 1
+                waiting = True
+            else:
+                self.misses += 1
+                pending = self._pending[(id(instance), key)] = Future()
+                waiting = False
+        if waiting:
+            return pending.result()
+        if instance is not None:
+            args = (instance,) + args
+        return self._fill(instance, key, pending,
+                          partial(self.func, *args, **kwargs))
+
+    def _cached(self, store, key):
+        """
+        The unexpired result for `key` in `store`, or _MISSING
+        """
+        entry = store.get(key)
+        if entry is None or (
+                entry[1] is not None and entry[1] <= self.timer()):
+            return _MISSING
+        if self.maxsize is not None:
+            try:
+                store.move_to_end(key)
+            except KeyError:
+                pass
+        self.hits += 1
+        return entry[0]
+
+    def _fill(self, instance, key, pending, call):
+        """
+        Call `call` for the miss on `key` and cache its result
+        """
+        try:
+            value = call()
+        except BaseException as exc:
+            with self._lock:
+                del self._pending[(id(instance), key)]
+            pending.set_exception(exc)
+            raise
+        now = None if self.ttl is None else self.timer()
+        expires = None if now is None else now + self.ttl
+        with self._lock:
+            store = self._stores.get(id(instance))
+            store = self._new_store(instance) if store is None else store[1]
+            # Re-added at the end, so without hits reordering the store
+            # the entries stay in order of expiry.
+            store.pop(key, None)
+            store[key] = value, expires
+            if self.maxsize is not None and len(store) > self.maxsize:
+                store.popitem(last=False)
+            if now is not None:
+                self._purge(store, now)
+            del self._pending[(id(instance), key)]
+        pending.set_result(value)
+        return value
+
+    @staticmethod
+    def _purge(store, now):
+        """
+        Drop the expired entries at the front of `store`
+        """
+        while store:
+            _, expires = next(iter(store.values()))
+            if expires > now:
+                break
+            store.popitem(last=False)
+
+    def cache_info(self):
+        """
+        Hits, misses, maxsize and the number of results cached, over all
+        instances. Hits counted by threads racing each other may be lost.
+        """
+        with self._lock:
+            # A snapshot: _forget() may run from the garbage collector.
+            stores = list(self._stores.values())
+            currsize = sum(len(store) for _, store in stores)
+            return CacheInfo(self.hits, self.misses, self.maxsize, currsize)
+
+    def cache_clear(self, instance=None):
+        """
+        Drop the results cached for `instance`, or for every instance
+        """
+        with self._lock:
+            if instance is None:
+                self._stores.clear()
+            else:
+                self._stores.pop(id(instance), None)
+
+
+def memoize(func=None, *, maxsize=128, ttl=None, property=None):
+    """
+    Memoize decorator, bare or with options (`@memoize(ttl=60)`).
+
+    NOTE: by default a method taking only self becomes a cached
+    PROPERTY, read as `obj.name`, not called as `obj.name()`. Other
+    methods and functions stay callable and are cached per arguments.
+    Pass `property=False` to keep a self-only method callable, or
+    `property=True` to say it is a property explicitly. See Memoized.
     """
-    cache = {}
-    @wraps(func)
-    def memoized_func(*args, **kwargs):
-        key = str(args) + str(kwargs)
-        if key not in cache:
-            cache[key] = func(*args, **kwargs)
-        return cache[key]
-    return memoized_func
\ No newline at end of file
+    if func is None:
+        return partial(memoize, maxsize=maxsize, ttl=ttl, property=property)
+    return Memoized(func, maxsize, ttl, property)
@@ -0,0 +1,45 @@
+"""
+Per-request overhead of the business-hours check: the old datetime-based
+test against the compiled AccessSchedule.
+
+Run from the project directory:
+    python benchmarks/access_schedule.py [iterations]
+"""
+import datetime
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'settings')
+
+import django
+
+django.setup()
+
+from django.test import RequestFactory
+
+from chats.schedule import AccessSchedule
+
+
+def datetime_check(request):
+    """The check as RestrictAccessByTimeMiddleware used to do it."""
+    now = datetime.datetime.now().time()
+    start_time = datetime.time(9, 0)
+    end_time = datetime.time(18, 0)
+    return start_time <= now <= end_time
+
+
+def main():
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+    request = RequestFactory().get('/chats/messages/')
+    schedule = AccessSchedule.from_settings()
+
+    for name, check in [('datetime per request', datetime_check),
+                        ('compiled schedule', schedule.allows)]:
+        seconds = min(timeit.repeat(lambda: check(request), number=iterations, repeat=3))
+        print(f"{name:22} {seconds / iterations * 1e9:8.1f} ns/request")
+
+
+if __name__ == '__main__':
+    main()
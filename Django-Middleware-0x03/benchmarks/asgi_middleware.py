@@ -0,0 +1,91 @@
+"""
+Latency of an async view behind the chats middleware stack under
+concurrency, with the middleware running natively on the event loop versus
+forced into sync-only mode (Django then wraps every layer in
+sync_to_async / async_to_sync thread hops, as it did before).
+
+Run from the project directory:
+    python benchmarks/asgi_middleware.py [requests] [concurrency]
+"""
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'settings')
+
+import django
+
+django.setup()
+
+from django.http import HttpResponse
+from django.test import AsyncClient, override_settings
+from django.urls import path
+
+from chats import middleware
+
+CHATS_MIDDLEWARE = [
+    'RequestLoggingMiddleware',
+    'RestrictAccessByTimeMiddleware',
+    'OffensiveLanguageMiddleware',
+    'RolepermissionMiddleware',
+]
+
+# Same classes with async support switched off, so Django adapts them.
+for name in CHATS_MIDDLEWARE:
+    cls = getattr(middleware, name)
+    globals()['SyncOnly' + name] = type('SyncOnly' + name, (cls,), {'async_capable': False})
+
+
+async def view(request):
+    await asyncio.sleep(0.005)  # stands in for async I/O in the view
+    return HttpResponse('ok')
+
+
+urlpatterns = [path('bench/', view)]
+
+
+def stack(prefix):
+    return [
+        'django.contrib.sessions.middleware.SessionMiddleware',
+        'django.contrib.auth.middleware.AuthenticationMiddleware',
+    ] + [prefix + name for name in CHATS_MIDDLEWARE]
+
+
+async def load(total, concurrency):
+    client = AsyncClient()
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+
+    async def one():
+        async with semaphore:
+            start = time.perf_counter()
+            await client.get('/bench/')
+            latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one() for _ in range(total)))
+    elapsed = time.perf_counter() - start
+    latencies.sort()
+    return (total / elapsed,
+            latencies[len(latencies) // 2] * 1000,
+            latencies[int(len(latencies) * 0.95)] * 1000)
+
+
+def main():
+    total = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    concurrency = int(sys.argv[2]) if len(sys.argv) > 2 else 100
+    with tempfile.TemporaryDirectory() as tmp:
+        for label, prefix in [('sync-only (thread hops)', __name__ + '.SyncOnly'),
+                              ('native async', 'chats.middleware.')]:
+            with override_settings(ROOT_URLCONF=__name__, MIDDLEWARE=stack(prefix),
+                                   ACCESS_SCHEDULE=[],
+                                   REQUEST_LOG={'PATH': os.path.join(tmp, 'requests.log')}):
+                rate, p50, p95 = asyncio.run(load(total, concurrency))
+            print(f"{label:24} {rate:8.0f} req/s  p50 {p50:7.1f} ms  p95 {p95:7.1f} ms")
+
+
+if __name__ == '__main__':
+    main()
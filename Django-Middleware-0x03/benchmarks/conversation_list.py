@@ -0,0 +1,92 @@
+"""
+Payload size and latency of GET /chats/conversations/ when every message
+is embedded (the old behaviour) versus the bounded preview, on a throwaway
+SQLite database.
+
+Run from the project directory:
+    python benchmarks/conversation_list.py [conversations] [messages_each] [runs]
+"""
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'settings')
+
+import django
+
+django.setup()
+
+from django.contrib.auth.models import User
+from django.db import connection
+from django.db.models import Prefetch
+from django.test.utils import setup_test_environment
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from chats.models import Conversation, Message
+from chats.serializers import ConversationSerializer
+from chats.views import ConversationViewSet
+
+
+class FullHistoryConversationViewSet(ConversationViewSet):
+    """
+    The list endpoint as it was, embedding every message of every
+    conversation (with senders prefetched, so only size is compared).
+    """
+
+    def get_queryset(self):
+        return self.request.user.conversations.prefetch_related(
+            'participants',
+            Prefetch('messages', queryset=Message.objects.select_related('sender')),
+        )
+
+    def get_serializer_class(self):
+        return ConversationSerializer
+
+
+def seed(conversations, messages_each):
+    user = User.objects.create_user(username='bench', password='bench')
+    for _ in range(conversations):
+        conversation = Conversation.objects.create()
+        conversation.participants.add(user)
+        Message.objects.bulk_create(
+            Message(conversation=conversation, sender=user, content=f"message number {i}")
+            for i in range(messages_each)
+        )
+    return user
+
+
+def measure(viewset, user, runs):
+    view = viewset.as_view({'get': 'list'})
+    latencies = []
+    for _ in range(runs):
+        request = APIRequestFactory().get('/chats/conversations/')
+        force_authenticate(request, user=user)
+        start = time.perf_counter()
+        response = view(request)
+        response.render()
+        latencies.append(time.perf_counter() - start)
+    latencies.sort()
+    p95 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))]
+    return len(response.content), p95 * 1000
+
+
+def main():
+    conversations = int(sys.argv[1]) if len(sys.argv) > 1 else 10
+    messages_each = int(sys.argv[2]) if len(sys.argv) > 2 else 10000
+    runs = int(sys.argv[3]) if len(sys.argv) > 3 else 20
+    setup_test_environment()
+    with tempfile.TemporaryDirectory() as tmp:
+        connection.settings_dict['TEST']['NAME'] = os.path.join(tmp, 'bench.sqlite3')
+        connection.creation.create_test_db(verbosity=0, serialize=False)
+        user = seed(conversations, messages_each)
+        print(f"{conversations} conversations x {messages_each} messages")
+        for label, viewset in [('full history', FullHistoryConversationViewSet),
+                               ('preview', ConversationViewSet)]:
+            size, p95 = measure(viewset, user, runs)
+            print(f"{label:14} {size:12,d} bytes  p95 {p95:9.1f} ms")
+
+
+if __name__ == '__main__':
+    main()
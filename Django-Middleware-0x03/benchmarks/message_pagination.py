@@ -0,0 +1,99 @@
+"""
+Time page 1 and page 1000 of a conversation's /chats/messages/ with page-number pagination
+(COUNT + OFFSET) and with keyset pagination (?pagination=cursor), on a
+throwaway SQLite database seeded with one long conversation.
+
+Run from the project directory:
+    python benchmarks/message_pagination.py [messages]
+"""
+import base64
+import json
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'settings')
+
+import django
+
+django.setup()
+
+from datetime import timedelta
+
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test.utils import setup_test_environment
+from django.utils import timezone
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from chats.models import Conversation, Message
+from chats.views import MessageViewSet
+
+PAGE_SIZE = 20
+DEEP_PAGE = 1000
+
+
+def seed(total):
+    user = User.objects.create_user(username='bench', password='bench')
+    conversation = Conversation.objects.create()
+    conversation.participants.add(user)
+    start = timezone.now() - timedelta(seconds=total)
+    batch = []
+    for i in range(total):
+        batch.append(Message(conversation=conversation, sender=user, content=f"message {i}"))
+        if len(batch) == 10000:
+            Message.objects.bulk_create(batch)
+            batch = []
+    Message.objects.bulk_create(batch)
+    # auto_now_add stamps every row alike; spread them out, one per second.
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "UPDATE chats_message SET timestamp = datetime(%s, '+' || id || ' seconds')",
+            [start.strftime('%Y-%m-%d %H:%M:%S')],
+        )
+    return user, conversation
+
+
+def timed(view, user, url, repeat=5):
+    best = float('inf')
+    for _ in range(repeat):
+        request = APIRequestFactory().get(url)
+        force_authenticate(request, user=user)
+        start = time.perf_counter()
+        response = view(request)
+        best = min(best, time.perf_counter() - start)
+        assert response.status_code == 200, response.data
+    return best * 1000
+
+
+def cursor_at(offset):
+    message = Message.objects.order_by('-timestamp', '-id')[offset]
+    data = {'t': message.timestamp.isoformat(), 'i': message.pk}
+    return base64.urlsafe_b64encode(json.dumps(data, separators=(',', ':')).encode()).decode()
+
+
+def main():
+    total = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+    setup_test_environment()
+    with tempfile.TemporaryDirectory() as tmp:
+        connection.settings_dict['TEST']['NAME'] = os.path.join(tmp, 'bench.sqlite3')
+        connection.creation.create_test_db(verbosity=0, serialize=False)
+        print(f"seeding {total} messages...")
+        user, conversation = seed(total)
+        view = MessageViewSet.as_view({'get': 'list'})
+
+        deep_cursor = cursor_at((DEEP_PAGE - 1) * PAGE_SIZE - 1)
+        base = f'/chats/messages/?conversation={conversation.pk}'
+        for label, url in [
+            ('page number, page 1', f'{base}&page=1'),
+            (f'page number, page {DEEP_PAGE}', f'{base}&page={DEEP_PAGE}'),
+            ('cursor, page 1', f'{base}&pagination=cursor'),
+            (f'cursor, page {DEEP_PAGE}', f'{base}&pagination=cursor&cursor={deep_cursor}'),
+        ]:
+            print(f"{label:24} {timed(view, user, url):8.2f} ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,79 @@
+"""
+Compare requests/sec of the old per-request open/write/close logger with
+the buffered RequestLoggingMiddleware.
+
+Run from the project directory:
+    python benchmarks/request_logging.py [requests] [threads]
+"""
+import datetime
+import os
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'settings')
+
+import django
+
+django.setup()
+
+from django.contrib.auth.models import AnonymousUser
+from django.http import HttpResponse
+from django.test import RequestFactory, override_settings
+
+from chats.middleware import RequestLoggingMiddleware
+
+
+class OpenPerRequestLoggingMiddleware:
+    """The logger as it was before buffering, kept here for comparison."""
+
+    def __init__(self, get_response, path):
+        self.get_response = get_response
+        self.path = path
+
+    def __call__(self, request):
+        user = request.user.username if request.user.is_authenticated else 'Anonymous'
+        log_message = f"{datetime.datetime.now()} - User: {user} - Path: {request.path}\n"
+        with open(self.path, 'a') as log_file:
+            log_file.write(log_message)
+        return self.get_response(request)
+
+
+def run(middleware, total, threads):
+    request = RequestFactory().get('/chats/messages/')
+    request.user = AnonymousUser()
+    per_thread = total // threads
+
+    def worker():
+        for _ in range(per_thread):
+            middleware(request)
+
+    workers = [threading.Thread(target=worker) for _ in range(threads)]
+    start = time.perf_counter()
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    return per_thread * threads / (time.perf_counter() - start)
+
+
+def main():
+    total = int(sys.argv[1]) if len(sys.argv) > 1 else 50000
+    threads = int(sys.argv[2]) if len(sys.argv) > 2 else 4
+    get_response = lambda request: HttpResponse()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        old = OpenPerRequestLoggingMiddleware(get_response, os.path.join(tmp, 'old.log'))
+        print(f"open per request: {run(old, total, threads):10.0f} req/s")
+
+        with override_settings(REQUEST_LOG={'PATH': os.path.join(tmp, 'new.log')}):
+            new = RequestLoggingMiddleware(get_response)
+        rate = run(new, total, threads)
+        new.writer.close()
+        print(f"buffered:         {rate:10.0f} req/s (dropped {new.writer.dropped})")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,14 +1,21 @@
 import django_filters
 from .models import Message, Conversation
+from .search import search_messages
 
 class MessageFilter(django_filters.FilterSet):
+    conversation = django_filters.NumberFilter(field_name='conversation_id')
     sender = django_filters.CharFilter(field_name='sender__username', lookup_expr='icontains')
     timestamp_after = django_filters.DateTimeFilter(field_name='timestamp', lookup_expr='gte')
     timestamp_before = django_filters.DateTimeFilter(field_name='timestamp', lookup_expr='lte')
+    search = django_filters.CharFilter(method='filter_search')
 
     class Meta:
         model = Message
-        fields = ['sender', 'timestamp_after', 'timestamp_before']
+        fields = ['conversation', 'sender', 'timestamp_after', 'timestamp_before', 'search']
+
+    def filter_search(self, queryset, name, value):
+        # Full-text match on content, best matches first.
+        return search_messages(queryset, value)
 
 class ConversationFilter(django_filters.FilterSet):
     participant = django_filters.CharFilter(field_name='participants__username', lookup_expr='icontains')
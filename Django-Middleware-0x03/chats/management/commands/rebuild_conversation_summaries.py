@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+from chats.models import ConversationSummary
+
+
+class Command(BaseCommand):
+    help = (
+        "Recompute ConversationSummary rows from Message, e.g. after bulk "
+        "imports that bypassed signals."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'conversation_ids', nargs='*', type=int,
+            help='Only rebuild these conversations (default: all).'
+        )
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        written = ConversationSummary.objects.rebuild(
+            options['conversation_ids'] or None, batch_size=options['batch_size']
+        )
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {written} conversation summaries."))
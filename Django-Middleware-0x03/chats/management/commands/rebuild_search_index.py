@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+from chats.search import rebuild_search_index
+
+
+class Command(BaseCommand):
+    help = (
+        "Reindex the content of every message for full-text search, e.g. "
+        "after bulk_create(), raw SQL or queryset.update()."
+    )
+
+    def handle(self, *args, **options):
+        indexed = rebuild_search_index()
+        self.stdout.write(self.style.SUCCESS(f"Indexed {indexed} messages."))
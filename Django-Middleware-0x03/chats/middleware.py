@@ -1,54 +1,109 @@
 import datetime
 import os
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
 from django.conf import settings
 from django.http import HttpResponseForbidden
+from .ratelimit import get_rate_limiter
+from .request_log import BufferedLogWriter
+from .schedule import AccessSchedule
+
+class HybridMiddleware:
+    """
+    Base for middleware that runs natively in both sync (WSGI) and async
+    (ASGI) stacks. Django passes an async get_response when the rest of the
+    stack is async; __call__ then hands off to __acall__ so requests never
+    hop through sync_to_async threads.
+    """
+    sync_capable = True
+    async_capable = True
 
-class RequestLoggingMiddleware:
     def __init__(self, get_response):
         self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+class RequestLoggingMiddleware(HybridMiddleware):
+    def __init__(self, get_response):
+        super().__init__(get_response)
+        # Lines are handed to a background writer instead of opening the
+        # log file on every request; see REQUEST_LOG in settings.
+        options = getattr(settings, 'REQUEST_LOG', {})
+        self.writer = BufferedLogWriter(
+            options.get('PATH', os.path.join(settings.BASE_DIR, 'requests.log')),
+            capacity=options.get('CAPACITY', 10000),
+            batch_size=options.get('BATCH_SIZE', 256),
+            flush_interval=options.get('FLUSH_INTERVAL', 1.0),
+            overflow=options.get('OVERFLOW', 'drop'),
+        )
 
     def __call__(self, request):
-        user = request.user.username if request.user.is_authenticated else 'Anonymous'
-        log_message = f"{datetime.datetime.now()} - User: {user} - Path: {request.path}\n"
-        log_file_path = os.path.join(settings.BASE_DIR, 'requests.log')
-        with open(log_file_path, 'a') as log_file:
-            log_file.write(log_message)
+        if self.async_mode:
+            return self.__acall__(request)
+        self.writer.push(self.format_line(request, request.user))
         response = self.get_response(request)
         return response
 
-class RestrictAccessByTimeMiddleware:
+    async def __acall__(self, request):
+        await self.writer.apush(self.format_line(request, await request.auser()))
+        response = await self.get_response(request)
+        return response
+
+    def format_line(self, request, user):
+        username = user.username if user.is_authenticated else 'Anonymous'
+        return f"{datetime.datetime.now()} - User: {username} - Path: {request.path}\n"
+
+class RestrictAccessByTimeMiddleware(HybridMiddleware):
     def __init__(self, get_response):
-        self.get_response = get_response
+        super().__init__(get_response)
+        self.schedule = AccessSchedule.from_settings()
 
     def __call__(self, request):
-        now = datetime.datetime.now().time()
-        start_time = datetime.time(9, 0)  # 9 AM
-        end_time = datetime.time(18, 0)  # 6 PM
-        if not (start_time <= now <= end_time):
-            return HttpResponseForbidden("Access denied outside business hours (9 AM to 6 PM).")
+        if self.async_mode:
+            return self.__acall__(request)
+        if not self.schedule.allows(request):
+            return self.forbidden()
         response = self.get_response(request)
         return response
 
-class OffensiveLanguageMiddleware:
+    async def __acall__(self, request):
+        if not await self.schedule.aallows(request):
+            return self.forbidden()
+        response = await self.get_response(request)
+        return response
+
+    def forbidden(self):
+        return HttpResponseForbidden("Access denied outside business hours.")
+
+class OffensiveLanguageMiddleware(HybridMiddleware):
     def __init__(self, get_response):
-        self.get_response = get_response
-        self.requests = {}  # {ip: [(timestamp, count)]}
+        super().__init__(get_response)
+        self.limiter = get_rate_limiter()
 
     def __call__(self, request):
-        ip = self.get_client_ip(request)
-        now = datetime.datetime.now()
-        window_start = now - datetime.timedelta(minutes=1)
-        if ip not in self.requests:
-            self.requests[ip] = []
-        # Clean old entries
-        self.requests[ip] = [t for t in self.requests[ip] if t > window_start]
-        if request.method == 'POST' and 'messages' in request.path:
-            if len(self.requests[ip]) >= 5:
-                return HttpResponseForbidden("Rate limit exceeded: 5 messages per minute.")
-            self.requests[ip].append(now)
+        if self.async_mode:
+            return self.__acall__(request)
+        if self.is_limited(request):
+            if not self.limiter.hit(self.get_client_ip(request)):
+                return self.forbidden()
         response = self.get_response(request)
         return response
 
+    async def __acall__(self, request):
+        if self.is_limited(request):
+            if not await self.limiter.ahit(self.get_client_ip(request)):
+                return self.forbidden()
+        response = await self.get_response(request)
+        return response
+
+    def is_limited(self, request):
+        return request.method == 'POST' and 'messages' in request.path
+
+    def forbidden(self):
+        return HttpResponseForbidden(
+            f"Rate limit exceeded: {self.limiter.limit} messages per {self.limiter.window} seconds."
+        )
+
     def get_client_ip(self, request):
         x_forwarded_for = request.META.get('HTTP_X_FORWARDED_FOR')
         if x_forwarded_for:
@@ -57,13 +112,29 @@ class OffensiveLanguageMiddleware:
             ip = request.META.get('REMOTE_ADDR')
         return ip
 
-class RolepermissionMiddleware:
-    def __init__(self, get_response):
-        self.get_response = get_response
+class RolepermissionMiddleware(HybridMiddleware):
+    """
+    Session-authenticated users must be staff or superusers.
+    """
 
     def __call__(self, request):
-        if request.user.is_authenticated:
-            if not (request.user.is_staff or request.user.is_superuser):
-                return HttpResponseForbidden("Access denied: Admin or moderator role required.")
+        if self.async_mode:
+            return self.__acall__(request)
+        if not self.has_role(request.user):
+            return self.forbidden()
         response = self.get_response(request)
-        return response
\ No newline at end of file
+        return response
+
+    async def __acall__(self, request):
+        if not self.has_role(await request.auser()):
+            return self.forbidden()
+        response = await self.get_response(request)
+        return response
+
+    def has_role(self, user):
+        if user.is_authenticated:
+            return user.is_staff or user.is_superuser
+        return True
+
+    def forbidden(self):
+        return HttpResponseForbidden("Access denied: Admin or moderator role required.")
@@ -0,0 +1,48 @@
+# Generated by Django 5.2.8 on 2026-10-18 20:19
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models.functions import Coalesce
+
+
+def build_summaries(apps, schema_editor):
+    Conversation = apps.get_model('chats', 'Conversation')
+    ConversationSummary = apps.get_model('chats', 'ConversationSummary')
+    Message = apps.get_model('chats', 'Message')
+    newest = Message.objects.filter(conversation=models.OuterRef('pk')).order_by('-timestamp', '-id')
+    counts = Message.objects.filter(
+        conversation=models.OuterRef('pk')
+    ).order_by().values('conversation').annotate(total=models.Count('pk')).values('total')
+    rows = Conversation.objects.annotate(
+        last_id=models.Subquery(newest.values('pk')[:1]),
+        last_at=models.Subquery(newest.values('timestamp')[:1]),
+        total=Coalesce(models.Subquery(counts), 0),
+    ).values_list('pk', 'last_id', 'last_at', 'total')
+    ConversationSummary.objects.bulk_create(
+        (
+            ConversationSummary(conversation_id=pk, last_message_id=last_id,
+                                last_message_at=last_at, message_count=total)
+            for pk, last_id, last_at, total in rows.iterator(chunk_size=1000)
+        ),
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chats', '0002_message_conversation_timestamp_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ConversationSummary',
+            fields=[
+                ('conversation', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='summary', serialize=False, to='chats.conversation')),
+                ('last_message_at', models.DateTimeField(blank=True, db_index=True, null=True)),
+                ('message_count', models.PositiveIntegerField(default=0)),
+                ('last_message', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='chats.message')),
+            ],
+        ),
+        migrations.RunPython(build_summaries, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,35 @@
+from django.db import migrations
+
+
+def create_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        schema_editor.execute('CREATE VIRTUAL TABLE chats_message_fts USING fts5(content)')
+        schema_editor.execute(
+            'INSERT INTO chats_message_fts (rowid, content) SELECT id, content FROM chats_message'
+        )
+    elif vendor == 'postgresql':
+        # The expression SearchVector('content', config='english') compiles to.
+        schema_editor.execute(
+            "CREATE INDEX chats_msg_content_search_idx ON chats_message "
+            "USING GIN (to_tsvector('english'::regconfig, COALESCE(content, '')))"
+        )
+
+
+def drop_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        schema_editor.execute('DROP TABLE chats_message_fts')
+    elif vendor == 'postgresql':
+        schema_editor.execute('DROP INDEX chats_msg_content_search_idx')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chats', '0003_conversation_summary'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -1,4 +1,11 @@
-from rest_framework.pagination import PageNumberPagination
+import base64
+import json
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import NotFound, ValidationError
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
 
 class MessagePagination(PageNumberPagination):
     page_size = 20
@@ -8,4 +15,119 @@ class MessagePagination(PageNumberPagination):
     def get_paginated_response(self, data):
         response = super().get_paginated_response(data)
         response.data['total_count'] = self.page.paginator.count
-        return response
\ No newline at end of file
+        return response
+
+class MessageCursorPagination(BasePagination):
+    """
+    Keyset pagination over (timestamp, id), newest first.
+
+    Each page is fetched with a WHERE on the last row of the previous page
+    instead of an OFFSET, so within a conversation (?conversation=<id>,
+    served by the (conversation, timestamp, id) index) page 1000 costs the
+    same as page 1, and rows inserted while a client is scrolling never
+    shift later pages. Cursors are opaque base64 tokens. No COUNT is run unless the client asks for
+    one with ?count=true, and that count stops at `max_count` rows.
+
+    ?search= results are ordered by rank, which keyset pagination would
+    silently replace, so the two together are rejected with a 400.
+    """
+    page_size = 20
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    cursor_query_param = 'cursor'
+    count_query_param = 'count'
+    max_count = 10000
+    invalid_cursor_message = 'Invalid cursor'
+    search_query_param = 'search'
+    search_message = 'Search results are ordered by rank and cannot be paginated with a cursor.'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        if request.query_params.get(self.search_query_param):
+            raise ValidationError({self.search_query_param: [self.search_message]})
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+        self.page_size = self.get_page_size(request)
+        position = self.decode_cursor(request)
+        self.count = self.get_count(queryset, request)
+
+        if position is None:
+            reverse = False
+        else:
+            timestamp, pk, reverse = position
+            # (timestamp, id) past the cursor, spelled with a plain bound on
+            # timestamp so the database can seek the index to it.
+            if reverse:
+                queryset = queryset.filter(Q(timestamp__gt=timestamp) | Q(pk__gt=pk), timestamp__gte=timestamp)
+            else:
+                queryset = queryset.filter(Q(timestamp__lt=timestamp) | Q(pk__lt=pk), timestamp__lte=timestamp)
+        ordering = ('timestamp', 'pk') if reverse else ('-timestamp', '-pk')
+        results = list(queryset.order_by(*ordering)[:self.page_size + 1])
+        has_more = len(results) > self.page_size
+        del results[self.page_size:]
+
+        if reverse:
+            results.reverse()
+            self.has_next = True
+            self.has_previous = has_more
+        else:
+            self.has_next = has_more
+            self.has_previous = position is not None
+        self.page = results
+        return results
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        return min(max(page_size, 1), self.max_page_size)
+
+    def get_count(self, queryset, request):
+        if request.query_params.get(self.count_query_param) not in ('1', 'true'):
+            return None
+        return queryset.order_by()[:self.max_count + 1].count()
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            data = json.loads(base64.urlsafe_b64decode(encoded.encode('ascii')))
+            timestamp = parse_datetime(data['t'])
+            pk = int(data['i'])
+            reverse = bool(data.get('r'))
+        except (TypeError, ValueError, KeyError):
+            raise NotFound(self.invalid_cursor_message)
+        if timestamp is None:
+            raise NotFound(self.invalid_cursor_message)
+        return timestamp, pk, reverse
+
+    def encode_cursor(self, message, reverse):
+        data = {'t': message.timestamp.isoformat(), 'i': message.pk}
+        if reverse:
+            data['r'] = 1
+        encoded = base64.urlsafe_b64encode(json.dumps(data, separators=(',', ':')).encode()).decode('ascii')
+        return replace_query_param(self.base_url, self.cursor_query_param, encoded)
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        return self.encode_cursor(self.page[-1], reverse=False)
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        if not self.page:
+            return remove_query_param(self.base_url, self.cursor_query_param)
+        return self.encode_cursor(self.page[0], reverse=True)
+
+    def get_paginated_response(self, data):
+        response = Response({
+            'next': self.get_next_link(),
+            'previous': self.get_previous_link(),
+            'results': data,
+        })
+        if self.count is not None:
+            response.data['total_count'] = min(self.count, self.max_count)
+            response.data['total_count_exact'] = self.count <= self.max_count
+        return response
@@ -0,0 +1,37 @@
+from django.conf import settings
+from django.core.cache import cache
+from .models import Conversation
+
+
+def get_timeout():
+    return getattr(settings, 'PERMISSION_CACHE_TIMEOUT', 300)
+
+
+def participant_key(conversation_id, user_id):
+    return f"chats:participant:{conversation_id}:{user_id}"
+
+
+def is_participant(user, conversation_id):
+    """
+    Whether `user` takes part in the conversation. Answers come from the
+    cache; a miss costs one EXISTS query on the participants join table,
+    whose unique (conversation, user) index makes it a single lookup.
+    """
+    if not (user and user.is_authenticated):
+        return False
+    key = participant_key(conversation_id, user.pk)
+    result = cache.get(key)
+    if result is None:
+        result = Conversation.participants.through.objects.filter(
+            conversation_id=conversation_id, user_id=user.pk
+        ).exists()
+        cache.set(key, result, get_timeout())
+    return result
+
+
+def forget_participants(conversation_ids, user_ids):
+    cache.delete_many([
+        participant_key(conversation_id, user_id)
+        for conversation_id in conversation_ids
+        for user_id in user_ids
+    ])
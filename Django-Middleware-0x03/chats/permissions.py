@@ -1,5 +1,6 @@
 from rest_framework import permissions
 from rest_framework.permissions import BasePermission
+from .permission_cache import is_participant
 
 class IsParticipantOfConversation(BasePermission):
     """
@@ -10,16 +11,10 @@ class IsParticipantOfConversation(BasePermission):
         return request.user and request.user.is_authenticated
 
     def has_object_permission(self, request, view, obj):
-        # obj could be a Conversation or Message instance
-        if request.method in ['PUT', 'PATCH', 'DELETE']:
-            # For updates and deletes, ensure user is participant
-            if hasattr(obj, 'participants'):
-                return request.user in obj.participants.all()
-            elif hasattr(obj, 'conversation'):
-                return request.user in obj.conversation.participants.all()
-        # For GET and other methods, allow participants to view
+        # obj could be a Conversation or Message instance; either way the
+        # membership check is a cached EXISTS on the participants table.
         if hasattr(obj, 'participants'):
-            return request.user in obj.participants.all()
-        elif hasattr(obj, 'conversation'):
-            return request.user in obj.conversation.participants.all()
+            return is_participant(request.user, obj.pk)
+        elif hasattr(obj, 'conversation_id'):
+            return is_participant(request.user, obj.conversation_id)
         return False
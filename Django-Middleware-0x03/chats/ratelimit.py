@@ -0,0 +1,161 @@
+import abc
+import collections
+import threading
+import time
+from django.conf import settings
+from django.core.cache import caches
+from django.utils.module_loading import import_string
+
+
+class RateLimiter(abc.ABC):
+    """
+    Sliding-window-counter rate limiter: allow at most `limit` hits per
+    `window` seconds for each key.
+
+    Only two counters are kept per key, for the current and the previous
+    fixed window. The previous window's count is weighted by how much of
+    it still overlaps the sliding window, so every check is O(1) no matter
+    how many hits a key has made.
+    """
+
+    def __init__(self, limit, window, clock=time.time):
+        self.limit = limit
+        self.window = window
+        self.clock = clock
+
+    @abc.abstractmethod
+    def hit(self, key):
+        """
+        Record a hit for `key`. Returns False, without recording it, if the
+        key is over its limit.
+        """
+
+    async def ahit(self, key):
+        """
+        Async variant of hit() for use on the event loop.
+        """
+        return self.hit(key)
+
+    def estimate(self, previous, current, now):
+        elapsed = (now % self.window) / self.window
+        return previous * (1 - elapsed) + current
+
+
+class LocalRateLimiter(RateLimiter):
+    """
+    In-process limiter. Keys live in an LRU map capped at `max_keys`, so
+    clients that go idle are evicted instead of accumulating forever.
+    """
+
+    def __init__(self, limit, window, max_keys=10000, clock=time.time):
+        super().__init__(limit, window, clock)
+        self.max_keys = max_keys
+        self._counters = collections.OrderedDict()  # {key: [window_index, previous, current]}
+        self._lock = threading.Lock()
+
+    def hit(self, key):
+        now = self.clock()
+        index = int(now // self.window)
+        with self._lock:
+            counter = self._counters.get(key)
+            if counter is None:
+                counter = self._counters[key] = [index, 0, 0]
+                if len(self._counters) > self.max_keys:
+                    self._counters.popitem(last=False)
+            else:
+                self._counters.move_to_end(key)
+                if counter[0] != index:
+                    counter[1] = counter[2] if counter[0] == index - 1 else 0
+                    counter[2] = 0
+                    counter[0] = index
+            if self.estimate(counter[1], counter[2], now) + 1 > self.limit:
+                return False
+            counter[2] += 1
+            return True
+
+
+class CacheRateLimiter(RateLimiter):
+    """
+    Limiter backed by a Django cache, so every worker process sharing that
+    cache enforces the same limit. Counters expire on their own after two
+    windows, which takes care of idle keys.
+    """
+
+    def __init__(self, limit, window, cache_alias='default', key_prefix='ratelimit',
+                 clock=time.time):
+        super().__init__(limit, window, clock)
+        self.cache = caches[cache_alias]
+        self.key_prefix = key_prefix
+
+    def hit(self, key):
+        steps = self._hit(key)
+        result = error = None
+        while True:
+            try:
+                name, args = steps.throw(error) if error else steps.send(result)
+            except StopIteration as stop:
+                return stop.value
+            try:
+                result, error = getattr(self.cache, name)(*args), None
+            except ValueError as exc:
+                result, error = None, exc
+
+    async def ahit(self, key):
+        steps = self._hit(key)
+        result = error = None
+        while True:
+            try:
+                name, args = steps.throw(error) if error else steps.send(result)
+            except StopIteration as stop:
+                return stop.value
+            try:
+                result, error = await getattr(self.cache, 'a' + name)(*args), None
+            except ValueError as exc:
+                result, error = None, exc
+
+    def _hit(self, key):
+        """
+        The logic of hit() and ahit(), which only differ in how they call
+        the cache: yields each cache call as (method name, args), is sent
+        its result (or thrown its ValueError) and returns the decision.
+        """
+        now = self.clock()
+        index = int(now // self.window)
+        current_key = f"{self.key_prefix}:{key}:{index}"
+        previous_key = f"{self.key_prefix}:{key}:{index - 1}"
+        timeout = self.window * 2
+        counts = yield 'get_many', ([current_key, previous_key],)
+        # Increment (or create) first so concurrent workers each see a
+        # distinct count, then give the hit back if it pushed the key over
+        # the limit. A hit with a live counter costs two round trips, a
+        # denied one three.
+        current = None
+        if current_key in counts:
+            try:
+                current = yield 'incr', (current_key,)
+            except ValueError:
+                pass  # expired since get_many(); start it again below
+        if current is None:
+            if (yield 'add', (current_key, 1, timeout)):
+                current = 1
+            else:
+                # Another worker just started it.
+                current = yield 'incr', (current_key,)
+        previous = counts.get(previous_key, 0)
+        if self.estimate(previous, current, now) > self.limit:
+            try:
+                yield 'decr', (current_key,)
+            except ValueError:
+                pass  # expired or evicted: nothing left to give back
+            return False
+        return True
+
+
+def get_rate_limiter():
+    """
+    Build the limiter configured by the RATE_LIMIT setting.
+    """
+    options = {'LIMIT': 5, 'WINDOW': 60}
+    options.update(getattr(settings, 'RATE_LIMIT', {}))
+    backend = import_string(options.pop('BACKEND', 'chats.ratelimit.CacheRateLimiter'))
+    return backend(**{name.lower(): value for name, value in options.items()})
@@ -0,0 +1,183 @@
+import atexit
+import collections
+import threading
+from asgiref.sync import sync_to_async
+
+
+class BufferedLogWriter:
+    """
+    Buffered, batching log writer.
+
+    Request threads push finished log lines onto an in-memory deque and a
+    single background thread drains it in batches, writing each batch with
+    one write() call to a file that stays open.
+
+    A batch is flushed when `batch_size` lines are waiting or when
+    `flush_interval` seconds have passed, whichever comes first.
+    At most `capacity` lines are held in memory; when the buffer is full
+    the `overflow` policy decides whether new lines are dropped ('drop')
+    or the producer waits for the writer to catch up ('block'). With
+    'drop', producers check the length and append without taking a lock,
+    so concurrent pushes may overshoot `capacity` by at most one line per
+    producer thread, and `dropped` may undercount under contention.
+
+    If the writer thread fails (the file cannot be opened or written), the
+    error is kept in `error`, lines still buffered are counted as dropped,
+    and later pushes append to the file directly, as if unbuffered.
+    """
+
+    OVERFLOW_POLICIES = ('drop', 'block')
+
+    def __init__(self, path, capacity=10000, batch_size=256,
+                 flush_interval=1.0, overflow='drop'):
+        if overflow not in self.OVERFLOW_POLICIES:
+            raise ValueError(f"Unknown overflow policy: {overflow!r}")
+        self.path = path
+        self.capacity = capacity
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.overflow = overflow
+        self.dropped = 0
+        self.error = None
+        self._buffer = collections.deque()
+        self._direct_lock = threading.Lock()
+        self._slots = threading.Semaphore(capacity) if overflow == 'block' else None
+        self._flush_waiters = collections.deque()
+        self._wakeup = threading.Event()
+        self._stopped = threading.Event()
+        self._start_lock = threading.Lock()
+        self._thread = None
+        atexit.register(self.close)
+
+    def push(self, line, blocking=True):
+        """
+        Queue a line for writing. Returns False if it was dropped, or if the
+        'block' policy would have to wait and `blocking` is False.
+        """
+        if self._thread is None:
+            self._start()
+        if self.error is not None:
+            return self._write_direct(line)
+        if self._slots is None:
+            if len(self._buffer) >= self.capacity:
+                self.dropped += 1
+                return False
+            self._append(line)
+            return True
+        if not blocking:
+            if not self._slots.acquire(blocking=False):
+                return False
+        else:
+            # Wake up now and then to notice a failed writer, which would
+            # never free a slot.
+            while not self._slots.acquire(timeout=self.flush_interval):
+                if self.error is not None:
+                    return self._write_direct(line)
+        self._append(line)
+        return True
+
+    def _write_direct(self, line):
+        with self._direct_lock:
+            with open(self.path, 'a') as log_file:
+                log_file.write(line)
+        return True
+
+    async def apush(self, line):
+        """
+        Async variant of push() that never blocks the event loop: with the
+        'block' policy a full buffer is waited on in a worker thread.
+        """
+        if self.push(line, blocking=False):
+            return True
+        if self._slots is None:
+            return False
+        return await sync_to_async(self.push, thread_sensitive=False)(line)
+
+    def _append(self, line):
+        self._buffer.append(line)
+        if len(self._buffer) >= self.batch_size:
+            self._wakeup.set()
+
+    def flush(self):
+        """
+        Wait until every line pushed before this call has been written.
+        """
+        if self._thread is None:
+            return
+        done = threading.Event()
+        self._flush_waiters.append(done)
+        # A writer that failed before the append above no longer sets
+        # waiters; one failing after it sets them all (see _fail).
+        if self.error is not None:
+            return
+        self._wakeup.set()
+        done.wait()
+
+    def close(self):
+        """
+        Stop the writer thread after a final flush.
+        """
+        if self._thread is None:
+            return
+        self._stopped.set()
+        self._wakeup.set()
+        self._thread.join()
+        self._thread = None
+
+    def _start(self):
+        with self._start_lock:
+            if self._thread is not None:
+                return
+            self._stopped.clear()
+            self.error = None
+            self._thread = threading.Thread(
+                target=self._run, name='request-log-writer', daemon=True
+            )
+            self._thread.start()
+
+    def _run(self):
+        try:
+            with open(self.path, 'a') as log_file:
+                while not self._stopped.is_set():
+                    self._wakeup.wait(self.flush_interval)
+                    self._wakeup.clear()
+                    self._drain(log_file)
+                self._drain(log_file)
+        except Exception as exc:
+            self._fail(exc)
+
+    def _fail(self, exc):
+        self.error = exc
+        # Producers may still be appending the lines they pushed before
+        # seeing the error; popleft() takes them one at a time.
+        while True:
+            try:
+                self._buffer.popleft()
+            except IndexError:
+                break
+            self.dropped += 1
+        while self._flush_waiters:
+            self._flush_waiters.popleft().set()
+
+    def _drain(self, log_file):
+        # Waiters registered before this point only care about lines that
+        # were pushed before them, which the loop below is guaranteed to see.
+        waiters = []
+        while self._flush_waiters:
+            waiters.append(self._flush_waiters.popleft())
+        try:
+            self._write_pending(log_file)
+        finally:
+            for done in waiters:
+                done.set()
+
+    def _write_pending(self, log_file):
+        while self._buffer:
+            batch = []
+            while self._buffer and len(batch) < self.batch_size:
+                batch.append(self._buffer.popleft())
+            log_file.write(''.join(batch))
+            log_file.flush()
+            if self._slots is not None:
+                for _ in batch:
+                    self._slots.release()
@@ -0,0 +1,153 @@
+import bisect
+import time
+from django.conf import settings
+
+DAY_SECONDS = 24 * 60 * 60
+WEEK_SECONDS = 7 * DAY_SECONDS
+
+
+def parse_time_of_day(value):
+    """
+    Turn 'HH:MM' or 'HH:MM:SS' into seconds since midnight.
+    """
+    parts = [int(part) for part in value.split(':')]
+    hours, minutes, seconds = (parts + [0, 0])[:3]
+    return hours * 3600 + minutes * 60 + seconds
+
+
+class WeeklySchedule:
+    """
+    Weekly opening windows compiled into a sorted table of boundaries,
+    measured in seconds from Monday 00:00 local time. A window includes
+    its end time, so 09:00-18:00 still admits a request at 18:00:00.
+
+    is_open() keeps the current answer together with the timestamp of the
+    next open/close transition, so until that moment a check is a single
+    float comparison against time.time(); the table is only searched again
+    once the boundary has passed.
+    """
+
+    def __init__(self, windows, clock=time.time):
+        self.clock = clock
+        self.boundaries = self.compile(windows)
+        self._state = (float('-inf'), False)  # (next_boundary, is_open)
+
+    @staticmethod
+    def compile(windows):
+        intervals = []
+        for window in windows:
+            start = parse_time_of_day(window['start'])
+            end = parse_time_of_day(window['end'])
+            if end <= start:
+                end += DAY_SECONDS  # runs past midnight
+            for day in window.get('days', range(7)):
+                offset = day * DAY_SECONDS
+                if offset + end > WEEK_SECONDS:
+                    intervals.append((offset + start, WEEK_SECONDS))
+                    intervals.append((0, offset + end - WEEK_SECONDS))
+                else:
+                    intervals.append((offset + start, offset + end))
+        merged = []
+        for start, end in sorted(intervals):
+            if merged and start <= merged[-1][1]:
+                merged[-1][1] = max(merged[-1][1], end)
+            else:
+                merged.append([start, end])
+        return [boundary for interval in merged for boundary in interval]
+
+    def is_open(self):
+        now = self.clock()
+        next_boundary, is_open = self._state
+        if now < next_boundary or (is_open and now == next_boundary):
+            return is_open
+        return self._advance(now)
+
+    def _advance(self, now):
+        local = time.localtime(now)
+        offset = (local.tm_wday * DAY_SECONDS + local.tm_hour * 3600
+                  + local.tm_min * 60 + local.tm_sec + now % 1)
+        index = bisect.bisect_right(self.boundaries, offset)
+        if index % 2 == 0 and index and self.boundaries[index - 1] == offset:
+            index -= 1  # exactly at a window's end, which is still open
+        is_open = index % 2 == 1
+        if index < len(self.boundaries):
+            next_offset = self.boundaries[index]
+        else:
+            next_offset = WEEK_SECONDS + (self.boundaries[0] if self.boundaries else 0)
+        next_boundary = now - offset + next_offset
+        # Correct for a UTC offset change (DST) between now and the boundary.
+        next_boundary -= time.localtime(next_boundary).tm_gmtoff - local.tm_gmtoff
+        self._state = (next_boundary, is_open)
+        return is_open
+
+
+class AccessSchedule:
+    """
+    Ordered access rules loaded once from the ACCESS_SCHEDULE setting.
+
+    Each rule may limit itself to path prefixes ('paths') and user roles
+    ('roles': 'superuser', 'staff', 'user' or 'anonymous'); the first rule
+    that matches a request decides with its 'windows'. Requests that match
+    no rule are allowed.
+    """
+
+    def __init__(self, rules, clock=time.time):
+        self.rules = [
+            (
+                tuple(rule['paths']) if rule.get('paths') else None,
+                frozenset(rule['roles']) if rule.get('roles') else None,
+                WeeklySchedule(rule.get('windows', []), clock=clock),
+            )
+            for rule in rules
+        ]
+
+    @classmethod
+    def from_settings(cls):
+        return cls(getattr(settings, 'ACCESS_SCHEDULE', []))
+
+    def allows(self, request):
+        decision = self._decide(request)
+        try:
+            next(decision)
+            decision.send(getattr(request, 'user', None))
+        except StopIteration as stop:
+            return stop.value
+
+    async def aallows(self, request):
+        """
+        Async variant of allows() that loads the user with request.auser().
+        """
+        decision = self._decide(request)
+        try:
+            next(decision)
+            decision.send(await request.auser())
+        except StopIteration as stop:
+            return stop.value
+
+    def _decide(self, request):
+        """
+        The logic of allows() and aallows(), which only differ in how they
+        load the user: yields once, if a rule needs the user's role, to be
+        sent the user, and returns the decision.
+        """
+        role = None
+        for paths, roles, schedule in self.rules:
+            if paths is not None and not request.path.startswith(paths):
+                continue
+            if roles is not None:
+                if role is None:
+                    role = self.get_role((yield))
+                if role not in roles:
+                    continue
+            return schedule.is_open()
+        return True
+
+    @staticmethod
+    def get_role(user):
+        if user is None or not user.is_authenticated:
+            return 'anonymous'
+        if user.is_superuser:
+            return 'superuser'
+        if user.is_staff:
+            return 'staff'
+        return 'user'
@@ -0,0 +1,118 @@
+"""
+Full-text search over Message.content.
+
+On SQLite the content is indexed in the FTS5 table chats_message_fts
+(rowid = message id), kept in sync by the Message signals;
+`manage.py rebuild_search_index` repairs it after bulk_create(), raw SQL
+or queryset.update() on content. On PostgreSQL the migration creates a
+GIN index on the content's tsvector instead, which the database maintains
+itself. Other databases fall back to icontains.
+
+search_messages() narrows a Message queryset to the matches and annotates
+`search_rank` (higher is better), best matches first.
+"""
+import re
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.db.models import FloatField, Q, Value
+
+FTS_TABLE = 'chats_message_fts'
+# Must match the expression of the PostgreSQL index (migration 0004).
+SEARCH_CONFIG = 'english'
+
+_WORD = re.compile(r'\w+')
+
+def _vendor(using):
+    return connections[using].vendor
+
+def fts_query(text):
+    """
+    Turn user input into an FTS5 query matching every word of it, so
+    quotes and operators in the input cannot break the query syntax.
+    Returns '' if the input has no words.
+    """
+    return ' '.join(f'"{word}"' for word in _WORD.findall(text))
+
+def search_messages(queryset, text):
+    """
+    The messages of `queryset` whose content matches every word of
+    `text`, annotated with `search_rank` and ordered by it, best first.
+    """
+    vendor = _vendor(queryset.db)
+    if vendor == 'sqlite':
+        query = fts_query(text)
+        if not query:
+            return queryset.none()
+        table = queryset.model._meta.db_table
+        # FTS5 ranks with bm25(), lower is better.
+        return queryset.extra(
+            tables=[FTS_TABLE],
+            where=[f'{FTS_TABLE}.rowid = {table}.id', f'{FTS_TABLE} MATCH %s'],
+            params=[query],
+            select={'search_rank': f'-{FTS_TABLE}.rank'},
+            order_by=['-search_rank'],
+        )
+    if vendor == 'postgresql':
+        from django.contrib.postgres.search import SearchQuery, SearchRank, SearchVector
+
+        vector = SearchVector('content', config=SEARCH_CONFIG)
+        query = SearchQuery(text, config=SEARCH_CONFIG)
+        return queryset.annotate(
+            search_vector=vector, search_rank=SearchRank(vector, query)
+        ).filter(search_vector=query).order_by('-search_rank')
+    words = _WORD.findall(text)
+    if not words:
+        return queryset.none()
+    matches = Q()
+    for word in words:
+        matches &= Q(content__icontains=word)
+    return queryset.filter(matches).annotate(
+        search_rank=Value(0.0, output_field=FloatField())
+    )
+
+def index_messages(ids, created=False, using=DEFAULT_DB_ALIAS):
+    """
+    (Re)index the content of the messages `ids` with one INSERT ... SELECT,
+    after one DELETE of their old entries unless they were just `created`.
+    """
+    if _vendor(using) != 'sqlite' or not ids:
+        return
+    placeholders = ', '.join(['%s'] * len(ids))
+    with connections[using].cursor() as cursor:
+        if not created:
+            cursor.execute(f'DELETE FROM {FTS_TABLE} WHERE rowid IN ({placeholders})', list(ids))
+        cursor.execute(
+            f'INSERT INTO {FTS_TABLE} (rowid, content) '
+            f'SELECT id, content FROM chats_message WHERE id IN ({placeholders})',
+            list(ids),
+        )
+
+def index_message(message, created=False, using=DEFAULT_DB_ALIAS):
+    """
+    Index one saved message from the instance, without reading it back.
+    """
+    if _vendor(using) != 'sqlite':
+        return
+    with connections[using].cursor() as cursor:
+        if not created:
+            cursor.execute(f'DELETE FROM {FTS_TABLE} WHERE rowid = %s', [message.pk])
+        cursor.execute(
+            f'INSERT INTO {FTS_TABLE} (rowid, content) VALUES (%s, %s)', [message.pk, message.content]
+        )
+
+def unindex_messages(ids, using=DEFAULT_DB_ALIAS):
+    if _vendor(using) != 'sqlite' or not ids:
+        return
+    placeholders = ', '.join(['%s'] * len(ids))
+    with connections[using].cursor() as cursor:
+        cursor.execute(f'DELETE FROM {FTS_TABLE} WHERE rowid IN ({placeholders})', list(ids))
+
+def rebuild_search_index(using=DEFAULT_DB_ALIAS):
+    """
+    Reindex every message from scratch. Returns the number indexed.
+    """
+    if _vendor(using) != 'sqlite':
+        return 0
+    with connections[using].cursor() as cursor:
+        cursor.execute(f'DELETE FROM {FTS_TABLE}')
+        cursor.execute(f'INSERT INTO {FTS_TABLE} (rowid, content) SELECT id, content FROM chats_message')
+        return cursor.rowcount
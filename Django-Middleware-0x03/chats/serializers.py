@@ -14,4 +14,20 @@ class ConversationSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = Conversation
-        fields = ['id', 'participants', 'messages', 'created_at']
\ No newline at end of file
+        fields = ['id', 'participants', 'messages', 'created_at']
+
+class ConversationListSerializer(serializers.ModelSerializer):
+    """
+    Conversation list entry: the most recent messages (set on
+    `recent_messages` by ConversationViewSet) and summary figures instead
+    of the whole history, which stays available through the paginated
+    messages endpoint.
+    """
+    messages = MessageSerializer(source='recent_messages', many=True, read_only=True)
+    message_count = serializers.IntegerField(read_only=True)
+    last_message_at = serializers.DateTimeField(read_only=True)
+    participants = serializers.PrimaryKeyRelatedField(many=True, read_only=True)
+
+    class Meta:
+        model = Conversation
+        fields = ['id', 'participants', 'messages', 'message_count', 'last_message_at', 'created_at']
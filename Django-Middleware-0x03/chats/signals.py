@@ -0,0 +1,114 @@
+from django.db.models import BigIntegerField, Case, F, OuterRef, Q, Subquery, Value, When
+from django.db.models.functions import Greatest
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete
+from django.dispatch import receiver
+from .models import Conversation, ConversationSummary, Message
+from .permission_cache import forget_participants
+from .search import index_message, unindex_messages
+
+
+@receiver(m2m_changed, sender=Conversation.participants.through)
+def invalidate_participant_cache(sender, instance, action, reverse, pk_set, **kwargs):
+    """
+    Drop cached membership answers for the pairs whose participation changed.
+    """
+    if action == 'pre_clear':
+        # The cleared side is only known before the rows are gone.
+        if reverse:
+            pk_set = set(instance.conversations.values_list('pk', flat=True))
+        else:
+            pk_set = set(instance.participants.values_list('pk', flat=True))
+    elif action not in ('post_add', 'post_remove'):
+        return
+    if reverse:
+        forget_participants(pk_set, [instance.pk])
+    else:
+        forget_participants([instance.pk], pk_set)
+
+
+@receiver(pre_delete, sender=Conversation)
+def invalidate_deleted_conversation(sender, instance, **kwargs):
+    """
+    Deleting a conversation drops its participant rows with a fast delete,
+    which sends no m2m_changed; forget its members' answers here instead.
+    """
+    user_ids = list(instance.participants.values_list('pk', flat=True))
+    forget_participants([instance.pk], user_ids)
+
+
+@receiver(post_save, sender=Conversation)
+def create_conversation_summary(sender, instance, created, raw=False, **kwargs):
+    """
+    Start every new conversation with an empty summary row.
+    """
+    if created and not raw:
+        ConversationSummary.objects.get_or_create(conversation=instance)
+
+
+@receiver(post_save, sender=Message)
+def count_new_message(sender, instance, created, raw=False, **kwargs):
+    """
+    Bump the conversation summary in a single UPDATE. The last message only
+    moves forward, so messages committed out of order cannot roll it back.
+    """
+    if not created or raw:
+        return
+    is_newer = Q(last_message_at__isnull=True) | Q(last_message_at__lte=instance.timestamp)
+    updated = ConversationSummary.objects.filter(conversation_id=instance.conversation_id).update(
+        message_count=F('message_count') + 1,
+        last_message=Case(
+            When(is_newer, then=Value(instance.pk)), default=F('last_message'), output_field=BigIntegerField()
+        ),
+        last_message_at=Case(When(is_newer, then=Value(instance.timestamp)), default=F('last_message_at')),
+    )
+    if not updated:
+        # Conversation predates summaries; build its row from scratch.
+        ConversationSummary.objects.rebuild([instance.conversation_id])
+
+
+@receiver(post_delete, sender=Message)
+def uncount_deleted_message(sender, instance, **kwargs):
+    """
+    Decrement the count; if the deleted message was the last one (its
+    reference has been nulled by SET_NULL), pick the new last message in
+    the same UPDATE.
+    """
+    newest = Message.objects.filter(
+        conversation_id=OuterRef('conversation_id')
+    ).order_by('-timestamp', '-id')
+    was_last = Q(last_message__isnull=True)
+    ConversationSummary.objects.filter(conversation_id=instance.conversation_id).update(
+        message_count=Greatest(F('message_count') - 1, 0),
+        last_message=Case(When(was_last, then=Subquery(newest.values('pk')[:1])), default=F('last_message')),
+        last_message_at=Case(When(was_last, then=Subquery(newest.values('timestamp')[:1])), default=F('last_message_at')),
+    )
+
+
+@receiver(post_save, sender=Message)
+def index_message_content(sender, instance, created, update_fields=None, raw=False, using=None, **kwargs):
+    """
+    Keep the full-text search index in step with the content.
+    Runs before remember_saved_state, so saved_content is still the
+    content from before the save.
+    """
+    if raw:
+        return
+    if not created:
+        if update_fields is not None and 'content' not in update_fields:
+            return
+        if instance.content == getattr(instance, 'saved_content', None):
+            return
+    index_message(instance, created, using=using)
+
+
+@receiver(post_save, sender=Message)
+def remember_saved_state(sender, instance, **kwargs):
+    """
+    Refresh the saved-state snapshot once a save has gone through.
+    """
+    instance.remember_saved_state()
+
+
+@receiver(post_delete, sender=Message)
+def unindex_deleted_message(sender, instance, using=None, **kwargs):
+    unindex_messages([instance.pk], using=using)
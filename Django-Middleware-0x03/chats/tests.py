@@ -0,0 +1,709 @@
+import csv
+import json
+import os
+import tempfile
+from io import StringIO
+from unittest import mock
+from asgiref.sync import iscoroutinefunction
+from django.contrib.auth import HASH_SESSION_KEY
+from django.contrib.auth.middleware import AuthenticationMiddleware
+from django.contrib.sessions.backends.db import SessionStore
+from django.contrib.auth.models import AnonymousUser, User
+from django.http import HttpResponse
+from django.utils import timezone
+from rest_framework.test import APIRequestFactory, force_authenticate
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from . import middleware
+from .export import export_messages
+from .search import search_messages
+from .models import Conversation, ConversationSummary, Message
+from .permission_cache import is_participant
+from .permissions import IsParticipantOfConversation
+from .views import ConversationViewSet, MessageViewSet
+from .ratelimit import LocalRateLimiter, CacheRateLimiter, RateLimiter
+from .request_log import BufferedLogWriter
+from .schedule import AccessSchedule, WeeklySchedule
+
+
+class BufferedLogWriterTest(SimpleTestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, 'requests.log')
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def read_lines(self):
+        with open(self.path) as log_file:
+            return log_file.read().splitlines()
+
+    def test_flush_writes_pushed_lines_in_order(self):
+        writer = BufferedLogWriter(self.path, batch_size=3, flush_interval=60)
+        for i in range(10):
+            writer.push(f"line {i}\n")
+        writer.flush()
+        self.assertEqual(self.read_lines(), [f"line {i}" for i in range(10)])
+        writer.close()
+
+    def test_close_writes_remaining_lines(self):
+        writer = BufferedLogWriter(self.path, flush_interval=60)
+        writer.push("last\n")
+        writer.close()
+        self.assertEqual(self.read_lines(), ["last"])
+
+    def test_drop_policy_bounds_buffer(self):
+        writer = BufferedLogWriter(self.path, capacity=2, batch_size=100, flush_interval=60)
+        results = [writer.push(f"{i}\n") for i in range(5)]
+        self.assertEqual(results, [True, True, False, False, False])
+        self.assertEqual(writer.dropped, 3)
+        writer.close()
+        self.assertEqual(self.read_lines(), ["0", "1"])
+
+    def test_block_policy_loses_nothing(self):
+        writer = BufferedLogWriter(self.path, capacity=4, batch_size=2,
+                                   flush_interval=0.01, overflow='block')
+        for i in range(50):
+            writer.push(f"{i}\n")
+        writer.close()
+        self.assertEqual(len(self.read_lines()), 50)
+        self.assertEqual(writer.dropped, 0)
+
+    def test_failed_writer_falls_back_to_direct_writes(self):
+        missing_dir = os.path.join(self.tmp.name, 'missing')
+        self.path = os.path.join(missing_dir, 'requests.log')
+        for overflow in BufferedLogWriter.OVERFLOW_POLICIES:
+            writer = BufferedLogWriter(self.path, capacity=1, flush_interval=0.01,
+                                       overflow=overflow)
+            writer._start()
+            writer._thread.join()
+            self.assertIsInstance(writer.error, FileNotFoundError)
+            writer.flush()  # returns instead of waiting on the dead thread
+            os.makedirs(missing_dir, exist_ok=True)
+            self.assertTrue(writer.push("first\n"))
+            self.assertTrue(writer.push("second\n"))
+            writer.flush()
+            writer.close()
+            self.assertEqual(self.read_lines(), ["first", "second"])
+            os.remove(self.path)
+            os.rmdir(missing_dir)
+
+    def test_unknown_overflow_policy(self):
+        with self.assertRaises(ValueError):
+            BufferedLogWriter(self.path, overflow='grow')
+
+
+class FakeClock:
+    def __init__(self, now=0.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+class LocalRateLimiterTest(SimpleTestCase):
+    def test_limit_within_window(self):
+        clock = FakeClock(1000.0)
+        limiter = LocalRateLimiter(5, 60, clock=clock)
+        self.assertEqual([limiter.hit('1.2.3.4') for _ in range(6)], [True] * 5 + [False])
+        self.assertTrue(limiter.hit('5.6.7.8'))
+
+    def test_previous_window_is_weighted(self):
+        clock = FakeClock(1020.0)  # start of a window
+        limiter = LocalRateLimiter(5, 60, clock=clock)
+        for _ in range(5):
+            limiter.hit('ip')
+        clock.now = 1080.0 + 30  # halfway through the next window
+        self.assertTrue(limiter.hit('ip'))
+        self.assertTrue(limiter.hit('ip'))
+        self.assertFalse(limiter.hit('ip'))
+        clock.now = 1200.0  # two windows later nothing is left
+        self.assertTrue(limiter.hit('ip'))
+
+    def test_idle_keys_are_evicted(self):
+        limiter = LocalRateLimiter(1, 60, max_keys=2, clock=FakeClock())
+        limiter.hit('a')
+        limiter.hit('b')
+        limiter.hit('a')
+        limiter.hit('c')
+        self.assertEqual(list(limiter._counters), ['a', 'c'])
+
+
+@override_settings(CACHES={
+    'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+    'ratelimit': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'ratelimit-tests',
+    },
+})
+class CacheRateLimiterTest(SimpleTestCase):
+    def setUp(self):
+        from django.core.cache import caches
+        caches['ratelimit'].clear()
+
+    def test_workers_share_one_limit(self):
+        clock = FakeClock(1020.0)
+        workers = [CacheRateLimiter(5, 60, cache_alias='ratelimit', clock=clock) for _ in range(3)]
+        results = [workers[i % 3].hit('1.2.3.4') for i in range(9)]
+        self.assertEqual(results, [True] * 5 + [False] * 4)
+
+    def test_denied_hits_are_not_counted(self):
+        clock = FakeClock(1020.0)
+        limiter = CacheRateLimiter(2, 60, cache_alias='ratelimit', clock=clock)
+        for _ in range(5):
+            limiter.hit('ip')
+        clock.now = 1080.0 + 30  # previous window counts 2 * 0.5, not 5 * 0.5
+        self.assertTrue(limiter.hit('ip'))
+        self.assertFalse(limiter.hit('ip'))
+
+    def test_counter_expiring_before_incr(self):
+        limiter = CacheRateLimiter(3, 60, cache_alias='ratelimit', clock=FakeClock(1020.0))
+        self.assertTrue(limiter.hit('ip'))  # creates the counter with add()
+        incr = limiter.cache.incr
+        calls = []
+
+        def expire_then_incr(key, *args, **kwargs):
+            if not calls:
+                limiter.cache.delete(key)
+            calls.append(key)
+            return incr(key, *args, **kwargs)
+
+        with mock.patch.object(limiter.cache, 'incr', side_effect=expire_then_incr):
+            self.assertTrue(limiter.hit('ip'))
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(limiter.cache.get('ratelimit:ip:17'), 1)
+
+    def test_counter_expiring_before_decr(self):
+        limiter = CacheRateLimiter(1, 60, cache_alias='ratelimit', clock=FakeClock(1020.0))
+        self.assertTrue(limiter.hit('ip'))
+        with mock.patch.object(limiter.cache, 'decr', side_effect=ValueError):
+            self.assertFalse(limiter.hit('ip'))
+
+    def test_round_trips(self):
+        limiter = CacheRateLimiter(1, 60, cache_alias='ratelimit', clock=FakeClock(1020.0))
+        calls = []
+        cache = limiter.cache
+
+        class RecordingCache:
+            def __getattr__(self, name):
+                calls.append(name)
+                return getattr(cache, name)
+
+        limiter.cache = RecordingCache()
+        limiter.hit('ip')
+        limiter.hit('ip')
+        self.assertEqual(calls, ['get_many', 'add', 'get_many', 'incr', 'decr'])
+
+    async def test_async_hits_share_the_limit(self):
+        clock = FakeClock(1020.0)
+        workers = [CacheRateLimiter(5, 60, cache_alias='ratelimit', clock=clock) for _ in range(2)]
+        results = []
+        for i in range(4):
+            results.append(await workers[0].ahit('ip'))
+            results.append(workers[1].hit('ip'))
+        self.assertEqual(results, [True] * 5 + [False] * 3)
+        clock.now = 1080.0 + 30  # denied hits were given back: 5 * 0.5 left
+        self.assertTrue(await workers[0].ahit('ip'))
+        self.assertTrue(await workers[0].ahit('ip'))
+        self.assertFalse(await workers[0].ahit('ip'))
+
+    def test_base_class_is_abstract(self):
+        with self.assertRaises(TypeError):
+            RateLimiter(5, 60)
+
+
+MONDAY = 4 * 24 * 3600  # 1970-01-05 00:00 UTC
+HOUR = 3600
+
+
+class WeeklyScheduleTest(SimpleTestCase):
+    def test_business_hours(self):
+        clock = FakeClock()
+        schedule = WeeklySchedule([{'days': [0, 1, 2, 3, 4], 'start': '09:00', 'end': '18:00'}], clock=clock)
+        for now, expected in [
+            (MONDAY + 8 * HOUR, False),
+            (MONDAY + 9 * HOUR, True),
+            (MONDAY + 17 * HOUR, True),
+            (MONDAY + 18 * HOUR, True),
+            (MONDAY + 18 * HOUR + 1, False),
+            (MONDAY + 5 * 24 * HOUR + 10 * HOUR, False),  # Saturday
+        ]:
+            clock.now = now
+            self.assertEqual(schedule.is_open(), expected, now)
+
+    def test_caches_next_boundary(self):
+        clock = FakeClock(MONDAY + 10 * HOUR)
+        schedule = WeeklySchedule([{'start': '09:00', 'end': '18:00'}], clock=clock)
+        self.assertTrue(schedule.is_open())
+        self.assertEqual(schedule._state, (MONDAY + 18 * HOUR, True))
+        clock.now = MONDAY + 20 * HOUR
+        self.assertFalse(schedule.is_open())
+        self.assertEqual(schedule._state, (MONDAY + 33 * HOUR, False))
+
+    def test_end_time_is_inclusive(self):
+        clock = FakeClock(MONDAY + 17 * HOUR)
+        schedule = WeeklySchedule([{'start': '09:00', 'end': '18:00'}], clock=clock)
+        self.assertTrue(schedule.is_open())
+        clock.now = MONDAY + 18 * HOUR  # answered from the cached state
+        self.assertTrue(schedule.is_open())
+        clock.now = MONDAY + 18 * HOUR + 0.5
+        self.assertFalse(schedule.is_open())
+        clock.now = MONDAY + 18 * HOUR
+        self.assertTrue(WeeklySchedule([{'start': '09:00', 'end': '18:00'}], clock=clock).is_open())
+
+    def test_window_past_midnight_and_week_end(self):
+        clock = FakeClock()
+        schedule = WeeklySchedule([{'days': [6], 'start': '22:00', 'end': '02:00'}], clock=clock)
+        clock.now = MONDAY + 7 * 24 * HOUR + 1 * HOUR  # following Monday 01:00
+        self.assertTrue(schedule.is_open())
+        clock.now = MONDAY + 7 * 24 * HOUR + 3 * HOUR
+        self.assertFalse(schedule.is_open())
+
+
+class AccessScheduleTest(SimpleTestCase):
+    def test_first_matching_rule_decides(self):
+        clock = FakeClock(MONDAY + 22 * HOUR)
+        schedule = AccessSchedule([
+            {'paths': ['/admin/'], 'roles': ['staff'], 'windows': [{'start': '00:00', 'end': '00:00'}]},
+            {'paths': ['/chats/'], 'windows': [{'start': '09:00', 'end': '18:00'}]},
+        ], clock=clock)
+        request = RequestFactory().get('/admin/')
+        request.user = User(is_staff=True)
+        self.assertTrue(schedule.allows(request))
+        request.user = AnonymousUser()
+        self.assertTrue(schedule.allows(request))  # no rule matches
+        request = RequestFactory().get('/chats/messages/')
+        self.assertFalse(schedule.allows(request))
+
+    async def test_async_variant_loads_user_once(self):
+        clock = FakeClock(MONDAY + 22 * HOUR)
+        schedule = AccessSchedule([
+            {'roles': ['superuser'], 'windows': []},
+            {'roles': ['staff'], 'windows': [{'start': '00:00', 'end': '00:00'}]},
+        ], clock=clock)
+        request = RequestFactory().get('/chats/')
+        user = User(is_staff=True)
+        loads = []
+
+        async def auser():
+            loads.append(user)
+            return user
+
+        request.auser = auser
+        self.assertTrue(await schedule.aallows(request))
+        self.assertEqual(len(loads), 1)
+        request = RequestFactory().get('/chats/')
+        request.auser = auser
+        user = AnonymousUser()
+        self.assertTrue(await schedule.aallows(request))  # no rule matches
+
+
+@override_settings(RATE_LIMIT={'BACKEND': 'chats.ratelimit.LocalRateLimiter', 'LIMIT': 1, 'WINDOW': 60},
+                   ACCESS_SCHEDULE=[])
+class AsyncMiddlewareTest(SimpleTestCase):
+    classes = [
+        middleware.RequestLoggingMiddleware,
+        middleware.RestrictAccessByTimeMiddleware,
+        middleware.OffensiveLanguageMiddleware,
+        middleware.RolepermissionMiddleware,
+    ]
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.log_settings = override_settings(REQUEST_LOG={'PATH': os.path.join(self.tmp.name, 'requests.log')})
+        self.log_settings.enable()
+
+    def tearDown(self):
+        self.log_settings.disable()
+        self.tmp.cleanup()
+
+    def make_request(self, method='get', user=None):
+        request = getattr(RequestFactory(), method)('/chats/messages/')
+        user = user or AnonymousUser()
+        request.user = user
+
+        async def auser():
+            return user
+
+        request.auser = auser
+        return request
+
+    def test_mode_follows_get_response(self):
+        async def async_view(request):
+            return HttpResponse()
+
+        for cls in self.classes:
+            self.assertTrue(iscoroutinefunction(cls(async_view)), cls)
+            self.assertFalse(iscoroutinefunction(cls(lambda request: HttpResponse())), cls)
+
+    async def test_async_stack(self):
+        async def view(request):
+            return HttpResponse('ok')
+
+        handler = view
+        for cls in reversed(self.classes):
+            handler = cls(handler)
+        response = await handler(self.make_request('post'))
+        self.assertEqual(response.status_code, 200)
+        response = await handler(self.make_request('post'))
+        self.assertEqual(response.status_code, 403)
+        response = await handler(self.make_request(user=User(username='bob')))
+        self.assertEqual(response.status_code, 403)
+
+
+class ParticipantCacheTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.alice = User.objects.create_user(username='alice', password='pass')
+        self.bob = User.objects.create_user(username='bob', password='pass')
+        self.conversation = Conversation.objects.create()
+        self.conversation.participants.add(self.alice)
+
+    def test_answer_is_cached(self):
+        with self.assertNumQueries(1):
+            self.assertTrue(is_participant(self.alice, self.conversation.pk))
+        with self.assertNumQueries(0):
+            self.assertTrue(is_participant(self.alice, self.conversation.pk))
+            self.assertFalse(is_participant(AnonymousUser(), self.conversation.pk))
+
+    def test_invalidated_by_participant_changes(self):
+        self.assertFalse(is_participant(self.bob, self.conversation.pk))
+        self.conversation.participants.add(self.bob)
+        self.assertTrue(is_participant(self.bob, self.conversation.pk))
+        self.bob.conversations.remove(self.conversation)
+        self.assertFalse(is_participant(self.bob, self.conversation.pk))
+        self.assertTrue(is_participant(self.alice, self.conversation.pk))
+        self.conversation.participants.clear()
+        self.assertFalse(is_participant(self.alice, self.conversation.pk))
+
+    def test_invalidated_by_conversation_delete(self):
+        conversation_id = self.conversation.pk
+        self.assertTrue(is_participant(self.alice, conversation_id))
+        self.conversation.delete()
+        self.assertFalse(is_participant(self.alice, conversation_id))
+
+    def test_object_permission_for_message(self):
+        message = Message.objects.create(conversation=self.conversation, sender=self.alice, content='hi')
+        permission = IsParticipantOfConversation()
+        request = RequestFactory().delete('/')
+        request.user = self.alice
+        self.assertTrue(permission.has_object_permission(request, None, message))
+        request.user = self.bob
+        self.assertFalse(permission.has_object_permission(request, None, message))
+
+
+class RolepermissionMiddlewareTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='carol', password='pass')
+        self.middleware = middleware.RolepermissionMiddleware(lambda request: HttpResponse())
+        self.client.force_login(self.user)
+
+    def make_request(self, session):
+        request = RequestFactory().get('/')
+        request.session = session
+        AuthenticationMiddleware(lambda request: None).process_request(request)
+        return request
+
+    def test_stale_session_does_not_grant_the_user_access(self):
+        stale = SessionStore()
+        stale.update(dict(self.client.session.items()))
+        stale[HASH_SESSION_KEY] = 'stale'
+        self.assertEqual(self.middleware(self.make_request(stale)).status_code, 200)  # anonymous
+        self.assertEqual(self.middleware(self.make_request(self.client.session)).status_code, 403)
+
+    def test_role_change_applies_at_once(self):
+        self.assertEqual(self.middleware(self.make_request(self.client.session)).status_code, 403)
+        self.user.is_staff = True
+        self.user.save()
+        self.assertEqual(self.middleware(self.make_request(self.client.session)).status_code, 200)
+
+
+class MessageCursorPaginationTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='dave', password='pass')
+        self.conversation = Conversation.objects.create()
+        self.conversation.participants.add(self.user)
+        self.messages = [
+            Message.objects.create(conversation=self.conversation, sender=self.user, content=str(i))
+            for i in range(25)
+        ]
+        # Ties on timestamp must still paginate deterministically by id.
+        Message.objects.filter(pk__in=[m.pk for m in self.messages[5:15]]).update(timestamp=timezone.now())
+        self.view = MessageViewSet.as_view({'get': 'list'})
+
+    def get(self, url):
+        request = APIRequestFactory().get(url)
+        force_authenticate(request, user=self.user)
+        response = self.view(request)
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def expected_ids(self):
+        return list(Message.objects.order_by('-timestamp', '-id').values_list('id', flat=True))
+
+    def test_walk_forward_and_back(self):
+        expected = self.expected_ids()
+        pages = []
+        data = self.get('/chats/messages/?pagination=cursor&page_size=10')
+        self.assertNotIn('total_count', data)
+        self.assertIsNone(data['previous'])
+        pages.append([m['id'] for m in data['results']])
+        while data['next']:
+            data = self.get(data['next'])
+            pages.append([m['id'] for m in data['results']])
+        self.assertEqual(sum(pages, []), expected)
+
+        data = self.get(data['previous'])
+        self.assertEqual([m['id'] for m in data['results']], pages[1])
+
+    def test_search_is_rejected(self):
+        request = APIRequestFactory().get('/chats/messages/?pagination=cursor&search=lunch')
+        force_authenticate(request, user=self.user)
+        response = self.view(request)
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('search', response.data)
+
+    def test_new_messages_do_not_shift_pages(self):
+        data = self.get('/chats/messages/?pagination=cursor&page_size=10')
+        Message.objects.create(conversation=self.conversation, sender=self.user, content='new')
+        data = self.get(data['next'])
+        self.assertEqual([m['id'] for m in data['results']], self.expected_ids()[11:21])
+
+    def test_capped_count(self):
+        data = self.get('/chats/messages/?pagination=cursor&count=true')
+        self.assertEqual(data['total_count'], 25)
+        self.assertTrue(data['total_count_exact'])
+
+    def test_invalid_cursor(self):
+        request = APIRequestFactory().get('/chats/messages/?pagination=cursor&cursor=nonsense')
+        force_authenticate(request, user=self.user)
+        self.assertEqual(self.view(request).status_code, 404)
+
+
+class ListQueryCountTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='erin', password='pass')
+        self.others = [User.objects.create_user(username=f'user{i}', password='pass') for i in range(3)]
+
+    def add_conversations(self, count, messages_each=3):
+        for _ in range(count):
+            conversation = Conversation.objects.create()
+            conversation.participants.add(self.user, *self.others)
+            for i in range(messages_each):
+                Message.objects.create(conversation=conversation, sender=self.others[i % 3], content=str(i))
+
+    def list(self, viewset):
+        request = APIRequestFactory().get('/')
+        force_authenticate(request, user=self.user)
+        response = viewset.as_view({'get': 'list'})(request)
+        self.assertEqual(response.status_code, 200)
+
+    def test_queries_do_not_grow_with_results(self):
+        for viewset in (ConversationViewSet, MessageViewSet):
+            self.add_conversations(1)
+            with self.assertNumQueries(4 if viewset is ConversationViewSet else 2) as small:
+                self.list(viewset)
+            self.add_conversations(4, messages_each=5)
+            with self.assertNumQueries(len(small)):
+                self.list(viewset)
+
+
+class ConversationPreviewTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='frank', password='pass')
+        self.conversations = []
+        for size in (5, 1, 0):
+            conversation = Conversation.objects.create()
+            conversation.participants.add(self.user)
+            for i in range(size):
+                Message.objects.create(conversation=conversation, sender=self.user, content=str(i))
+            self.conversations.append(conversation)
+
+    def get(self, url, action='list'):
+        request = APIRequestFactory().get(url)
+        force_authenticate(request, user=self.user)
+        view = ConversationViewSet.as_view({'get': action})
+        if action == 'list':
+            return view(request).data
+        return view(request, pk=self.conversations[0].pk).data
+
+    def test_list_returns_latest_messages_and_count(self):
+        results = {c['id']: c for c in self.get('/?preview=2')['results']}
+        first = results[self.conversations[0].pk]
+        self.assertEqual([m['content'] for m in first['messages']], ['3', '4'])
+        self.assertEqual(first['message_count'], 5)
+        self.assertEqual(len(results[self.conversations[1].pk]['messages']), 1)
+        self.assertEqual(results[self.conversations[2].pk]['message_count'], 0)
+
+    def test_detail_keeps_full_history(self):
+        data = self.get('/', action='retrieve')
+        self.assertEqual(len(data['messages']), 5)
+        self.assertNotIn('message_count', data)
+
+
+class ConversationSummaryTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='grace', password='pass')
+        self.conversation = Conversation.objects.create()
+        self.conversation.participants.add(self.user)
+
+    def send(self, content, conversation=None):
+        return Message.objects.create(
+            conversation=conversation or self.conversation, sender=self.user, content=content
+        )
+
+    def summary(self):
+        return ConversationSummary.objects.get(conversation=self.conversation)
+
+    def test_new_conversation_has_empty_summary(self):
+        summary = self.summary()
+        self.assertEqual(summary.message_count, 0)
+        self.assertIsNone(summary.last_message)
+
+    def test_messages_update_summary_in_one_query(self):
+        self.send('first')
+        with self.assertNumQueries(3):  # INSERT + summary UPDATE + search index INSERT
+            second = self.send('second')
+        summary = self.summary()
+        self.assertEqual(summary.message_count, 2)
+        self.assertEqual(summary.last_message, second)
+        self.assertEqual(summary.last_message_at, second.timestamp)
+
+    def test_deleting_last_message_moves_summary_back(self):
+        first = self.send('first')
+        second = self.send('second')
+        second.delete()
+        summary = self.summary()
+        self.assertEqual(summary.message_count, 1)
+        self.assertEqual(summary.last_message, first)
+        first.delete()
+        summary = self.summary()
+        self.assertEqual(summary.message_count, 0)
+        self.assertIsNone(summary.last_message_at)
+
+    def test_rebuild_command_repairs_bulk_imports(self):
+        Message.objects.bulk_create([
+            Message(conversation=self.conversation, sender=self.user, content=str(i)) for i in range(3)
+        ])
+        ConversationSummary.objects.all().delete()
+        call_command('rebuild_conversation_summaries', stdout=StringIO())
+        summary = self.summary()
+        self.assertEqual(summary.message_count, 3)
+        self.assertEqual(summary.last_message.content, '2')
+
+    def test_conversation_list_is_ordered_by_activity(self):
+        other = Conversation.objects.create()
+        other.participants.add(self.user)
+        self.send('old', other)
+        self.send('new')
+        request = APIRequestFactory().get('/')
+        force_authenticate(request, user=self.user)
+        data = ConversationViewSet.as_view({'get': 'list'})(request).data
+        self.assertEqual([c['id'] for c in data['results']], [self.conversation.pk, other.pk])
+        self.assertEqual(data['results'][0]['message_count'], 1)
+
+
+class MessageExportTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='gina', password='pass')
+        self.conversation = Conversation.objects.create()
+        self.conversation.participants.add(self.user)
+        self.messages = [
+            Message.objects.create(conversation=self.conversation, sender=self.user, content=content)
+            for content in ('Hi, "all"', 'line\nbreak')
+        ]
+        other = Conversation.objects.create()
+        Message.objects.create(conversation=other, sender=self.user, content='not a participant')
+        self.view = MessageViewSet.as_view({'get': 'export'})
+
+    def get(self, url):
+        request = APIRequestFactory().get(url)
+        force_authenticate(request, user=self.user)
+        return self.view(request)
+
+    def test_ndjson_streams_only_participant_messages(self):
+        response = self.get('/chats/messages/export/')
+        self.assertTrue(response.streaming)
+        rows = [json.loads(line) for line in b''.join(response.streaming_content).decode().splitlines()]
+        self.assertEqual([row['id'] for row in rows], [m.pk for m in self.messages])
+        self.assertEqual(rows[0]['sender'], 'gina')
+        self.assertEqual(rows[1]['content'], 'line\nbreak')
+
+    def test_csv_and_filters(self):
+        response = self.get(f'/chats/messages/export/?output=csv&conversation={self.conversation.pk}')
+        self.assertEqual(response['Content-Type'], 'text/csv')
+        rows = list(csv.DictReader(StringIO(b''.join(response.streaming_content).decode())))
+        self.assertEqual([row['content'] for row in rows], ['Hi, "all"', 'line\nbreak'])
+        self.assertEqual(self.get('/chats/messages/export/?output=xml').status_code, 400)
+
+    def test_one_query_without_instances(self):
+        with self.assertNumQueries(1):
+            chunks = list(export_messages(Message.objects.all()))
+        self.assertEqual(len(''.join(chunks).splitlines()), 3)
+
+    def test_command(self):
+        out = StringIO()
+        call_command('export_messages', self.conversation.pk, format='csv', stdout=out)
+        self.assertEqual(len(list(csv.reader(StringIO(out.getvalue())))), 3)
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'export.ndjson')
+            call_command('export_messages', user='gina', output=path)
+            with open(path, encoding='utf-8') as exported:
+                self.assertEqual(len(exported.readlines()), 2)
+
+
+class MessageSearchTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='hana', password='pass')
+        self.conversation = Conversation.objects.create()
+        self.conversation.participants.add(self.user)
+        self.lunch = self.send('Lunch at noon? The lunch place by the station')
+        self.meeting = self.send('Meeting moved, lunch after')
+        self.send('Nothing to see here')
+        other = Conversation.objects.create()
+        Message.objects.create(conversation=other, sender=self.user, content='lunch elsewhere')
+        self.view = MessageViewSet.as_view({'get': 'list'})
+
+    def send(self, content):
+        return Message.objects.create(conversation=self.conversation, sender=self.user, content=content)
+
+    def get(self, url):
+        request = APIRequestFactory().get(url)
+        force_authenticate(request, user=self.user)
+        response = self.view(request)
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def test_search_filter_is_ranked(self):
+        data = self.get(f'/chats/messages/?search=lunch&conversation={self.conversation.pk}')
+        self.assertEqual([m['id'] for m in data['results']], [self.lunch.pk, self.meeting.pk])
+        self.assertEqual(data['total_count'], 2)
+        data = self.get('/chats/messages/?search=lunch meeting')
+        self.assertEqual([m['id'] for m in data['results']], [self.meeting.pk])
+
+    def test_index_follows_edits_and_deletes(self):
+        self.meeting.content = 'Meeting cancelled'
+        self.meeting.save()
+        self.lunch.delete()
+        self.assertEqual(list(search_messages(Message.objects.filter(conversation=self.conversation), 'lunch')), [])
+        self.assertEqual(list(search_messages(Message.objects.all(), 'cancelled')), [self.meeting])
+
+    def test_unchanged_content_is_not_reindexed(self):
+        with self.assertNumQueries(1):  # UPDATE only
+            self.meeting.save()
+        message = Message.objects.get(pk=self.meeting.pk)
+        with self.assertNumQueries(1):
+            message.save()
+        message.content = 'Meeting cancelled'
+        with self.assertNumQueries(3):  # UPDATE + index DELETE + INSERT
+            message.save()
+        self.assertEqual(list(search_messages(Message.objects.all(), 'cancelled')), [self.meeting])
+
+    def test_rebuild_command(self):
+        Message.objects.bulk_create([
+            Message(conversation=self.conversation, sender=self.user, content='imported lunch')
+        ])
+        self.assertEqual(search_messages(Message.objects.all(), 'imported').count(), 0)
+        call_command('rebuild_search_index', stdout=StringIO())
+        self.assertEqual(search_messages(Message.objects.all(), 'imported').count(), 1)
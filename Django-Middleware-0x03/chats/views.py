@@ -1,9 +1,16 @@
+from django.db.models import Prefetch
+from django.http import StreamingHttpResponse
 from rest_framework import viewsets
+from rest_framework.decorators import action
+from rest_framework.exceptions import PermissionDenied
 from rest_framework.permissions import IsAuthenticated
+from rest_framework.response import Response
+from .export import EXPORT_FORMATS, export_messages
 from .models import Conversation, Message
-from .serializers import ConversationSerializer, MessageSerializer
+from .serializers import ConversationListSerializer, ConversationSerializer, MessageSerializer
 from .permissions import IsParticipantOfConversation
-from .pagination import MessagePagination
+from .permission_cache import is_participant
+from .pagination import MessageCursorPagination, MessagePagination
 from .filters import MessageFilter, ConversationFilter
 
 class ConversationViewSet(viewsets.ModelViewSet):
@@ -12,8 +19,49 @@ class ConversationViewSet(viewsets.ModelViewSet):
     permission_classes = [IsAuthenticated, IsParticipantOfConversation]
     filterset_class = ConversationFilter
 
+    message_preview_size = 3
+    max_message_preview_size = 20
+
     def get_queryset(self):
-        return self.request.user.conversations.all()
+        queryset = self.request.user.conversations.prefetch_related('participants')
+        if self.action == 'list':
+            # Lists are ordered by activity and carry a count and a bounded
+            # preview, see paginate_queryset.
+            return queryset.with_summary()
+        return queryset.prefetch_related(
+            Prefetch('messages', queryset=Message.objects.select_related('sender')),
+        )
+
+    def paginate_queryset(self, queryset):
+        page = super().paginate_queryset(queryset)
+        if self.action == 'list':
+            self.attach_recent_messages(queryset if page is None else page)
+        return page
+
+    def attach_recent_messages(self, conversations):
+        """
+        Set `recent_messages` to the last ?preview=N messages of each
+        conversation on the page, fetched in one query.
+        """
+        by_id = {}
+        for conversation in conversations:
+            conversation.recent_messages = []
+            by_id[conversation.pk] = conversation
+        messages = Message.objects.latest_per_conversation(list(by_id), self.get_preview_size())
+        for message in messages.select_related('sender'):
+            by_id[message.conversation_id].recent_messages.append(message)
+
+    def get_serializer_class(self):
+        if self.action == 'list':
+            return ConversationListSerializer
+        return super().get_serializer_class()
+
+    def get_preview_size(self):
+        try:
+            size = int(self.request.query_params['preview'])
+        except (KeyError, ValueError):
+            return self.message_preview_size
+        return min(max(size, 0), self.max_message_preview_size)
 
 class MessageViewSet(viewsets.ModelViewSet):
     queryset = Message.objects.all()
@@ -23,13 +71,39 @@ class MessageViewSet(viewsets.ModelViewSet):
     filterset_class = MessageFilter
 
     def get_queryset(self):
-        return Message.objects.filter(conversation__participants=self.request.user)
+        return Message.objects.filter(
+            conversation__participants=self.request.user
+        ).select_related('sender')
+
+    @property
+    def paginator(self):
+        # Clients opt in to keyset pagination with ?pagination=cursor.
+        if not hasattr(self, '_paginator'):
+            if self.request.query_params.get('pagination') == 'cursor':
+                self._paginator = MessageCursorPagination()
+            else:
+                self._paginator = self.pagination_class()
+        return self._paginator
 
     def perform_create(self, serializer):
         conversation = serializer.validated_data.get('conversation')
-        conversation_id = conversation.id if conversation else None
-        if not conversation or self.request.user not in conversation.participants.all():
-            from rest_framework import status
-            from rest_framework.response import Response
-            raise Response({'error': 'You are not a participant in this conversation'}, status=status.HTTP_403_FORBIDDEN)
+        if not conversation or not is_participant(self.request.user, conversation.pk):
+            raise PermissionDenied('You are not a participant in this conversation')
         serializer.save(sender=self.request.user)
+
+    @action(detail=False)
+    def export(self, request):
+        """
+        Stream the user's messages, narrowed by the usual filters, as NDJSON
+        or ?output=csv without loading them into memory. (?format is DRF's
+        renderer override.)
+        """
+        output = request.query_params.get('output', 'ndjson')
+        if output not in EXPORT_FORMATS:
+            return Response({'detail': 'Unknown output format.'}, status=400)
+        messages = self.filter_queryset(self.get_queryset())
+        response = StreamingHttpResponse(
+            export_messages(messages, output), content_type=EXPORT_FORMATS[output]
+        )
+        response['Content-Disposition'] = f'attachment; filename="messages.{output}"'
+        return response
@@ -72,6 +72,44 @@ MIDDLEWARE = [
     'chats.middleware.RolepermissionMiddleware',
 ]
 
+# Buffered request log used by chats.middleware.RequestLoggingMiddleware.
+# Lines are written in batches of BATCH_SIZE or every FLUSH_INTERVAL seconds;
+# at most CAPACITY lines are buffered and OVERFLOW is 'drop' or 'block'.
+REQUEST_LOG = {
+    'PATH': BASE_DIR / 'requests.log',
+    'CAPACITY': 10000,
+    'BATCH_SIZE': 256,
+    'FLUSH_INTERVAL': 1.0,
+    'OVERFLOW': 'drop',
+}
+
+# Message rate limit enforced by chats.middleware.OffensiveLanguageMiddleware:
+# at most LIMIT POSTs to messages per WINDOW seconds per client IP.
+# CacheRateLimiter shares counters through CACHE_ALIAS, which must point at a
+# cache all workers can see (Redis, Memcached, database) in production;
+# LocalRateLimiter keeps them in-process, evicting idle IPs past MAX_KEYS.
+RATE_LIMIT = {
+    'BACKEND': 'chats.ratelimit.CacheRateLimiter',
+    'LIMIT': 5,
+    'WINDOW': 60,
+    'CACHE_ALIAS': 'default',
+}
+
+# Opening hours enforced by chats.middleware.RestrictAccessByTimeMiddleware.
+# Rules are checked in order and the first one whose optional 'paths'
+# (prefixes) and 'roles' ('superuser', 'staff', 'user', 'anonymous') match
+# the request decides. 'days' are 0 (Monday) to 6 and default to every day;
+# times are local to TIME_ZONE. Requests matching no rule are allowed.
+ACCESS_SCHEDULE = [
+    {
+        'windows': [{'start': '09:00', 'end': '18:00'}],
+    },
+]
+
+# Seconds to keep cached participant decisions (see chats.permission_cache);
+# entries are also dropped when memberships change.
+PERMISSION_CACHE_TIMEOUT = 300
+
 ROOT_URLCONF = 'messaging_app.urls'
 
 TEMPLATES = [
@@ -0,0 +1,71 @@
+"""
+Time and peak Python memory of deleting a user with many messages:
+user.delete() with its CASCADE against messaging.deletion.delete_account(),
+on a throwaway SQLite database. Every message has a notification and every
+tenth one a reply from the other side.
+
+Run from the project directory:
+    python benchmarks/account_deletion.py [messages]
+"""
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'messaging_app.settings')
+
+import django
+
+django.setup()
+
+from django.contrib.auth.models import User
+from django.db import connection
+
+from messaging.deletion import delete_account
+from messaging.models import Message, Notification
+from messaging.notifications import bulk_send_messages
+
+
+def populate(count):
+    heavy = User.objects.create_user(username='heavy', password='bench')
+    others = [User.objects.create_user(username=f"friend{i}", password='bench') for i in range(10)]
+    messages = bulk_send_messages(
+        Message(sender=heavy, receiver=others[i % 10], content=f"message {i}")
+        if i % 2 else
+        Message(sender=others[i % 10], receiver=heavy, content=f"message {i}")
+        for i in range(count)
+    )
+    bulk_send_messages(
+        Message(
+            sender=message.receiver, receiver=message.sender,
+            content=f"reply to {message.pk}", parent_message=message,
+        )
+        for message in messages[::10]
+    )
+    return heavy
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    with tempfile.TemporaryDirectory() as tmp:
+        connection.settings_dict['TEST']['NAME'] = os.path.join(tmp, 'bench.sqlite3')
+        connection.creation.create_test_db(verbosity=0, serialize=False)
+        print(f"user with {count} messages, {count // 10} replies")
+        for label, delete in [('user.delete()', lambda user: user.delete()),
+                              ('delete_account()', delete_account)]:
+            heavy = populate(count)
+            tracemalloc.start()
+            start = time.perf_counter()
+            delete(heavy)
+            elapsed = time.perf_counter() - start
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+            assert not Message.objects.exists() and not Notification.objects.exists()
+            User.objects.all().delete()
+            print(f"{label:18} {elapsed * 1000:9.1f} ms  peak {peak / 2 ** 20:7.1f} MiB")
+
+
+if __name__ == '__main__':
+    main()
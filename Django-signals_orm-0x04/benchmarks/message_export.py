@@ -0,0 +1,126 @@
+"""
+Peak memory of exporting every message as NDJSON: serialising a list of
+Message instances in one go against the streaming export
+(messaging.export), on a throwaway SQLite database. Each export runs in a
+fresh child process so its peak RSS is its own.
+
+Run from the project directory:
+    python benchmarks/message_export.py [messages]
+"""
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'messaging_app.settings')
+
+import django
+
+django.setup()
+
+from django.contrib.auth.models import User
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connection
+
+from messaging.export import export_messages
+from messaging.models import Message
+
+
+def export_in_memory(output):
+    """
+    What an export without streaming does: load the instances, build the
+    whole document, then write it.
+    """
+    rows = [
+        {
+            'id': message.pk,
+            'timestamp': message.timestamp,
+            'sender': message.sender.username,
+            'receiver': message.receiver.username,
+            'parent_message': message.parent_message_id,
+            'content': message.content,
+            'read': message.read,
+            'edited': message.edited,
+        }
+        for message in Message.objects.select_related('sender', 'receiver').order_by('pk')
+    ]
+    output.write(''.join(json.dumps(row, cls=DjangoJSONEncoder) + '\n' for row in rows))
+
+
+def export_streaming(output):
+    output.writelines(export_messages())
+
+
+EXPORTS = {'in memory': export_in_memory, 'streaming': export_streaming}
+
+
+def peak_rss_mb():
+    # ru_maxrss survives exec() on Linux, so a child would report the
+    # parent's peak; VmHWM belongs to this process image only.
+    try:
+        with open('/proc/self/status') as status:
+            for line in status:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Bytes on macOS, KiB elsewhere.
+    return peak / (1024 * 1024 if sys.platform == 'darwin' else 1024)
+
+
+def run_child(label, database):
+    connection.settings_dict['NAME'] = database
+    connection.ensure_connection()
+    baseline = peak_rss_mb()
+    start = time.perf_counter()
+    with open(os.devnull, 'w', encoding='utf-8') as output:
+        EXPORTS[label](output)
+    elapsed = time.perf_counter() - start
+    print(json.dumps({'baseline': baseline, 'peak': peak_rss_mb(), 'elapsed': elapsed}))
+
+
+def populate(count, users=100, batch_size=10000):
+    people = User.objects.bulk_create(
+        User(username=f"user{i}", password='bench') for i in range(users)
+    )
+    for start in range(0, count, batch_size):
+        Message.objects.bulk_create(
+            Message(
+                sender=people[i % users],
+                receiver=people[(i + 1) % users],
+                content=f"message {i} " + 'x' * 80,
+            )
+            for i in range(start, min(start + batch_size, count))
+        )
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+    with tempfile.TemporaryDirectory() as tmp:
+        database = os.path.join(tmp, 'bench.sqlite3')
+        connection.settings_dict['TEST']['NAME'] = database
+        connection.creation.create_test_db(verbosity=0, serialize=False)
+        populate(count)
+        connection.close()
+        print(f"{count} messages exported as NDJSON")
+        for label in EXPORTS:
+            result = json.loads(subprocess.check_output(
+                [sys.executable, os.path.abspath(__file__), '--child', label, database]
+            ))
+            print(
+                f"{label:10} peak RSS {result['peak']:8.1f} MB "
+                f"(+{result['peak'] - result['baseline']:7.1f} MB over startup)  "
+                f"{result['elapsed'] * 1000:9.1f} ms"
+            )
+
+
+if __name__ == '__main__':
+    if sys.argv[1:2] == ['--child']:
+        run_child(sys.argv[2], sys.argv[3])
+    else:
+        main()
@@ -0,0 +1,84 @@
+"""
+Time searching message content with icontains (LIKE '%word%', a scan of
+every row) against the full-text index (messaging.search), for a rare and
+a common word, on a throwaway SQLite database.
+
+Run from the project directory:
+    python benchmarks/message_search.py [messages]
+"""
+import itertools
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'messaging_app.settings')
+
+import django
+
+django.setup()
+
+from django.contrib.auth.models import User
+from django.db import connection
+
+from messaging.models import Message
+from messaging.search import rebuild_search_index, search_messages
+
+# Fixed width, so no word is a substring of another and icontains finds
+# exactly what the full-text search does.
+VOCABULARY = [f"w{i:05d}" for i in range(20000)]
+
+
+def populate(count, batch_size=10000):
+    sender = User.objects.create_user(username='sender', password='bench')
+    receiver = User.objects.create_user(username='receiver', password='bench')
+    rng = random.Random(0)
+    # Zipf-like word frequencies: w00000 is in most messages, w19999 in few.
+    cumulative = list(itertools.accumulate(1 / (rank + 1) for rank in range(len(VOCABULARY))))
+    for start in range(0, count, batch_size):
+        Message.objects.bulk_create(
+            Message(
+                sender=sender, receiver=receiver,
+                content=' '.join(rng.choices(VOCABULARY, cum_weights=cumulative, k=12)),
+            )
+            for _ in range(start, min(start + batch_size, count))
+        )
+    rebuild_search_index()
+
+
+def timed(run, repeat=3):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = run()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+    with tempfile.TemporaryDirectory() as tmp:
+        connection.settings_dict['TEST']['NAME'] = os.path.join(tmp, 'bench.sqlite3')
+        connection.creation.create_test_db(verbosity=0, serialize=False)
+        start = time.perf_counter()
+        populate(count)
+        print(f"{count} messages, populated and indexed in {time.perf_counter() - start:.1f} s")
+        messages = Message.objects.all()
+        for word in ('w19999', 'w00007'):
+            matches = search_messages(messages, word).count()
+            print(f"{word} ({matches} matches), first page of 20 and count:")
+            for label, search in [
+                ('icontains', lambda: messages.filter(content__icontains=word).order_by('-timestamp')),
+                ('full-text', lambda: search_messages(messages, word)),
+            ]:
+                page, _ = timed(lambda: list(search()[:20]))
+                total, found = timed(lambda: search().count())
+                assert found == matches
+                print(f"  {label:10} page {page * 1000:9.1f} ms  count {total * 1000:9.1f} ms")
+
+
+if __name__ == '__main__':
+    main()
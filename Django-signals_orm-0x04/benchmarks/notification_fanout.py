@@ -0,0 +1,81 @@
+"""
+Time to send messages with their notifications: one Notification INSERT
+per message inside post_save (the old receiver), notifications batched on
+commit, and bulk_send_messages(), on a throwaway SQLite database.
+
+Run from the project directory:
+    python benchmarks/notification_fanout.py [messages]
+"""
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'messaging_app.settings')
+
+import django
+
+django.setup()
+
+from django.contrib.auth.models import User
+from django.db import connection, transaction
+from django.db.models.signals import post_save
+
+from messaging import signals
+from messaging.models import Message, Notification
+from messaging.notifications import bulk_send_messages
+
+
+def notify_immediately(sender, instance, created, **kwargs):
+    """
+    The receiver as it was: one INSERT per message, inside post_save.
+    """
+    if created:
+        Notification.objects.create(user=instance.receiver, message=instance)
+
+
+def send_one_by_one(sender, receiver, count):
+    with transaction.atomic():
+        for i in range(count):
+            Message.objects.create(sender=sender, receiver=receiver, content=f"message {i}")
+
+
+def send_legacy(sender, receiver, count):
+    post_save.disconnect(signals.create_notification_on_new_message, sender=Message)
+    post_save.connect(notify_immediately, sender=Message)
+    try:
+        send_one_by_one(sender, receiver, count)
+    finally:
+        post_save.disconnect(notify_immediately, sender=Message)
+        post_save.connect(signals.create_notification_on_new_message, sender=Message)
+
+
+def send_bulk(sender, receiver, count):
+    bulk_send_messages(
+        Message(sender=sender, receiver=receiver, content=f"message {i}") for i in range(count)
+    )
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    with tempfile.TemporaryDirectory() as tmp:
+        connection.settings_dict['TEST']['NAME'] = os.path.join(tmp, 'bench.sqlite3')
+        connection.creation.create_test_db(verbosity=0, serialize=False)
+        sender = User.objects.create_user(username='sender', password='bench')
+        receiver = User.objects.create_user(username='receiver', password='bench')
+        print(f"{count} messages, one transaction each run")
+        for label, send in [('per message', send_legacy),
+                            ('batched on commit', send_one_by_one),
+                            ('bulk_send_messages', send_bulk)]:
+            Notification.objects.all().delete()
+            Message.objects.all().delete()
+            start = time.perf_counter()
+            send(sender, receiver, count)
+            elapsed = time.perf_counter() - start
+            assert Notification.objects.count() == count
+            print(f"{label:20} {elapsed * 1000:9.1f} ms  {count / elapsed:9,.0f} messages/s")
+
+
+if __name__ == '__main__':
+    main()
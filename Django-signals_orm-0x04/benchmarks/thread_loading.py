@@ -0,0 +1,109 @@
+"""
+Queries and latency of loading a whole reply tree by following
+`replies` one message at a time (what a recursive template over
+get_conversation_thread ends up doing) versus the recursive CTE loader,
+on a throwaway SQLite database.
+
+Run from the project directory:
+    python benchmarks/thread_loading.py [messages] [runs]
+"""
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'messaging_app.settings')
+
+import django
+
+django.setup()
+
+from django.contrib.auth.models import User
+from django.db import connection
+
+from messaging.models import Message
+
+
+def seed(size):
+    """
+    A random tree of `size` messages: each one replies to a random earlier
+    message, inserted level by level so parents always have ids.
+    """
+    sender = User.objects.create_user(username='sender', password='bench')
+    receiver = User.objects.create_user(username='receiver', password='bench')
+    rng = random.Random(0)
+    parents = [None] + [rng.randrange(i) for i in range(1, size)]
+    depths = [0] * size
+    for i in range(1, size):
+        depths[i] = depths[parents[i]] + 1
+    messages = [None] * size
+    for depth in range(max(depths) + 1):
+        level = [i for i in range(size) if depths[i] == depth]
+        created = Message.objects.bulk_create(
+            Message(sender=sender, receiver=receiver, content=f"message {i}",
+                    parent_message=messages[parents[i]] if parents[i] is not None else None)
+            for i in level
+        )
+        for i, message in zip(level, created):
+            messages[i] = message
+    return messages[0].pk, max(depths)
+
+
+def load_per_node(root_id):
+    root = Message.objects.select_related('sender', 'receiver').get(pk=root_id)
+    count = 0
+    stack = [root]
+    while stack:
+        node = stack.pop()
+        count += 1
+        stack.extend(node.replies.select_related('sender', 'receiver'))
+    return count
+
+
+def load_cte(root_id):
+    root = Message.objects.thread_tree(root_id)
+    count = 0
+    stack = [root]
+    while stack:
+        node = stack.pop()
+        count += 1
+        stack.extend(node.thread_children)
+    return count
+
+
+def measure(loader, root_id, runs):
+    queries = 0
+
+    def count_query(execute, sql, params, many, context):
+        nonlocal queries
+        queries += 1
+        return execute(sql, params, many, context)
+
+    latencies = []
+    with connection.execute_wrapper(count_query):
+        for _ in range(runs):
+            start = time.perf_counter()
+            count = loader(root_id)
+            latencies.append(time.perf_counter() - start)
+    latencies.sort()
+    p95 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))]
+    return count, queries // runs, p95 * 1000
+
+
+def main():
+    size = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    runs = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+    with tempfile.TemporaryDirectory() as tmp:
+        connection.settings_dict['TEST']['NAME'] = os.path.join(tmp, 'bench.sqlite3')
+        connection.creation.create_test_db(verbosity=0, serialize=False)
+        root_id, depth = seed(size)
+        print(f"{size} messages, {depth} levels deep")
+        for label, loader in [('per node', load_per_node), ('recursive CTE', load_cte)]:
+            count, queries, p95 = measure(loader, root_id, runs)
+            print(f"{label:14} {count:6d} messages  {queries:6d} queries  p95 {p95:9.1f} ms")
+
+
+if __name__ == '__main__':
+    main()
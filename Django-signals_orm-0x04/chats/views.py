@@ -1,6 +1,7 @@
 from django.shortcuts import render, get_object_or_404
 from django.views.decorators.cache import cache_page
 from django.contrib.auth.decorators import login_required
+from messaging.cache import cache_per_user
 from messaging.models import Message
 
 
@@ -26,20 +27,14 @@ def conversation_messages(request, conversation_id):
     })
 
 
-@cache_page(60)  # Cache for 60 seconds
 @login_required
+@cache_per_user('message_list')
 def message_list(request):
     """
     View to display all messages for the current user.
-    Cached for 60 seconds to reduce database load.
+    Cached per user until one of their messages changes.
     """
-    messages = Message.objects.filter(
-        receiver=request.user
-    ).select_related(
-        'sender', 'receiver'
-    ).prefetch_related(
-        'replies'
-    ).order_by('-timestamp')
+    messages = Message.objects.received_by(request.user).prefetch_related('replies')
     
     return render(request, 'chats/message_list.html', {
         'messages': messages
@@ -1,5 +1,8 @@
 from django.contrib import admin
-from .models import Message, Notification, MessageHistory
+from django.contrib.admin.views.main import ORDER_VAR
+from django.db.models import Q
+from .models import AccountDeletion, Message, Notification, MessageHistory
+from .search import search_messages
 
 
 @admin.register(Message)
@@ -7,10 +10,29 @@ class MessageAdmin(admin.ModelAdmin):
     """Admin interface for Message model."""
     list_display = ('id', 'sender', 'receiver', 'content', 'timestamp', 'edited', 'read')
     list_filter = ('edited', 'read', 'timestamp')
-    search_fields = ('sender__username', 'receiver__username', 'content')
+    search_fields = ('content',)
+    search_help_text = (
+        'Full-text search of message content, best matches first. '
+        '@username finds the messages a user sent or received.'
+    )
     raw_id_fields = ('sender', 'receiver', 'parent_message')
     readonly_fields = ('timestamp',)
 
+    def get_search_results(self, request, queryset, search_term):
+        search_term = search_term.strip()
+        if not search_term:
+            return queryset, False
+        if search_term.startswith('@'):
+            username = search_term[1:]
+            return queryset.filter(
+                Q(sender__username=username) | Q(receiver__username=username)
+            ), False
+        results = search_messages(queryset, search_term)
+        if ORDER_VAR in request.GET:
+            # A sorted column wins over the ranking.
+            results = results.order_by(*queryset.query.order_by)
+        return results, False
+
 
 @admin.register(Notification)
 class NotificationAdmin(admin.ModelAdmin):
@@ -30,3 +52,18 @@ class MessageHistoryAdmin(admin.ModelAdmin):
     search_fields = ('message__content', 'old_content')
     raw_id_fields = ('message', 'edited_by')
     readonly_fields = ('edited_at',)
+
+
+@admin.register(AccountDeletion)
+class AccountDeletionAdmin(admin.ModelAdmin):
+    """Admin interface for queued account deletions and their progress."""
+    list_display = (
+        'username', 'status', 'messages_deleted', 'notifications_deleted',
+        'history_deleted', 'requested_at', 'finished_at',
+    )
+    list_filter = ('status',)
+    search_fields = ('username',)
+    readonly_fields = (
+        'user_id', 'username', 'messages_deleted', 'notifications_deleted',
+        'history_deleted', 'error', 'requested_at', 'started_at', 'finished_at',
+    )
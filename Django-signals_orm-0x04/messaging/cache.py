@@ -0,0 +1,115 @@
+"""
+Per-user versioned caching for message views.
+
+Every user has a generation number in the cache. Cached pages are keyed
+on it, and the Message and Notification signals bump it whenever something
+the user can see changes, so a user's stale pages simply stop being
+looked up and can be kept for a long time instead of a minute.
+"""
+import functools
+import hashlib
+import threading
+import time
+from django.conf import settings
+from django.contrib.messages import get_messages
+from django.core.cache import cache
+from django.utils.cache import patch_cache_control
+
+GENERATION_KEY = 'messaging:generation:{user_id}'
+PAGE_KEY = 'messaging:page:{name}:{user_id}:{generation}:{path}'
+
+_stats = {'hits': 0, 'misses': 0}
+_stats_lock = threading.Lock()
+
+
+def get_timeout():
+    return getattr(settings, 'MESSAGING_CACHE_TIMEOUT', 24 * 60 * 60)
+
+
+def get_generation(user_id):
+    """
+    Returns the current cache generation of `user_id`, starting one if
+    there is none.
+    """
+    key = GENERATION_KEY.format(user_id=user_id)
+    generation = cache.get(key)
+    if generation is None:
+        # Start from the clock rather than 1: if the counter was evicted,
+        # pages cached under its old values must not become valid again.
+        cache.add(key, time.time_ns(), timeout=None)
+        generation = cache.get(key)
+    return generation
+
+
+def bump_generation(*user_ids):
+    """
+    Invalidate every cached page of the given users.
+    """
+    for user_id in user_ids:
+        key = GENERATION_KEY.format(user_id=user_id)
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.add(key, time.time_ns(), timeout=None)
+
+
+def forget_generation(user_id):
+    """
+    Drop the generation of a deleted user. Should the id come back, its
+    new generation starts from the clock, past every page cached before.
+    """
+    cache.delete(GENERATION_KEY.format(user_id=user_id))
+
+
+def cache_stats():
+    """
+    Hit and miss counts of this process since it started (or the last
+    reset_cache_stats()).
+    """
+    with _stats_lock:
+        stats = dict(_stats)
+    lookups = stats['hits'] + stats['misses']
+    stats['hit_rate'] = stats['hits'] / lookups if lookups else 0.0
+    return stats
+
+
+def reset_cache_stats():
+    with _stats_lock:
+        _stats['hits'] = _stats['misses'] = 0
+
+
+def _count(outcome):
+    with _stats_lock:
+        _stats[outcome] += 1
+
+
+def cache_per_user(name, timeout=None):
+    """
+    Cache a view's successful responses per authenticated user and full
+    path, under the user's current generation. Use it inside
+    login_required.
+    """
+    def decorator(view_func):
+        @functools.wraps(view_func)
+        def wrapper(request, *args, **kwargs):
+            # A pending flash message has to be rendered by the view.
+            if not request.user.is_authenticated or get_messages(request):
+                return view_func(request, *args, **kwargs)
+            key = PAGE_KEY.format(
+                name=name,
+                user_id=request.user.pk,
+                generation=get_generation(request.user.pk),
+                path=hashlib.md5(request.get_full_path().encode()).hexdigest(),
+            )
+            response = cache.get(key)
+            if response is not None:
+                _count('hits')
+                return response
+            _count('misses')
+            response = view_func(request, *args, **kwargs)
+            if response.status_code == 200 and not response.cookies:
+                patch_cache_control(response, private=True)
+                cache.set(key, response, get_timeout() if timeout is None else timeout)
+            return response
+        return wrapper
+    return decorator
@@ -0,0 +1,124 @@
+"""
+Per-user unread counters.
+
+UnreadCounter rows are adjusted with F() expressions wherever messages and
+notifications are created, read or deleted, so reading a user's unread
+counts is a primary key lookup (or a cache hit) instead of a COUNT.
+Paths that bypass these hooks, such as raw SQL or queryset.update() on
+read flags, make the counters drift; reconcile_unread_counters() and
+`manage.py reconcile_unread_counters` repair them in bulk.
+"""
+import functools
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce, Greatest
+from .models import Message, Notification, UnreadCounter
+
+COUNTS_KEY = 'messaging:unread:{user_id}'
+
+
+def get_cache_timeout():
+    """
+    How long unread counts are cached; 0 turns the cache front off.
+    """
+    return getattr(settings, 'MESSAGING_UNREAD_CACHE_TIMEOUT', 5 * 60)
+
+
+def forget_counts(user_id):
+    key = COUNTS_KEY.format(user_id=user_id)
+    cache.delete(key)
+    if transaction.get_connection().in_atomic_block:
+        # A concurrent reader may cache the counts from before this
+        # transaction; drop them again once it is visible.
+        transaction.on_commit(functools.partial(cache.delete, key))
+
+
+def adjust_unread(user_id, messages=0, notifications=0):
+    """
+    Add the given deltas (negative to subtract) to the user's counters in
+    one UPDATE. A user without a counter row gets one built by
+    reconcile_unread_counters() on increments; decrements of a missing row
+    are ignored, the row is built from scratch when it is next read.
+    """
+    changes = {}
+    if messages:
+        changes['messages'] = Greatest(F('messages') + messages, 0)
+    if notifications:
+        changes['notifications'] = Greatest(F('notifications') + notifications, 0)
+    if not changes:
+        return
+    updated = UnreadCounter.objects.filter(pk=user_id).update(**changes)
+    if not updated and (messages > 0 or notifications > 0):
+        reconcile_unread_counters([user_id])
+    forget_counts(user_id)
+
+
+def get_unread_counts(user_id):
+    """
+    Returns {'messages': n, 'notifications': n} for the user.
+    """
+    timeout = get_cache_timeout()
+    key = COUNTS_KEY.format(user_id=user_id)
+    if timeout:
+        counts = cache.get(key)
+        if counts is not None:
+            return counts
+    row = UnreadCounter.objects.filter(pk=user_id).values_list('messages', 'notifications').first()
+    if row is None:
+        reconcile_unread_counters([user_id])
+        row = UnreadCounter.objects.filter(pk=user_id).values_list('messages', 'notifications').first()
+        if row is None:
+            row = (0, 0)  # no such user
+    counts = {'messages': row[0], 'notifications': row[1]}
+    if timeout:
+        cache.set(key, counts, timeout)
+    return counts
+
+
+def reconcile_unread_counters(user_ids=None, batch_size=1000):
+    """
+    Recount unread messages and notifications from their tables, for the
+    given users or for everyone, and write the counters that are missing or
+    have drifted with one upsert per batch. Returns the number of counters
+    repaired.
+    """
+    messages = Message.objects.filter(
+        receiver=OuterRef('pk'), read=False
+    ).order_by().values('receiver').annotate(total=Count('pk')).values('total')
+    notifications = Notification.objects.filter(
+        user=OuterRef('pk'), is_read=False
+    ).order_by().values('user').annotate(total=Count('pk')).values('total')
+    users = User.objects.order_by('pk').annotate(
+        unread_messages=Coalesce(Subquery(messages), 0),
+        unread_notifications=Coalesce(Subquery(notifications), 0),
+    ).values_list(
+        'pk', 'unread_messages', 'unread_notifications',
+        'unread_counter__messages', 'unread_counter__notifications',
+    )
+    if user_ids is not None:
+        users = users.filter(pk__in=user_ids)
+
+    # Collect first: the upserts write to the table this query joins.
+    drifted = [
+        UnreadCounter(user_id=user_id, messages=unread_messages, notifications=unread_notifications)
+        for user_id, unread_messages, unread_notifications, stored_messages, stored_notifications
+        in users.iterator(chunk_size=batch_size)
+        if (unread_messages, unread_notifications) != (stored_messages, stored_notifications)
+    ]
+    for start in range(0, len(drifted), batch_size):
+        _upsert(drifted[start:start + batch_size])
+    return len(drifted)
+
+
+def _upsert(counters):
+    UnreadCounter.objects.bulk_create(
+        counters,
+        update_conflicts=True,
+        unique_fields=['user'],
+        update_fields=['messages', 'notifications'],
+    )
+    for counter in counters:
+        forget_counts(counter.user_id)
@@ -0,0 +1,204 @@
+"""
+Account deletion in bounded batches.
+
+user.delete() has Django's collector load every message, notification and
+edit of the user, and every reply below their messages, into memory to
+cascade and to send one delete signal per row. delete_user_data() removes
+the same rows with DELETE ... WHERE id IN (...) statements of at most
+`batch_size` ids, reading nothing but ids and the few columns the row
+signals would have needed, and settles what those signals do (unread
+counters, cached pages) once per batch. Afterwards user.delete() finds
+nothing left to cascade.
+
+Deletions can also be queued with request_account_deletion() and run by
+`manage.py process_account_deletions`, which records progress on the
+AccountDeletion row.
+"""
+import collections
+import datetime
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+from .cache import bump_generation
+from .counters import adjust_unread, forget_counts
+from .models import AccountDeletion, Message, MessageHistory, Notification, UnreadCounter
+from .search import unindex_messages
+
+DEFAULT_BATCH_SIZE = 1000
+# A RUNNING deletion not finished after this long is taken to have lost
+# its worker.
+DEFAULT_STALE_AFTER = datetime.timedelta(hours=1)
+
+
+def _raw_delete(queryset):
+    # The rows have no dependants left and their signals are settled by the
+    # caller, so skip the collector.
+    return queryset._raw_delete(queryset.db)
+
+
+def _with_replies(ids, batch_size):
+    """
+    `ids` and every reply below them, deepest level first, so each
+    message comes before the one it replies to.
+    """
+    levels = [list(ids)]
+    seen = set(ids)
+    while levels[-1]:
+        frontier, below = levels[-1], []
+        for start in range(0, len(frontier), batch_size):
+            replies = Message.objects.filter(
+                parent_message_id__in=frontier[start:start + batch_size]
+            ).values_list('pk', flat=True)
+            below.extend(pk for pk in replies if pk not in seen)
+        seen.update(below)
+        levels.append(below)
+    return [pk for level in reversed(levels) for pk in level]
+
+
+def _delete_messages(ids, totals, unread, touched):
+    """
+    Delete the messages `ids` with their edit history, notifications and
+    search index entries, noting whose unread counts and pages change.
+    """
+    rows = Message.objects.filter(pk__in=ids).values_list('sender_id', 'receiver_id', 'read')
+    for sender_id, receiver_id, read in rows:
+        touched.update((sender_id, receiver_id))
+        if not read:
+            unread[receiver_id]['messages'] += 1
+    # Replies show on the pages of their parents' participants too.
+    for participants in Message.objects.filter(replies__in=ids).order_by().values_list('sender_id', 'receiver_id').distinct():
+        touched.update(participants)
+    notifications = Notification.objects.filter(message_id__in=ids)
+    for user_id in notifications.filter(is_read=False).values_list('user_id', flat=True):
+        unread[user_id]['notifications'] += 1
+    totals['history'] += _raw_delete(MessageHistory.objects.filter(message_id__in=ids))
+    totals['notifications'] += _raw_delete(notifications)
+    totals['messages'] += _raw_delete(Message.objects.filter(pk__in=ids))
+    unindex_messages(ids)
+
+
+def delete_user_data(user_id, batch_size=DEFAULT_BATCH_SIZE, progress=None):
+    """
+    Delete every message the user sent or received, the replies below
+    them, their notifications and edit history, and the user's unread
+    counter, without loading any of them. Each batch of the user's
+    messages (with its replies) is one transaction; `progress(totals)` is
+    called after each. Returns the totals, a dict of the number of
+    'messages', 'notifications' and 'history' rows deleted.
+    """
+    totals = {'messages': 0, 'notifications': 0, 'history': 0}
+    own = Message.objects.filter(Q(sender_id=user_id) | Q(receiver_id=user_id)).order_by()
+    while True:
+        unread = collections.defaultdict(collections.Counter)
+        touched = set()
+        with transaction.atomic():
+            ids = list(own.values_list('pk', flat=True)[:batch_size])
+            if not ids:
+                break
+            doomed = _with_replies(ids, batch_size)
+            for start in range(0, len(doomed), batch_size):
+                _delete_messages(doomed[start:start + batch_size], totals, unread, touched)
+            for other_id, counts in unread.items():
+                if other_id != user_id:
+                    adjust_unread(other_id, messages=-counts['messages'], notifications=-counts['notifications'])
+        bump_generation(*touched)
+        if progress is not None:
+            progress(totals)
+
+    with transaction.atomic():
+        # Normally gone with the messages they were about.
+        leftover = Notification.objects.filter(user_id=user_id).order_by()
+        while True:
+            ids = list(leftover.values_list('pk', flat=True)[:batch_size])
+            if not ids:
+                break
+            totals['notifications'] += _raw_delete(Notification.objects.filter(pk__in=ids))
+        MessageHistory.objects.filter(edited_by_id=user_id).update(edited_by=None)
+        _raw_delete(UnreadCounter.objects.filter(pk=user_id))
+    forget_counts(user_id)
+    bump_generation(user_id)
+    return totals
+
+
+def delete_account(user, batch_size=DEFAULT_BATCH_SIZE, progress=None):
+    """
+    Delete the user's messaging data in batches, then the user. Returns
+    the totals of delete_user_data().
+    """
+    totals = delete_user_data(user.pk, batch_size, progress)
+    user.delete()
+    return totals
+
+
+def request_account_deletion(user):
+    """
+    Deactivate `user` and queue the account for
+    `manage.py process_account_deletions`, again if an earlier deletion
+    failed. Returns the AccountDeletion.
+    """
+    with transaction.atomic():
+        User.objects.filter(pk=user.pk).update(is_active=False)
+        deletion, created = AccountDeletion.objects.get_or_create(
+            user_id=user.pk, defaults={'username': user.get_username()}
+        )
+        if not created and deletion.status == AccountDeletion.FAILED:
+            requeue_account_deletions(
+                AccountDeletion.objects.filter(pk=deletion.pk, status=AccountDeletion.FAILED)
+            )
+            deletion.refresh_from_db()
+    return deletion
+
+
+def requeue_account_deletions(deletions):
+    """
+    Put the AccountDeletion rows of `deletions` back to PENDING, clearing
+    their error and times. Returns the number requeued.
+    """
+    return deletions.update(
+        status=AccountDeletion.PENDING, error='', started_at=None, finished_at=None
+    )
+
+
+def reclaim_stale_deletions(stale_after=DEFAULT_STALE_AFTER):
+    """
+    Requeue RUNNING deletions started more than `stale_after` ago, whose
+    worker was presumably killed. Returns the number requeued.
+    """
+    return requeue_account_deletions(AccountDeletion.objects.filter(
+        status=AccountDeletion.RUNNING, started_at__lt=timezone.now() - stale_after
+    ))
+
+
+def process_account_deletion(deletion, batch_size=DEFAULT_BATCH_SIZE):
+    """
+    Run a queued deletion, recording progress on its row after every
+    batch, and its error if it fails. Returns False if another worker has
+    already claimed it.
+    """
+    queued = AccountDeletion.objects.filter(pk=deletion.pk)
+    if not queued.filter(status=AccountDeletion.PENDING).update(
+        status=AccountDeletion.RUNNING, started_at=timezone.now()
+    ):
+        return False
+
+    def record(totals):
+        queued.update(
+            messages_deleted=totals['messages'],
+            notifications_deleted=totals['notifications'],
+            history_deleted=totals['history'],
+        )
+
+    try:
+        user = User.objects.filter(pk=deletion.user_id).first()
+        if user is None:
+            totals = delete_user_data(deletion.user_id, batch_size, record)
+        else:
+            totals = delete_account(user, batch_size, record)
+    except Exception as exc:
+        queued.update(status=AccountDeletion.FAILED, error=repr(exc), finished_at=timezone.now())
+        raise
+    record(totals)
+    queued.update(status=AccountDeletion.DONE, finished_at=timezone.now())
+    return True
+
@@ -0,0 +1,83 @@
+"""
+Streaming message export.
+
+Rows are read with values_list() through iterator(chunk_size=...), so the
+database hands them over a chunk at a time and no Message instances are
+built, and each row is encoded as soon as it arrives. Memory stays flat
+however many messages are exported, whether the lines go to a
+StreamingHttpResponse or to a file.
+"""
+import csv
+import json
+from django.db.models import Q
+from .models import Message
+
+EXPORT_COLUMNS = (
+    'id', 'timestamp', 'sender', 'receiver', 'parent_message', 'content', 'read', 'edited',
+)
+EXPORT_FIELDS = (
+    'id', 'timestamp', 'sender__username', 'receiver__username', 'parent_message_id',
+    'content', 'read', 'edited',
+)
+EXPORT_FORMATS = {
+    'ndjson': 'application/x-ndjson',
+    'csv': 'text/csv',
+}
+DEFAULT_CHUNK_SIZE = 2000
+# Lines are handed on in pieces of about this many characters rather
+# than one at a time.
+WRITE_SIZE = 64 * 1024
+
+
+def export_rows(user=None, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Yields a tuple of EXPORT_COLUMNS values for every message sent or
+    received by `user` (or every message), oldest first.
+    """
+    messages = Message.objects.all()
+    if user is not None:
+        messages = messages.filter(Q(sender=user) | Q(receiver=user))
+    rows = messages.order_by('pk').values_list(*EXPORT_FIELDS).iterator(chunk_size=chunk_size)
+    for row in rows:
+        yield (row[0], row[1].isoformat()) + row[2:]
+
+
+def ndjson_lines(rows):
+    for row in rows:
+        yield json.dumps(dict(zip(EXPORT_COLUMNS, row)), ensure_ascii=False) + '\n'
+
+
+class _Echo:
+    """
+    A file-like object whose write() returns what it is given, so
+    csv.writer formats one row at a time without a buffer.
+    """
+
+    def write(self, value):
+        return value
+
+
+def csv_lines(rows):
+    writer = csv.writer(_Echo())
+    yield writer.writerow(EXPORT_COLUMNS)
+    for row in rows:
+        yield writer.writerow(row)
+
+
+def export_messages(user=None, format='ndjson', chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Yields the export of `user`'s messages (or every message) in `format`
+    ('ndjson' or 'csv') as strings of about WRITE_SIZE characters.
+    """
+    if format not in EXPORT_FORMATS:
+        raise ValueError(f"Unknown export format {format!r}.")
+    encode = ndjson_lines if format == 'ndjson' else csv_lines
+    pending, size = [], 0
+    for line in encode(export_rows(user, chunk_size)):
+        pending.append(line)
+        size += len(line)
+        if size >= WRITE_SIZE:
+            yield ''.join(pending)
+            pending, size = [], 0
+    if pending:
+        yield ''.join(pending)
@@ -0,0 +1,103 @@
+"""
+Registry of the queries the messaging views run on every request.
+
+Each entry builds, without evaluating it, the queryset a view would run
+for `user` and the message `message_id`, so `manage.py explain_hot_queries` can check its plan.
+Entries call the same manager methods as the views, so the two cannot drift
+apart. Register new hot paths here when adding views.
+"""
+import re
+from .managers import thread_path_key
+from .models import Message, MessageHistory, Notification
+
+HOT_QUERIES = {}
+
+# Plan lines that read a whole table: SQLite's bare "SCAN <table>" (a scan
+# "USING INDEX" is fine) and PostgreSQL's "Seq Scan on <table>".
+FULL_SCAN_PATTERNS = [
+    re.compile(r'\bSCAN (?:TABLE )?(?P<table>\w+)(?!.*\bUSING\b)'),
+    re.compile(r'\bSeq Scan on (?P<table>\w+)'),
+]
+
+
+def hot_query(name):
+    """
+    Register the decorated function, which takes a user and a message id
+    and returns a queryset, under `name`.
+    """
+    def decorator(func):
+        HOT_QUERIES[name] = func
+        return func
+    return decorator
+
+
+def find_full_scans(plan, tables=None):
+    """
+    Return the tables that `plan` (QuerySet.explain() output) scans in full.
+    If `tables` is given, scans of anything else, such as the rows of a
+    common table expression, are ignored.
+    """
+    scanned = []
+    for line in plan.splitlines():
+        for pattern in FULL_SCAN_PATTERNS:
+            match = pattern.search(line)
+            if match and (tables is None or match.group('table') in tables):
+                scanned.append(match.group('table'))
+    return scanned
+
+
+@hot_query('unread_for_user')
+def unread_for_user(user, message_id):
+    return Message.unread.unread_for_user(user)
+
+
+@hot_query('inbox')
+def inbox(user, message_id):
+    return Message.objects.inbox(user)
+
+
+@hot_query('message_list')
+def message_list(user, message_id):
+    return Message.objects.received_by(user)
+
+
+@hot_query('message_thread')
+def message_thread(user, message_id):
+    return Message(pk=message_id).get_thread()
+
+
+@hot_query('conversation_thread')
+def conversation_thread(user, message_id):
+    return Message.get_conversation_thread(message_id)
+
+
+@hot_query('thread_subtree')
+def thread_subtree(user, message_id):
+    message = Message(pk=message_id, thread_root_id=message_id, path=thread_path_key(message_id))
+    return Message.objects.subtree(message)
+
+
+@hot_query('thread_ancestors')
+def thread_ancestors(user, message_id):
+    message = Message(pk=message_id, thread_root_id=message_id, path=thread_path_key(message_id) * 3)
+    return Message.objects.ancestors(message)
+
+
+@hot_query('thread_reply_counts')
+def thread_reply_counts(user, message_id):
+    return Message.objects.filter(parent_message_id=message_id).with_reply_count()
+
+
+@hot_query('notifications')
+def notifications(user, message_id):
+    return Notification.objects.for_user(user)
+
+
+@hot_query('unread_notifications')
+def unread_notifications(user, message_id):
+    return Notification.objects.unread_for_user(user)
+
+
+@hot_query('message_history')
+def message_history(user, message_id):
+    return MessageHistory.objects.for_message(message_id)
@@ -0,0 +1,45 @@
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from messaging.hot_queries import HOT_QUERIES, find_full_scans
+
+
+class Command(BaseCommand):
+    help = (
+        "Run EXPLAIN on every registered hot query and fail if any of them "
+        "scans a whole table."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'names', nargs='*',
+            help='Only explain these queries (default: all registered).'
+        )
+        parser.add_argument(
+            '--verbose-plans', action='store_true',
+            help='Print the full plan of every query, not only the flagged ones.'
+        )
+
+    def handle(self, *args, **options):
+        names = options['names'] or sorted(HOT_QUERIES)
+        unknown = set(names) - set(HOT_QUERIES)
+        if unknown:
+            raise CommandError(f"Unknown hot queries: {', '.join(sorted(unknown))}")
+
+        # Plans only depend on the query shape, so placeholder ids will do.
+        user = User(pk=1)
+        tables = set(connection.introspection.table_names())
+        flagged = []
+        for name in names:
+            plan = HOT_QUERIES[name](user, 1).explain()
+            scanned = find_full_scans(plan, tables)
+            if scanned:
+                flagged.append(name)
+                self.stdout.write(self.style.ERROR(f"{name}: full scan of {', '.join(scanned)}"))
+            else:
+                self.stdout.write(self.style.SUCCESS(f"{name}: ok"))
+            if scanned or options['verbose_plans']:
+                self.stdout.write(plan)
+
+        if flagged:
+            raise CommandError(f"{len(flagged)} hot queries scan whole tables: {', '.join(flagged)}")
@@ -0,0 +1,34 @@
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from messaging.export import DEFAULT_CHUNK_SIZE, EXPORT_FORMATS, export_messages
+
+
+class Command(BaseCommand):
+    help = (
+        "Stream the messages a user sent or received (or every message) as "
+        "NDJSON or CSV, with constant memory."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'username', nargs='?',
+            help='Only export this user\'s messages (default: all).'
+        )
+        parser.add_argument('--format', choices=sorted(EXPORT_FORMATS), default='ndjson')
+        parser.add_argument('--output', help='Write to this file instead of stdout.')
+        parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE)
+
+    def handle(self, *args, **options):
+        user = None
+        if options['username']:
+            try:
+                user = User.objects.get(username=options['username'])
+            except User.DoesNotExist:
+                raise CommandError(f"No user named {options['username']!r}.")
+        chunks = export_messages(user, options['format'], chunk_size=options['chunk_size'])
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8', newline='') as output:
+                output.writelines(chunks)
+        else:
+            for chunk in chunks:
+                self.stdout.write(chunk, ending='')
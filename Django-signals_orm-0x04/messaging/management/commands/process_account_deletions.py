@@ -0,0 +1,64 @@
+import datetime
+import time
+from django.core.management.base import BaseCommand
+from messaging.deletion import (
+    DEFAULT_BATCH_SIZE, DEFAULT_STALE_AFTER, process_account_deletion,
+    reclaim_stale_deletions, requeue_account_deletions,
+)
+from messaging.models import AccountDeletion
+
+
+class Command(BaseCommand):
+    help = (
+        "Run queued account deletions in batches, recording progress on "
+        "each AccountDeletion."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE)
+        parser.add_argument(
+            '--interval', type=float,
+            help='Keep running, checking the queue every this many seconds.'
+        )
+        parser.add_argument(
+            '--stale-after', type=float, default=DEFAULT_STALE_AFTER.total_seconds(),
+            help='Rerun deletions left running for more than this many seconds.'
+        )
+        parser.add_argument(
+            '--retry-failed', action='store_true',
+            help='Requeue failed deletions before running the queue.'
+        )
+
+    def handle(self, *args, **options):
+        if options['retry_failed']:
+            retried = requeue_account_deletions(
+                AccountDeletion.objects.filter(status=AccountDeletion.FAILED)
+            )
+            self.stdout.write(f"Requeued {retried} failed deletions.")
+        stale_after = datetime.timedelta(seconds=options['stale_after'])
+        while True:
+            reclaimed = reclaim_stale_deletions(stale_after)
+            if reclaimed:
+                self.stdout.write(f"Requeued {reclaimed} stale running deletions.")
+            self.run_pending(options['batch_size'])
+            if options['interval'] is None:
+                return
+            time.sleep(options['interval'])
+
+    def run_pending(self, batch_size):
+        pending = AccountDeletion.objects.filter(
+            status=AccountDeletion.PENDING
+        ).order_by('requested_at')
+        for deletion in list(pending):
+            try:
+                if not process_account_deletion(deletion, batch_size):
+                    continue
+            except Exception as exc:
+                self.stderr.write(f"Deleting {deletion.username} failed: {exc!r}")
+                continue
+            deletion.refresh_from_db()
+            self.stdout.write(self.style.SUCCESS(
+                f"Deleted {deletion.username}: {deletion.messages_deleted} messages, "
+                f"{deletion.notifications_deleted} notifications, "
+                f"{deletion.history_deleted} edits."
+            ))
@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+from messaging.models import Message
+
+
+class Command(BaseCommand):
+    help = (
+        "Recompute Message.thread_root and Message.path from parent_message, "
+        "e.g. after bulk imports that bypassed signals."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        changed = Message.objects.rebuild_thread_paths(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f"Updated the thread path of {changed} messages."))
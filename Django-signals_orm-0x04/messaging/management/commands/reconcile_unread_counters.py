@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+from messaging.counters import reconcile_unread_counters
+
+
+class Command(BaseCommand):
+    help = (
+        "Recount unread messages and notifications and repair the per-user "
+        "counters that are missing or have drifted."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'user_ids', nargs='*', type=int,
+            help='Only reconcile these users (default: all).'
+        )
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        repaired = reconcile_unread_counters(
+            options['user_ids'] or None, batch_size=options['batch_size']
+        )
+        self.stdout.write(self.style.SUCCESS(f"Repaired {repaired} unread counters."))
@@ -1,4 +1,268 @@
-from django.db import models
+from collections import Counter
+from django.db import connections, models, transaction
+from django.db.models.expressions import RawSQL
+from django.db.models.functions import Cast, Coalesce, Concat, LPad
+from .cache import bump_generation
+
+# Message.path is the chain of ids from the thread root down to the message,
+# each zero-padded to THREAD_PATH_WIDTH digits. Paths are compared as plain
+# strings, so everything below a message is the range [path, path + ':'):
+# ':' sorts right after the digits.
+THREAD_PATH_WIDTH = 10
+THREAD_PATH_END = ':'
+
+
+def thread_path_key(pk):
+    """
+    The path segment for the message `pk`.
+    """
+    return f'{pk:0{THREAD_PATH_WIDTH}d}'
+
+
+def build_thread_tree(messages, root_id):
+    """
+    Link a flat list of thread messages into a tree in O(n).
+
+    Every message gets a `thread_children` list (in the order of
+    `messages`) and a `depth` relative to the root, and its parent_message
+    is set from the list so following it costs no query. Returns the root
+    message, or None if it is not in `messages`.
+    """
+    by_id = {}
+    for message in messages:
+        message.thread_children = []
+        by_id[message.pk] = message
+    root = by_id.get(root_id)
+    if root is None:
+        return None
+    for message in messages:
+        parent = by_id.get(message.parent_message_id)
+        if parent is not None and message is not root:
+            parent.thread_children.append(message)
+            type(message).parent_message.field.set_cached_value(message, parent)
+    root.depth = 0
+    stack = [root]
+    while stack:
+        node = stack.pop()
+        for child in node.thread_children:
+            child.depth = node.depth + 1
+            stack.append(child)
+    return root
+
+
+def _select_for_marking(queryset, ids, before, timestamp_field):
+    """
+    Narrow a mark-read queryset to the given ids and/or to rows created at
+    or before `before`.
+    """
+    if ids is not None:
+        queryset = queryset.filter(pk__in=ids)
+    if before is not None:
+        queryset = queryset.filter(**{f'{timestamp_field}__lte': before})
+    return queryset
+
+
+class MessageQuerySet(models.QuerySet):
+    def mark_read(self):
+        """
+        Mark the unread messages in this queryset read with one UPDATE,
+        without loading them or sending save signals. Returns the number
+        of messages changed.
+
+        The unread rows are locked first, so the counters are adjusted by
+        exactly the rows this call flipped, even with concurrent callers.
+        """
+        from .counters import adjust_unread  # counters imports the models
+
+        with transaction.atomic(using=self.db):
+            unread = list(self.filter(read=False).select_for_update().values_list('pk', 'receiver_id'))
+            if not unread:
+                return 0
+            changed = self.model._default_manager.filter(pk__in=[pk for pk, _ in unread]).update(read=True)
+            per_receiver = Counter(receiver_id for _, receiver_id in unread)
+            for receiver_id, count in per_receiver.items():
+                adjust_unread(receiver_id, messages=-count)
+        bump_generation(*per_receiver)
+        return changed
+
+    def with_reply_count(self):
+        """
+        Annotate `reply_count`, the number of replies at any depth below
+        each message, counted with one index range per message.
+        """
+        below = self.model._default_manager.filter(
+            thread_root=models.OuterRef('thread_root'),
+            path__gt=models.OuterRef('path'),
+            path__lt=Concat(models.OuterRef('path'), models.Value(THREAD_PATH_END)),
+        ).order_by().values('thread_root').annotate(total=models.Count('pk')).values('total')
+        return self.annotate(
+            reply_count=Coalesce(models.Subquery(below), 0)
+        )
+
+
+class MessageManager(models.Manager.from_queryset(MessageQuerySet)):
+    """
+    Default manager for Message with loaders for whole reply threads.
+    """
+
+    def inbox(self, user):
+        """
+        Returns the user's unread messages as the inbox shows them. The
+        receiver is always `user`, so only the sender is joined.
+        """
+        return self.filter(
+            receiver=user,
+            read=False
+        ).select_related(
+            'sender'
+        ).only(
+            'id', 'sender', 'content', 'timestamp', 'parent_message'
+        )
+
+    def received_by(self, user):
+        """
+        Returns every message the user received, newest first.
+        """
+        return self.filter(receiver=user).select_related('sender', 'receiver').order_by('-timestamp')
+
+    def subtree(self, message, include_self=True):
+        """
+        Returns `message` and every reply below it, in thread order (each
+        message directly followed by its replies), as one range scan of
+        the (thread_root, path) index.
+        """
+        lower = 'path__gte' if include_self else 'path__gt'
+        return self.filter(**{
+            'thread_root_id': message.thread_root_id,
+            lower: message.path,
+            'path__lt': message.path + THREAD_PATH_END,
+        }).order_by('path')
+
+    def ancestors(self, message):
+        """
+        Returns the messages above `message`, root first. Their ids are read
+        from the path, so this is a single primary key lookup.
+        """
+        ids = [
+            int(message.path[start:start + THREAD_PATH_WIDTH])
+            for start in range(0, len(message.path) - THREAD_PATH_WIDTH, THREAD_PATH_WIDTH)
+        ]
+        return self.filter(pk__in=ids).order_by('path')
+
+    def _thread_path_updates(self):
+        """
+        The thread_root and path of each row, computed from its parent's
+        current values, as UPDATE expressions.
+        """
+        parents = self.model._default_manager.filter(pk=models.OuterRef('parent_message_id'))
+        return {
+            'thread_root': Coalesce(models.Subquery(parents.values('thread_root')[:1]), models.F('pk')),
+            'path': Concat(
+                Coalesce(models.Subquery(parents.values('path')[:1]), models.Value('')),
+                LPad(Cast('pk', models.CharField()), THREAD_PATH_WIDTH, models.Value('0')),
+            ),
+        }
+
+    def assign_thread_paths(self, ids):
+        """
+        Set thread_root and path of the new messages `ids` from their
+        parents in one UPDATE, for rows created without the post_save
+        signal. Parents must already have their own path.
+        """
+        return self.filter(pk__in=ids).update(**self._thread_path_updates())
+
+    def rebuild_thread_paths(self, batch_size=1000):
+        """
+        Recompute thread_root and path for every message from
+        parent_message, e.g. after bulk_create() or after messages were
+        moved to another parent. Returns the number of rows changed.
+
+        The tree is walked one level at a time from the roots, with one
+        UPDATE per `batch_size` messages of a level, so only the ids of
+        the current level are held in memory. Rows left inconsistent
+        afterwards sit on a parent_message cycle, which raises ValueError
+        and rolls the rebuild back.
+        """
+        updates = self._thread_path_updates()
+        stale = (
+            models.Q(thread_root__isnull=True)
+            | ~models.Q(thread_root=updates['thread_root'])
+            | ~models.Q(path=updates['path'])
+        )
+        changed = 0
+        with transaction.atomic(using=self.db):
+            parent_ids = None
+            while True:
+                if parent_ids is None:
+                    batches = [self.filter(parent_message__isnull=True)]
+                else:
+                    batches = (
+                        self.filter(parent_message_id__in=parent_ids[start:start + batch_size])
+                        for start in range(0, len(parent_ids), batch_size)
+                    )
+                ids = [
+                    pk for rows in batches
+                    for pk in rows.order_by().values_list('pk', flat=True).iterator(chunk_size=batch_size)
+                ]
+                if not ids:
+                    break
+                for start in range(0, len(ids), batch_size):
+                    changed += self.filter(pk__in=ids[start:start + batch_size]).filter(stale).update(**updates)
+                parent_ids = ids
+            cycle = self.exclude(parent_message__isnull=True).filter(stale).values_list('pk', flat=True).first()
+            if cycle is not None:
+                raise ValueError(f"parent_message cycle through message {cycle}")
+        return changed
+
+    def thread(self, root_id, max_depth=None, order_by=None):
+        """
+        Returns a queryset of the message `root_id` and all its replies, at
+        any depth (or at most `max_depth` levels below the root).
+
+        The reply tree is walked by a recursive CTE inside the WHERE clause,
+        so the whole thread costs a single query and the queryset can still
+        be refined with select_related(), only() and so on. A parent_message
+        cycle cannot make it recurse forever: without max_depth the CTE
+        collects ids with UNION, which drops the ids already reached.
+        """
+        connection = connections[self.db]
+        meta = self.model._meta
+        table = connection.ops.quote_name(meta.db_table)
+        pk = connection.ops.quote_name(meta.pk.column)
+        parent = connection.ops.quote_name(meta.get_field('parent_message').column)
+        if max_depth is None:
+            params = [root_id]
+            sql = (
+                f'WITH RECURSIVE thread(id) AS ('
+                f'SELECT {pk} FROM {table} WHERE {pk} = %s '
+                f'UNION '
+                f'SELECT reply.{pk} FROM {table} reply '
+                f'INNER JOIN thread ON reply.{parent} = thread.id'
+                f') SELECT id FROM thread'
+            )
+        else:
+            params = [root_id, max_depth]
+            sql = (
+                f'WITH RECURSIVE thread(id, depth) AS ('
+                f'SELECT {pk}, 0 FROM {table} WHERE {pk} = %s '
+                f'UNION ALL '
+                f'SELECT reply.{pk}, thread.depth + 1 FROM {table} reply '
+                f'INNER JOIN thread ON reply.{parent} = thread.id WHERE thread.depth < %s'
+                f') SELECT id FROM thread'
+            )
+        queryset = self.get_queryset().filter(pk__in=RawSQL(sql, params))
+        if order_by is not None:
+            queryset = queryset.order_by(*order_by)
+        return queryset
+
+    def thread_tree(self, root_id, max_depth=None, order_by=('timestamp', 'id')):
+        """
+        Load a thread with thread() and return its root message with the
+        replies linked under `thread_children` (see build_thread_tree), or
+        None if the root does not exist.
+        """
+        messages = list(self.thread(root_id, max_depth, order_by).select_related('sender', 'receiver'))
+        return build_thread_tree(messages, root_id)
 
 
 class UnreadMessagesManager(models.Manager):
@@ -25,3 +289,61 @@ class UnreadMessagesManager(models.Manager):
         Returns all unread messages for a specific user.
         """
         return self.get_queryset().filter(receiver=user)
+
+    def mark_read(self, user, ids=None, before=None):
+        """
+        Mark the user's unread messages read, optionally only those in `ids`
+        and/or sent at or before `before`, with a single UPDATE of the read
+        column. Returns the number of messages changed.
+        """
+        from .counters import adjust_unread  # counters imports the models
+
+        changed = _select_for_marking(self.for_user(user), ids, before, 'timestamp').update(read=True)
+        if changed:
+            adjust_unread(getattr(user, 'pk', user), messages=-changed)
+            bump_generation(getattr(user, 'pk', user))
+        return changed
+
+
+class NotificationManager(models.Manager):
+    """
+    Default manager for Notification with bulk read marking.
+    """
+
+    def for_user(self, user):
+        """
+        Returns the user's notifications with their message and its sender.
+        """
+        return self.filter(user=user).select_related('message', 'message__sender')
+
+    def unread_for_user(self, user):
+        """
+        Returns the user's unread notifications.
+        """
+        return self.filter(user=user, is_read=False)
+
+    def mark_read(self, user, ids=None, before=None):
+        """
+        Mark the user's unread notifications read, optionally only those in
+        `ids` and/or created at or before `before`, with a single UPDATE of
+        the is_read column. Returns the number of notifications changed.
+        """
+        from .counters import adjust_unread  # counters imports the models
+
+        changed = _select_for_marking(self.unread_for_user(user), ids, before, 'created_at').update(is_read=True)
+        if changed:
+            adjust_unread(getattr(user, 'pk', user), notifications=-changed)
+            bump_generation(getattr(user, 'pk', user))
+        return changed
+
+
+class MessageHistoryManager(models.Manager):
+    """
+    Default manager for MessageHistory.
+    """
+
+    def for_message(self, message):
+        """
+        Returns the edits of `message` (an instance or id) with their editor.
+        """
+        return self.filter(message=message).select_related('edited_by')
@@ -0,0 +1,54 @@
+# Generated by Django 5.2.8 on 2026-10-18 20:30
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def build_thread_paths(apps, schema_editor):
+    Message = apps.get_model('messaging', 'Message')
+    parents = dict(Message.objects.order_by().values_list('pk', 'parent_message_id'))
+    computed = {}
+    for pk in parents:
+        chain = []
+        current = pk
+        while current not in computed:
+            if parents[current] is None:
+                computed[current] = (current, f'{current:010d}')
+                break
+            chain.append(current)
+            current = parents[current]
+        for child in reversed(chain):
+            root_id, path = computed[parents[child]]
+            computed[child] = (root_id, path + f'{child:010d}')
+    Message.objects.bulk_update(
+        [Message(pk=pk, thread_root_id=root_id, path=path) for pk, (root_id, path) in computed.items()],
+        ['thread_root', 'path'],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('messaging', '0002_message_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='message',
+            name='path',
+            field=models.TextField(blank=True, default='', editable=False),
+        ),
+        migrations.AddField(
+            model_name='message',
+            name='thread_root',
+            field=models.ForeignKey(blank=True, db_index=False, editable=False, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='thread_messages', to='messaging.message'),
+        ),
+        migrations.AddIndex(
+            model_name='message',
+            index=models.Index(fields=['thread_root', 'path'], name='msg_thread_path_idx'),
+        ),
+        migrations.RunPython(build_thread_paths, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,50 @@
+# Generated by Django 5.2.8 on 2026-10-18 20:41
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models.functions import Coalesce
+
+
+def build_counters(apps, schema_editor):
+    User = apps.get_model(*settings.AUTH_USER_MODEL.split('.'))
+    Message = apps.get_model('messaging', 'Message')
+    Notification = apps.get_model('messaging', 'Notification')
+    UnreadCounter = apps.get_model('messaging', 'UnreadCounter')
+    messages = Message.objects.filter(
+        receiver=models.OuterRef('pk'), read=False
+    ).order_by().values('receiver').annotate(total=models.Count('pk')).values('total')
+    notifications = Notification.objects.filter(
+        user=models.OuterRef('pk'), is_read=False
+    ).order_by().values('user').annotate(total=models.Count('pk')).values('total')
+    rows = User.objects.annotate(
+        unread_messages=Coalesce(models.Subquery(messages), 0),
+        unread_notifications=Coalesce(models.Subquery(notifications), 0),
+    ).values_list('pk', 'unread_messages', 'unread_notifications')
+    UnreadCounter.objects.bulk_create(
+        (
+            UnreadCounter(user_id=pk, messages=unread_messages, notifications=unread_notifications)
+            for pk, unread_messages, unread_notifications in rows.iterator(chunk_size=1000)
+        ),
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('messaging', '0003_message_thread_path'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UnreadCounter',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='unread_counter', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('messages', models.PositiveIntegerField(default=0)),
+                ('notifications', models.PositiveIntegerField(default=0)),
+            ],
+        ),
+        migrations.RunPython(build_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,35 @@
+from django.db import migrations
+
+
+def create_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        schema_editor.execute('CREATE VIRTUAL TABLE messaging_message_fts USING fts5(content)')
+        schema_editor.execute(
+            'INSERT INTO messaging_message_fts (rowid, content) SELECT id, content FROM messaging_message'
+        )
+    elif vendor == 'postgresql':
+        # The expression SearchVector('content', config='english') compiles to.
+        schema_editor.execute(
+            "CREATE INDEX msg_content_search_idx ON messaging_message "
+            "USING GIN (to_tsvector('english'::regconfig, COALESCE(content, '')))"
+        )
+
+
+def drop_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        schema_editor.execute('DROP TABLE messaging_message_fts')
+    elif vendor == 'postgresql':
+        schema_editor.execute('DROP INDEX msg_content_search_idx')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('messaging', '0005_account_deletion'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -1,6 +1,7 @@
 from django.db import models
 from django.contrib.auth.models import User
-from .managers import UnreadMessagesManager
+from .cache import bump_generation
+from .managers import MessageHistoryManager, MessageManager, NotificationManager, UnreadMessagesManager
 
 
 class Message(models.Model):
@@ -16,7 +17,8 @@ class Message(models.Model):
     receiver = models.ForeignKey(
         User,
         on_delete=models.CASCADE,
-        related_name='received_messages'
+        related_name='received_messages',
+        db_index=False  # leading column of the receiver indexes below
     )
     content = models.TextField()
     timestamp = models.DateTimeField(auto_now_add=True)
@@ -27,43 +29,100 @@ class Message(models.Model):
         on_delete=models.CASCADE,
         null=True,
         blank=True,
-        related_name='replies'
+        related_name='replies',
+        db_index=False  # leading column of msg_parent_ts_idx
     )
+    # Denormalised thread position, set when a message is created (see
+    # messaging.signals) and rebuilt with `manage.py rebuild_thread_paths`.
+    thread_root = models.ForeignKey(
+        'self',
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        editable=False,
+        related_name='thread_messages',
+        db_index=False  # leading column of msg_thread_path_idx
+    )
+    path = models.TextField(blank=True, default='', editable=False)
 
     # Default manager
-    objects = models.Manager()
+    objects = MessageManager()
     # Custom manager for unread messages
     unread = UnreadMessagesManager()
 
     class Meta:
         ordering = ['-timestamp']
+        indexes = [
+            # Messages received by a user, newest first (message_list).
+            models.Index(fields=['receiver', '-timestamp'], name='msg_receiver_ts_idx'),
+            # Unread messages only (inbox, UnreadMessagesManager); stays
+            # small because rows leave it once they are read.
+            models.Index(
+                fields=['receiver', '-timestamp'],
+                condition=models.Q(read=False),
+                name='msg_unread_receiver_ts_idx',
+            ),
+            # Direct replies of a message, newest first (get_thread).
+            models.Index(fields=['parent_message', '-timestamp'], name='msg_parent_ts_idx'),
+            # Whole threads and subtrees as one range (MessageManager.subtree).
+            models.Index(fields=['thread_root', 'path'], name='msg_thread_path_idx'),
+        ]
 
     def __str__(self):
         return f"Message from {self.sender} to {self.receiver} at {self.timestamp}"
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance.remember_saved_state()
+        return instance
+
+    def refresh_from_db(self, *args, **kwargs):
+        super().refresh_from_db(*args, **kwargs)
+        self.remember_saved_state()
+
+    def remember_saved_state(self):
+        """
+        Keep content and read as they are in the database, so the save
+        signals can tell what a save changes without reading the row
+        again. A value is None when it was not loaded (e.g. deferred by
+        only()).
+        """
+        self.saved_content = self.__dict__.get('content')
+        self.saved_read = self.__dict__.get('read')
+
+    def mark_read(self):
+        """
+        Mark this message read with a single UPDATE that skips the save
+        signals. Returns True if it was unread.
+        """
+        from .counters import adjust_unread
+
+        self.read = self.saved_read = True
+        changed = Message.objects.filter(pk=self.pk, read=False).update(read=True)
+        if changed:
+            adjust_unread(self.receiver_id, messages=-changed)
+            bump_generation(self.receiver_id)
+        return changed > 0
+
     def get_thread(self):
         """
-        Get all replies to this message recursively using prefetch_related.
-        Returns a queryset of all messages in the thread.
+        Get all replies to this message recursively, at any depth.
+        Returns a queryset of all messages in the thread, fetched in one query.
         """
-        return Message.objects.filter(
-            parent_message=self
-        ).select_related('sender', 'receiver').prefetch_related('replies')
+        return Message.objects.thread(self.pk).exclude(
+            pk=self.pk
+        ).select_related('sender', 'receiver')
 
     @classmethod
-    def get_conversation_thread(cls, message_id):
+    def get_conversation_thread(cls, message_id, max_depth=None, order_by=('timestamp', 'id')):
         """
-        Get a full conversation thread starting from a specific message.
-        Uses select_related and prefetch_related for optimization.
+        Get a full conversation thread starting from a specific message,
+        down to `max_depth` levels of replies if given, in a single query.
+        Pass the result to build_thread_tree() to walk it as a tree.
         """
-        return cls.objects.filter(
-            models.Q(id=message_id) | models.Q(parent_message_id=message_id)
-        ).select_related(
-            'sender', 'receiver', 'parent_message'
-        ).prefetch_related(
-            'replies__sender',
-            'replies__receiver',
-            'replies__replies'
+        return cls.objects.thread(message_id, max_depth, order_by).select_related(
+            'sender', 'receiver'
         )
 
 
@@ -75,7 +134,8 @@ class Notification(models.Model):
     user = models.ForeignKey(
         User,
         on_delete=models.CASCADE,
-        related_name='notifications'
+        related_name='notifications',
+        db_index=False  # leading column of the notification indexes below
     )
     message = models.ForeignKey(
         Message,
@@ -85,12 +145,41 @@ class Notification(models.Model):
     is_read = models.BooleanField(default=False)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    objects = NotificationManager()
+
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            # A user's notifications, newest first (notifications view).
+            models.Index(fields=['user', '-created_at'], name='notif_user_created_idx'),
+            # Unread notifications only, for unread badges and counts.
+            models.Index(
+                fields=['user', '-created_at'],
+                condition=models.Q(is_read=False),
+                name='notif_unread_user_created_idx',
+            ),
+        ]
 
     def __str__(self):
         return f"Notification for {self.user} - Message from {self.message.sender}"
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance.remember_saved_state()
+        return instance
+
+    def refresh_from_db(self, *args, **kwargs):
+        super().refresh_from_db(*args, **kwargs)
+        self.remember_saved_state()
+
+    def remember_saved_state(self):
+        """
+        Keep is_read as it is in the database (None if not loaded), so the
+        unread counters can follow saves that change it.
+        """
+        self.saved_is_read = self.__dict__.get('is_read')
+
 
 class MessageHistory(models.Model):
     """
@@ -100,7 +189,8 @@ class MessageHistory(models.Model):
     message = models.ForeignKey(
         Message,
         on_delete=models.CASCADE,
-        related_name='history'
+        related_name='history',
+        db_index=False  # leading column of history_msg_edited_idx
     )
     old_content = models.TextField()
     edited_at = models.DateTimeField(auto_now_add=True)
@@ -111,9 +201,76 @@ class MessageHistory(models.Model):
         related_name='message_edits'
     )
 
+    objects = MessageHistoryManager()
+
     class Meta:
         ordering = ['-edited_at']
         verbose_name_plural = 'Message Histories'
+        indexes = [
+            # Edit history of a message, newest first (message_history).
+            models.Index(fields=['message', '-edited_at'], name='history_msg_edited_idx'),
+        ]
 
     def __str__(self):
         return f"Edit history for Message {self.message.id} at {self.edited_at}"
+
+
+class UnreadCounter(models.Model):
+    """
+    Unread message and notification counts of one user, kept current by
+    messaging.counters so badges never have to COUNT rows.
+    """
+    user = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='unread_counter'
+    )
+    messages = models.PositiveIntegerField(default=0)
+    notifications = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return f"Unread counts for {self.user}"
+
+
+class AccountDeletion(models.Model):
+    """
+    A user account queued for deletion by `manage.py process_account_deletions`,
+    with its progress. The user is referenced by id only, so the row
+    outlives the account it reports on.
+    """
+    PENDING = 'pending'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUS_CHOICES = [
+        (PENDING, 'Pending'),
+        (RUNNING, 'Running'),
+        (DONE, 'Done'),
+        (FAILED, 'Failed'),
+    ]
+
+    user_id = models.IntegerField(unique=True)
+    username = models.CharField(max_length=150)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=PENDING)
+    messages_deleted = models.PositiveIntegerField(default=0)
+    notifications_deleted = models.PositiveIntegerField(default=0)
+    history_deleted = models.PositiveIntegerField(default=0)
+    error = models.TextField(blank=True)
+    requested_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['requested_at']
+        indexes = [
+            # The worker's queue.
+            models.Index(
+                fields=['requested_at'],
+                condition=models.Q(status='pending'),
+                name='deletion_pending_idx',
+            ),
+        ]
+
+    def __str__(self):
+        return f"Deletion of {self.username} ({self.status})"
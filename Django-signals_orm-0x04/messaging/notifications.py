@@ -0,0 +1,125 @@
+"""
+Notification fan-out.
+
+Notifications for messages sent inside a transaction are buffered and
+written with one bulk_create() when the transaction commits, instead of
+one INSERT per message while it is still open. Messages sent outside a
+transaction are notified straight away.
+"""
+import collections
+import threading
+import weakref
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+from .cache import bump_generation
+from .counters import adjust_unread
+from .models import Message, Notification
+from .search import index_messages
+
+_batches = threading.local()
+
+
+class NotificationBatch:
+    """
+    Notifications waiting for one transaction (or savepoint) to commit.
+
+    The batch is registered as the on_commit callback itself, so when
+    Django discards that callback on rollback, the batch and everything
+    in it are discarded along with it.
+    """
+
+    def __init__(self, using):
+        self.using = using
+        self.notifications = []
+        self.flushed = False
+
+    def add(self, notification):
+        self.notifications.append(notification)
+
+    def __call__(self):
+        self.flushed = True
+        notifications, self.notifications = self.notifications, []
+        create_notifications(notifications, using=self.using)
+
+
+def _current_batch(using):
+    """
+    The batch of the innermost open savepoint (or transaction) on `using`,
+    registering a new one with on_commit if there is none yet.
+    """
+    connection = connections[using]
+    if not hasattr(_batches, 'by_savepoint'):
+        _batches.by_savepoint = weakref.WeakValueDictionary()
+    key = (using, tuple(connection.savepoint_ids))
+    batch = _batches.by_savepoint.get(key)
+    if batch is None or batch.flushed:
+        batch = NotificationBatch(using)
+        _batches.by_savepoint[key] = batch
+        transaction.on_commit(batch, using=using)
+    return batch
+
+
+def create_notifications(notifications, using=DEFAULT_DB_ALIAS):
+    """
+    Write `notifications` with one bulk_create(), then count them and
+    invalidate the cached pages of their users (bulk_create() sends no
+    post_save).
+    """
+    if not notifications:
+        return
+    Notification.objects.using(using).bulk_create(notifications)
+    per_user = collections.Counter(notification.user_id for notification in notifications)
+    for user_id, count in per_user.items():
+        adjust_unread(user_id, notifications=count)
+    bump_generation(*per_user)
+
+
+def queue_notification(message, using=DEFAULT_DB_ALIAS):
+    """
+    Notify the receiver of `message`: on commit of the current transaction
+    if there is one, immediately otherwise.
+    """
+    notification = Notification(user_id=message.receiver_id, message=message)
+    if connections[using].in_atomic_block:
+        _current_batch(using).add(notification)
+    else:
+        create_notifications([notification], using=using)
+
+
+def bulk_send_messages(messages, batch_size=1000):
+    """
+    Save unsaved Message instances and notify their receivers with one
+    bulk INSERT each for messages, notifications and the search index (plus
+    one UPDATE for the thread paths) per `batch_size` messages. Signals are not sent.
+    Returns the saved messages; reload them to read thread_root and path.
+    """
+    messages = list(messages)
+    with transaction.atomic():
+        for start in range(0, len(messages), batch_size):
+            batch = Message.objects.bulk_create(messages[start:start + batch_size])
+            ids = [message.pk for message in batch]
+            Message.objects.assign_thread_paths(ids)
+            index_messages(ids, created=True)
+            Notification.objects.bulk_create(
+                Notification(user_id=message.receiver_id, message=message) for message in batch
+            )
+        # One adjustment per receiver for both counters: a missing counter
+        # row is rebuilt from the tables, which already hold both inserts.
+        notified = collections.Counter(message.receiver_id for message in messages)
+        unread = collections.Counter(message.receiver_id for message in messages if not message.read)
+        for receiver_id, count in notified.items():
+            adjust_unread(receiver_id, messages=unread[receiver_id], notifications=count)
+    user_ids = {user_id for message in messages for user_id in (message.sender_id, message.receiver_id)}
+    # Replies show on the pages of their parents' participants too; read
+    # the parents that were not passed as instances.
+    parent_ids = set()
+    for message in messages:
+        if message.parent_message_id is None:
+            continue
+        if Message.parent_message.is_cached(message):
+            user_ids.update((message.parent_message.sender_id, message.parent_message.receiver_id))
+        else:
+            parent_ids.add(message.parent_message_id)
+    if parent_ids:
+        user_ids.update(*Message.objects.filter(pk__in=parent_ids).order_by().values_list('sender_id', 'receiver_id'))
+    bump_generation(*user_ids)
+    return messages
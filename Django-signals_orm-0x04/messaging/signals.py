@@ -1,57 +1,212 @@
 from django.db.models.signals import post_save, pre_save, post_delete
 from django.dispatch import receiver
 from django.contrib.auth.models import User
+from .cache import bump_generation, forget_generation
+from .counters import adjust_unread, forget_counts
+from .managers import thread_path_key
+from .notifications import queue_notification
+from .search import index_message, unindex_messages
 from .models import Message, Notification, MessageHistory
 
 
 @receiver(post_save, sender=Message)
-def create_notification_on_new_message(sender, instance, created, **kwargs):
+def assign_thread_path(sender, instance, created, raw=False, **kwargs):
+    """
+    Signal to record where a new message sits in its thread.
+    Sets thread_root and path from the parent message in one UPDATE.
+    """
+    if not created or raw:
+        return
+    parent = instance.parent_message
+    if parent is None:
+        thread_root_id, path = instance.pk, thread_path_key(instance.pk)
+    else:
+        thread_root_id = parent.thread_root_id or parent.pk
+        path = parent.path + thread_path_key(instance.pk)
+    Message.objects.filter(pk=instance.pk).update(thread_root_id=thread_root_id, path=path)
+    instance.thread_root_id = thread_root_id
+    instance.path = path
+
+
+@receiver(post_save, sender=Message)
+def create_notification_on_new_message(sender, instance, created, using, **kwargs):
     """
     Signal to create a notification when a new message is created.
-    Triggers only when a new message is created, not on updates.
+    Triggers only when a new message is created, not on updates. Inside a
+    transaction the notification is written in bulk on commit.
     """
     if created:
-        Notification.objects.create(
-            user=instance.receiver,
-            message=instance
-        )
+        queue_notification(instance, using=using)
 
 
 @receiver(pre_save, sender=Message)
-def log_message_edit(sender, instance, **kwargs):
+def log_message_edit(sender, instance, update_fields=None, **kwargs):
     """
     Signal to log the old content of a message before it's updated.
-    Creates a MessageHistory entry with the old content.
-    """
-    if instance.pk:  # Only for existing messages (updates)
-        try:
-            old_message = Message.objects.get(pk=instance.pk)
-            # Check if content has changed
-            if old_message.content != instance.content:
-                MessageHistory.objects.create(
-                    message=instance,
-                    old_content=old_message.content,
-                    edited_by=instance.sender
-                )
-                # Mark the message as edited
-                instance.edited = True
-        except Message.DoesNotExist:
-            pass  # New message, no history to log
+    Creates a MessageHistory entry with the old content, only if the
+    content changed. The old content comes from the instance's snapshot
+    (Message.remember_saved_state), so saves cost no extra query.
+    """
+    if instance._state.adding:
+        return  # New message, no history to log
+    if update_fields is not None and 'content' not in update_fields:
+        return
+    old_content = getattr(instance, 'saved_content', None)
+    if old_content is None:
+        # Built by hand or loaded with content deferred: ask the database.
+        old_content = Message.objects.filter(pk=instance.pk).values_list('content', flat=True).first()
+        if old_content is None:
+            return
+    if old_content != instance.content:
+        MessageHistory.objects.create(
+            message=instance,
+            old_content=old_content,
+            edited_by_id=instance.sender_id
+        )
+        # Mark the message as edited
+        instance.edited = True
+
+
+@receiver(post_save, sender=Message)
+def index_message_content(sender, instance, created, update_fields=None, raw=False, using=None, **kwargs):
+    """
+    Signal to keep the full-text search index in step with the content.
+    Runs before remember_saved_state, so saved_content is still the
+    content from before the save.
+    """
+    if raw:
+        return
+    if not created:
+        if update_fields is not None and 'content' not in update_fields:
+            return
+        if instance.content == getattr(instance, 'saved_content', None):
+            return
+    index_message(instance, created, using=using)
+
+
+@receiver(post_delete, sender=Message)
+def unindex_deleted_message(sender, instance, using=None, **kwargs):
+    """
+    Signal to drop a deleted message from the full-text search index.
+    """
+    unindex_messages([instance.pk], using=using)
+
+
+@receiver(post_save, sender=Message)
+def count_message_read_change(sender, instance, created, update_fields=None, raw=False, **kwargs):
+    """
+    Signal to follow a save that flipped read, once it has gone through.
+    Runs before remember_saved_state, so saved_read is still the state
+    from before the save.
+    """
+    if created or raw or getattr(instance, 'saved_read', None) is None:
+        return
+    if update_fields is not None and 'read' not in update_fields:
+        return
+    if instance.read != instance.saved_read:
+        adjust_unread(instance.receiver_id, messages=-1 if instance.read else 1)
+
+
+@receiver(post_save, sender=Notification)
+def count_notification_read_change(sender, instance, created, update_fields=None, raw=False, **kwargs):
+    """
+    Signal to follow a save that flipped is_read, once it has gone through.
+    Runs before remember_saved_state, so saved_is_read is still the state
+    from before the save.
+    """
+    if created or raw or getattr(instance, 'saved_is_read', None) is None:
+        return
+    if update_fields is not None and 'is_read' not in update_fields:
+        return
+    if instance.is_read != instance.saved_is_read:
+        adjust_unread(instance.user_id, notifications=-1 if instance.is_read else 1)
+
+
+@receiver(post_save, sender=Message)
+@receiver(post_save, sender=Notification)
+def remember_saved_state(sender, instance, **kwargs):
+    """
+    Signal to refresh the saved-state snapshot once a save has gone through.
+    """
+    instance.remember_saved_state()
+
+
+@receiver(post_save, sender=Message)
+def count_new_message(sender, instance, created, raw=False, **kwargs):
+    """
+    Signal to count a new unread message for its receiver.
+    """
+    if created and not raw and not instance.read:
+        adjust_unread(instance.receiver_id, messages=1)
+
+
+@receiver(post_delete, sender=Message)
+def uncount_deleted_message(sender, instance, **kwargs):
+    """
+    Signal to stop counting a deleted unread message.
+    """
+    if not instance.read:
+        adjust_unread(instance.receiver_id, messages=-1)
+
+
+@receiver(post_save, sender=Notification)
+def count_new_notification(sender, instance, created, raw=False, **kwargs):
+    """
+    Signal to count a notification saved on its own (bulk-created ones are
+    counted by messaging.notifications).
+    """
+    if created and not raw and not instance.is_read:
+        adjust_unread(instance.user_id, notifications=1)
+
+
+@receiver(post_delete, sender=Notification)
+def uncount_deleted_notification(sender, instance, **kwargs):
+    """
+    Signal to stop counting a deleted unread notification.
+    """
+    if not instance.is_read:
+        adjust_unread(instance.user_id, notifications=-1)
 
 
 @receiver(post_delete, sender=User)
 def cleanup_user_data(sender, instance, **kwargs):
     """
-    Signal to clean up all user-related data when a user is deleted.
-    Deletes all messages, notifications, and message histories associated with the user.
-    
-    Note: Due to CASCADE on foreign keys, most related objects will be automatically
-    deleted. This signal handles any additional cleanup if needed.
-    """
-    # Messages where user is sender or receiver are automatically deleted via CASCADE
-    # Notifications linked to user are automatically deleted via CASCADE
-    # MessageHistory entries linked to messages are automatically deleted via CASCADE
-    
-    # Additional cleanup for any orphaned data if needed
-    # This is mostly handled by CASCADE, but we can add custom logic here
-    pass
+    Signal to clean up what the cascades leave behind when a user is
+    deleted: their cached unread counts and page generation.
+
+    Messages, notifications and edit history go with the user through
+    CASCADE, which loads every one of them first; messaging.deletion
+    deletes them in batches beforehand, so that user.delete() finds
+    nothing left to cascade.
+    """
+    forget_counts(instance.pk)
+    forget_generation(instance.pk)
+
+
+@receiver(post_save, sender=Message)
+@receiver(post_delete, sender=Message)
+def invalidate_message_views(sender, instance, **kwargs):
+    """
+    Signal to invalidate the cached message pages of both participants
+    when a message is sent, edited, read or deleted. A reply also shows
+    on the pages of its parent's participants, who may be other users.
+    """
+    user_ids = {instance.sender_id, instance.receiver_id}
+    if instance.parent_message_id is not None:
+        if Message.parent_message.is_cached(instance):
+            parent = instance.parent_message
+            user_ids.update((parent.sender_id, parent.receiver_id))
+        else:
+            user_ids.update(*Message.objects.filter(
+                pk=instance.parent_message_id
+            ).order_by().values_list('sender_id', 'receiver_id'))
+    bump_generation(*user_ids)
+
+
+@receiver(post_save, sender=Notification)
+@receiver(post_delete, sender=Notification)
+def invalidate_notification_views(sender, instance, **kwargs):
+    """
+    Signal to invalidate the cached pages of a notification's user.
+    """
+    bump_generation(instance.user_id)
@@ -1,7 +1,27 @@
-from django.test import TestCase, Client
+import csv
+import datetime
+import json
+import os
+import tempfile
+from io import StringIO
+from unittest import mock
+from django.core.cache import cache
+from django.core.management import call_command
+from django.http import HttpResponse
+from django.db import DatabaseError, transaction
+from django.test import TestCase, Client, RequestFactory
 from django.contrib.auth.models import User
 from django.urls import reverse
-from .models import Message, Notification, MessageHistory
+from django.utils import timezone
+from .cache import bump_generation, cache_per_user, cache_stats, get_generation, reset_cache_stats
+from .hot_queries import HOT_QUERIES, find_full_scans
+from .managers import build_thread_tree, thread_path_key
+from .models import AccountDeletion, Message, Notification, MessageHistory
+from .deletion import delete_account, delete_user_data, process_account_deletion, request_account_deletion
+from .export import export_messages
+from .search import search_messages
+from .counters import get_unread_counts, reconcile_unread_counters
+from .notifications import NotificationBatch, bulk_send_messages
 
 
 class MessageModelTest(TestCase):
@@ -68,11 +88,12 @@ class NotificationSignalTest(TestCase):
 
     def test_notification_created_on_new_message(self):
         """Test that notification is created when a new message is sent."""
-        message = Message.objects.create(
-            sender=self.user1,
-            receiver=self.user2,
-            content='Hello, User2!'
-        )
+        with self.captureOnCommitCallbacks(execute=True):
+            message = Message.objects.create(
+                sender=self.user1,
+                receiver=self.user2,
+                content='Hello, User2!'
+            )
         notification = Notification.objects.filter(
             user=self.user2,
             message=message
@@ -81,6 +102,48 @@ class NotificationSignalTest(TestCase):
         self.assertEqual(notification.user, self.user2)
         self.assertFalse(notification.is_read)
 
+    def test_notifications_written_in_bulk_on_commit(self):
+        """Test that a transaction's notifications wait for the commit."""
+        with self.captureOnCommitCallbacks() as callbacks:
+            for i in range(3):
+                Message.objects.create(sender=self.user1, receiver=self.user2, content=str(i))
+        self.assertEqual(Notification.objects.count(), 0)
+        batches = [callback for callback in callbacks if isinstance(callback, NotificationBatch)]
+        self.assertEqual(len(batches), 1)
+        with self.assertNumQueries(2):  # bulk INSERT, unread counter UPDATE
+            batches[0]()
+        self.assertEqual(Notification.objects.filter(user=self.user2).count(), 3)
+
+    def test_rolled_back_messages_are_not_notified(self):
+        """Test that a rolled back savepoint drops its notifications."""
+        with self.captureOnCommitCallbacks(execute=True):
+            try:
+                with transaction.atomic():
+                    Message.objects.create(sender=self.user1, receiver=self.user2, content='lost')
+                    raise ValueError
+            except ValueError:
+                pass
+            Message.objects.create(sender=self.user1, receiver=self.user2, content='kept')
+        self.assertEqual(
+            list(Notification.objects.values_list('message__content', flat=True)), ['kept']
+        )
+
+    def test_bulk_send_messages(self):
+        """Test that bulk sends notify every receiver with bulk statements."""
+        parent = Message.objects.create(sender=self.user2, receiver=self.user1, content='parent')
+        messages = [
+            Message(sender=self.user1, receiver=self.user2, content=str(i), parent_message=parent)
+            for i in range(5)
+        ]
+        get_unread_counts(self.user2.pk)
+        # savepoint, INSERT, UPDATE, search index INSERT, INSERT, counter UPDATE, release
+        with self.assertNumQueries(7):
+            bulk_send_messages(messages)
+        self.assertEqual(Notification.objects.filter(user=self.user2).count(), 5)
+        reply = Message.objects.get(pk=messages[0].pk)
+        self.assertEqual(reply.thread_root, parent)
+        self.assertEqual(reply.path, parent.path + thread_path_key(reply.pk))
+
 
 class MessageHistorySignalTest(TestCase):
     """Test cases for message history signal."""
@@ -118,6 +181,73 @@ class MessageHistorySignalTest(TestCase):
         self.assertTrue(self.message.edited)
 
 
+class EditTrackingQueryTest(TestCase):
+    """Test cases for the query cost of edit tracking."""
+
+    def setUp(self):
+        """Set up a message loaded from the database."""
+        self.user1 = User.objects.create_user(username='user1', password='testpass123')
+        self.user2 = User.objects.create_user(username='user2', password='testpass123')
+        Message.objects.create(sender=self.user1, receiver=self.user2, content='Original')
+        self.message = Message.objects.get()
+
+    def test_read_flag_save_skips_history(self):
+        """Test that saving without a content change skips the history."""
+        self.message.read = True
+        with self.assertNumQueries(2):  # message and unread counter UPDATEs
+            self.message.save()
+        self.assertFalse(MessageHistory.objects.exists())
+
+    def test_content_edit_logs_without_reading_back(self):
+        """Test that an edit reads nothing back before logging it."""
+        self.message.content = 'Edited'
+        with self.assertNumQueries(4):  # UPDATE, history INSERT, search index DELETE and INSERT
+            self.message.save()
+        self.message.content = 'Edited again'
+        self.message.save()
+        self.assertEqual(
+            list(MessageHistory.objects.order_by('pk').values_list('old_content', flat=True)),
+            ['Original', 'Edited']
+        )
+
+    def test_update_fields_without_content(self):
+        """Test that update_fields without content skips the check."""
+        self.message.content = 'Not saved'
+        self.message.read = True
+        with self.assertNumQueries(2):  # message and unread counter UPDATEs
+            self.message.save(update_fields=['read'])
+        self.assertFalse(MessageHistory.objects.exists())
+
+    def test_deferred_content_falls_back_to_database(self):
+        """Test that edits are still logged when content was deferred."""
+        message = Message.objects.only('id', 'sender').get()
+        message.content = 'Edited'
+        message.save()
+        self.assertEqual(MessageHistory.objects.get().old_content, 'Original')
+
+    def test_mark_read(self):
+        """Test that mark_read is one UPDATE and does not send signals."""
+        with self.assertNumQueries(2):  # message and unread counter UPDATEs
+            self.assertTrue(self.message.mark_read())
+        self.assertFalse(self.message.mark_read())
+        Message.objects.create(sender=self.user1, receiver=self.user2, content='Second')
+        Message.objects.create(sender=self.user2, receiver=self.user1, content='Third')
+        # SELECT ... FOR UPDATE of the unread rows, UPDATE of those ids, one
+        # counter UPDATE per receiver, inside a savepoint.
+        with self.assertNumQueries(6):
+            self.assertEqual(Message.objects.mark_read(), 2)
+        self.assertFalse(Message.unread.exists())
+
+    def test_mark_read_adjusts_counters_by_rows_changed(self):
+        """Test that marking the same messages twice only counts them once."""
+        first = Message.objects.create(sender=self.user2, receiver=self.user1, content='First')
+        Message.objects.create(sender=self.user2, receiver=self.user1, content='Second')
+        self.assertEqual(get_unread_counts(self.user1.pk)['messages'], 2)
+        for expected in (1, 0):
+            self.assertEqual(Message.objects.filter(pk=first.pk).mark_read(), expected)
+            self.assertEqual(get_unread_counts(self.user1.pk)['messages'], 1)
+
+
 class UserDeletionTest(TestCase):
     """Test cases for user deletion and cleanup."""
 
@@ -134,11 +264,12 @@ class UserDeletionTest(TestCase):
             password='testpass123'
         )
         # Create messages
-        self.message = Message.objects.create(
-            sender=self.user1,
-            receiver=self.user2,
-            content='Test message'
-        )
+        with self.captureOnCommitCallbacks(execute=True):
+            self.message = Message.objects.create(
+                sender=self.user1,
+                receiver=self.user2,
+                content='Test message'
+            )
 
     def test_messages_deleted_on_user_deletion(self):
         """Test that messages are deleted when user is deleted."""
@@ -148,6 +279,101 @@ class UserDeletionTest(TestCase):
         # Check that the message was deleted (CASCADE)
         self.assertFalse(Message.objects.filter(id=message_id).exists())
 
+    def build_threads(self):
+        """Replies below the user's message, by others, and an unrelated thread."""
+        self.user3 = User.objects.create_user(username='user3', password='testpass123')
+        with self.captureOnCommitCallbacks(execute=True):
+            reply = Message.objects.create(
+                sender=self.user2, receiver=self.user1, content='Reply', parent_message=self.message
+            )
+            self.deep = Message.objects.create(
+                sender=self.user3, receiver=self.user2, content='Deep reply', parent_message=reply
+            )
+            self.unrelated = Message.objects.create(sender=self.user2, receiver=self.user3, content='Other')
+            Message.objects.create(sender=self.user1, receiver=self.user3, content='Another')
+        self.message.content = 'Edited'
+        self.message.save()
+        reply.content = 'Edited reply'
+        reply.save()  # history edited by user2 on a message that goes
+
+    def test_batched_deletion_matches_cascade(self):
+        """Test that delete_account removes what the cascade would, and keeps counters exact."""
+        self.build_threads()
+        totals = delete_account(self.user1, batch_size=2)
+        self.assertEqual(totals, {'messages': 4, 'notifications': 4, 'history': 2})
+        self.assertFalse(User.objects.filter(pk=self.user1.pk).exists())
+        self.assertEqual(list(Message.objects.values_list('pk', flat=True)), [self.unrelated.pk])
+        self.assertEqual(Notification.objects.count(), 1)
+        self.assertFalse(MessageHistory.objects.exists())
+        self.assertEqual(reconcile_unread_counters(), 0)
+        self.assertEqual(get_unread_counts(self.user3.pk), {'messages': 1, 'notifications': 1})
+
+    def test_batched_deletion_loads_no_messages(self):
+        """Test that the batched path never builds Message instances."""
+        self.build_threads()
+        with mock.patch.object(Message, 'from_db', side_effect=AssertionError('loaded')):
+            delete_user_data(self.user1.pk)
+        self.assertFalse(Message.objects.filter(sender=self.user1).exists())
+
+    def test_queued_deletion(self):
+        """Test that a queued deletion deactivates the user and records its progress."""
+        self.build_threads()
+        deletion = request_account_deletion(self.user1)
+        self.user1.refresh_from_db()
+        self.assertFalse(self.user1.is_active)
+        out = StringIO()
+        call_command('process_account_deletions', stdout=out)
+        self.assertIn('Deleted user1: 4 messages', out.getvalue())
+        deletion.refresh_from_db()
+        self.assertEqual(deletion.status, AccountDeletion.DONE)
+        self.assertEqual(deletion.history_deleted, 2)
+        self.assertFalse(User.objects.filter(pk=self.user1.pk).exists())
+        self.assertFalse(process_account_deletion(deletion))
+
+    def test_failed_deletion_is_requeued(self):
+        """Test that a failed deletion runs again when re-requested, or with --retry-failed."""
+        self.build_threads()
+        deletion = request_account_deletion(self.user1)
+        with mock.patch('messaging.deletion.delete_account', side_effect=RuntimeError('boom')):
+            with self.assertRaises(RuntimeError):
+                process_account_deletion(deletion)
+        deletion.refresh_from_db()
+        self.assertEqual(deletion.status, AccountDeletion.FAILED)
+        call_command('process_account_deletions', stdout=StringIO(), stderr=StringIO())
+        deletion.refresh_from_db()
+        self.assertEqual(deletion.status, AccountDeletion.FAILED)
+
+        again = request_account_deletion(self.user1)
+        self.assertEqual(again.pk, deletion.pk)
+        self.assertEqual((again.status, again.error), (AccountDeletion.PENDING, ''))
+
+        AccountDeletion.objects.filter(pk=deletion.pk).update(status=AccountDeletion.FAILED)
+        out = StringIO()
+        call_command('process_account_deletions', '--retry-failed', stdout=out)
+        self.assertIn('Requeued 1 failed deletions.', out.getvalue())
+        deletion.refresh_from_db()
+        self.assertEqual(deletion.status, AccountDeletion.DONE)
+        self.assertFalse(User.objects.filter(pk=self.user1.pk).exists())
+
+    def test_stale_running_deletion_is_reclaimed(self):
+        """Test that a deletion whose worker died mid-run is rerun once stale."""
+        self.build_threads()
+        deletion = request_account_deletion(self.user1)
+        started = timezone.now() - datetime.timedelta(minutes=10)
+        AccountDeletion.objects.filter(pk=deletion.pk).update(
+            status=AccountDeletion.RUNNING, started_at=started
+        )
+        call_command('process_account_deletions', stdout=StringIO())
+        deletion.refresh_from_db()
+        self.assertEqual(deletion.status, AccountDeletion.RUNNING)
+
+        out = StringIO()
+        call_command('process_account_deletions', '--stale-after', '300', stdout=out)
+        self.assertIn('Requeued 1 stale running deletions.', out.getvalue())
+        deletion.refresh_from_db()
+        self.assertEqual(deletion.status, AccountDeletion.DONE)
+        self.assertFalse(User.objects.filter(pk=self.user1.pk).exists())
+
 
 class UnreadMessagesManagerTest(TestCase):
     """Test cases for UnreadMessagesManager."""
@@ -190,3 +416,528 @@ class UnreadMessagesManagerTest(TestCase):
         """Test that UnreadMessagesManager filters unread by default."""
         all_unread = Message.unread.all()
         self.assertEqual(all_unread.count(), 1)
+
+
+class ThreadLoaderTest(TestCase):
+    """Test cases for loading whole reply threads."""
+
+    def setUp(self):
+        """Set up a thread that is four levels deep."""
+        self.user1 = User.objects.create_user(username='user1', password='testpass123')
+        self.user2 = User.objects.create_user(username='user2', password='testpass123')
+        self.root = self.reply(None, 'root')
+        self.first = self.reply(self.root, 'first')
+        self.second = self.reply(self.root, 'second')
+        self.nested = self.reply(self.first, 'nested')
+        self.deepest = self.reply(self.nested, 'deepest')
+        self.unrelated = self.reply(None, 'unrelated')
+
+    def reply(self, parent, content):
+        return Message.objects.create(
+            sender=self.user1, receiver=self.user2, content=content, parent_message=parent
+        )
+
+    def test_thread_tree_in_one_query(self):
+        """Test that the whole tree is loaded and linked in a single query."""
+        with self.assertNumQueries(1):
+            root = Message.objects.thread_tree(self.root.pk)
+            first, second = root.thread_children
+            nested, = first.thread_children
+            deepest, = nested.thread_children
+            self.assertEqual(deepest.parent_message.parent_message, first)
+            self.assertEqual(deepest.sender, self.user1)
+        self.assertEqual([first, second], [self.first, self.second])
+        self.assertEqual(deepest.depth, 3)
+        self.assertEqual(second.thread_children, [])
+
+    def test_max_depth(self):
+        """Test that replies below max_depth are left out."""
+        thread = Message.objects.thread(self.root.pk, max_depth=1)
+        self.assertEqual(set(thread), {self.root, self.first, self.second})
+
+    def test_parent_cycle_terminates(self):
+        """Test that a parent_message cycle does not make the thread query recurse forever."""
+        Message.objects.filter(pk=self.root.pk).update(parent_message=self.deepest)
+        thread = {self.root, self.first, self.second, self.nested, self.deepest}
+        self.assertEqual(set(Message.objects.thread(self.root.pk)), thread)
+        self.assertEqual(set(Message.objects.thread(self.nested.pk)), thread)
+        root = Message.objects.thread_tree(self.root.pk)
+        self.assertEqual(root.thread_children, [self.first, self.second])
+
+    def test_ordering(self):
+        """Test that children follow the requested ordering."""
+        root = Message.objects.thread_tree(self.root.pk, order_by=('-timestamp', '-id'))
+        self.assertEqual(root.thread_children, [self.second, self.first])
+
+    def test_get_thread_returns_all_descendants(self):
+        """Test that get_thread is no longer limited to direct replies."""
+        self.assertEqual(
+            set(self.root.get_thread()),
+            {self.first, self.second, self.nested, self.deepest}
+        )
+
+    def test_subtree_and_missing_root(self):
+        """Test loading from an inner message and from a missing one."""
+        messages = list(Message.get_conversation_thread(self.first.pk))
+        self.assertEqual(build_thread_tree(messages, self.first.pk), self.first)
+        self.assertEqual(len(messages), 3)
+        self.assertIsNone(Message.objects.thread_tree(0))
+
+    def test_conversation_thread_view(self):
+        """Test that the view returns 404 for a missing thread."""
+        client = Client()
+        client.force_login(self.user1)
+        response = client.get(reverse('conversation_thread', args=[0]))
+        self.assertEqual(response.status_code, 404)
+
+
+class ThreadPathTest(TestCase):
+    """Test cases for the materialised thread path."""
+
+    def setUp(self):
+        """Set up a small thread and an unrelated message."""
+        self.user1 = User.objects.create_user(username='user1', password='testpass123')
+        self.user2 = User.objects.create_user(username='user2', password='testpass123')
+        self.root = self.reply(None, 'root')
+        self.first = self.reply(self.root, 'first')
+        self.nested = self.reply(self.first, 'nested')
+        self.second = self.reply(self.root, 'second')
+        self.unrelated = self.reply(None, 'unrelated')
+
+    def reply(self, parent, content):
+        return Message.objects.create(
+            sender=self.user1, receiver=self.user2, content=content, parent_message=parent
+        )
+
+    def test_path_assigned_on_insert(self):
+        """Test that new messages know their root and path."""
+        self.nested.refresh_from_db()
+        self.assertEqual(self.nested.thread_root, self.root)
+        self.assertEqual(self.nested.path, thread_path_key(self.root.pk)
+                         + thread_path_key(self.first.pk) + thread_path_key(self.nested.pk))
+        self.assertEqual(self.unrelated.thread_root_id, self.unrelated.pk)
+
+    def test_subtree_in_thread_order(self):
+        """Test that subtree lists each message before its replies."""
+        self.assertEqual(
+            list(Message.objects.subtree(self.root)),
+            [self.root, self.first, self.nested, self.second]
+        )
+        self.assertEqual(list(Message.objects.subtree(self.first, include_self=False)), [self.nested])
+
+    def test_ancestors(self):
+        """Test that ancestors are returned root first."""
+        self.assertEqual(list(Message.objects.ancestors(self.nested)), [self.root, self.first])
+        self.assertEqual(list(Message.objects.ancestors(self.root)), [])
+
+    def test_reply_counts(self):
+        """Test that reply_count includes replies at any depth."""
+        counts = dict(Message.objects.with_reply_count().values_list('content', 'reply_count'))
+        self.assertEqual(counts, {'root': 3, 'first': 1, 'nested': 0, 'second': 0, 'unrelated': 0})
+
+    def test_rebuild_command_repairs_paths(self):
+        """Test that the rebuild command fixes rows that skipped the signal."""
+        Message.objects.update(thread_root=None, path='')
+        out = StringIO()
+        call_command('rebuild_thread_paths', stdout=out)
+        self.assertIn('5 messages', out.getvalue())
+        self.nested.refresh_from_db()
+        self.assertEqual(list(Message.objects.ancestors(self.nested)), [self.root, self.first])
+        call_command('rebuild_thread_paths', stdout=out)
+        self.assertIn('0 messages', out.getvalue())
+
+    def test_rebuild_walks_levels_in_batches(self):
+        """Test that a rebuild with tiny batches repairs every level."""
+        Message.objects.filter(pk=self.nested.pk).update(thread_root=None, path='')
+        Message.objects.filter(pk=self.first.pk).update(path='stale')
+        self.assertEqual(Message.objects.rebuild_thread_paths(batch_size=1), 2)
+        self.nested.refresh_from_db()
+        self.assertEqual(self.nested.thread_root_id, self.root.pk)
+        self.assertEqual(list(Message.objects.ancestors(self.nested)), [self.root, self.first])
+
+    def test_rebuild_rejects_cycles(self):
+        """Test that a parent_message cycle is reported and nothing changes."""
+        Message.objects.filter(pk=self.root.pk).update(parent_message=self.nested)
+        Message.objects.filter(pk=self.unrelated.pk).update(path='')
+        with self.assertRaisesMessage(ValueError, 'parent_message cycle'):
+            Message.objects.rebuild_thread_paths()
+        self.assertEqual(Message.objects.get(pk=self.unrelated.pk).path, '')
+
+
+class PerUserCacheTest(TestCase):
+    """Test cases for the per-user versioned page cache."""
+
+    def setUp(self):
+        """Set up users and a counting view."""
+        cache.clear()
+        reset_cache_stats()
+        self.user1 = User.objects.create_user(username='user1', password='testpass123')
+        self.user2 = User.objects.create_user(username='user2', password='testpass123')
+        self.calls = 0
+
+        @cache_per_user('test')
+        def view(request):
+            self.calls += 1
+            return HttpResponse(f'{request.user.username} {self.calls}')
+
+        self.view = view
+
+    def get(self, user, path='/inbox/'):
+        request = RequestFactory().get(path)
+        request.user = user
+        return self.view(request).content.decode()
+
+    def test_pages_are_cached_per_user(self):
+        """Test that users never see each other's cached pages."""
+        self.assertEqual(self.get(self.user1), 'user1 1')
+        self.assertEqual(self.get(self.user1), 'user1 1')
+        self.assertEqual(self.get(self.user2), 'user2 2')
+        self.assertEqual(self.get(self.user1, '/inbox/?page=2'), 'user1 3')
+        self.assertEqual(cache_stats(), {'hits': 1, 'misses': 3, 'hit_rate': 0.25})
+
+    def test_new_message_invalidates_both_users(self):
+        """Test that sending a message refreshes sender and receiver pages."""
+        self.get(self.user1)
+        self.get(self.user2)
+        Message.objects.create(sender=self.user1, receiver=self.user2, content='Hi')
+        self.assertEqual(self.get(self.user1), 'user1 3')
+        self.assertEqual(self.get(self.user2), 'user2 4')
+
+    def test_third_party_reply_invalidates_parent_participants(self):
+        """Test that a reply from another user refreshes the parent's pages."""
+        user3 = User.objects.create_user(username='user3', password='testpass123')
+        parent = Message.objects.create(sender=self.user1, receiver=self.user2, content='Hi')
+        self.get(self.user1)
+        self.get(self.user2)
+        reply = Message.objects.create(sender=user3, receiver=self.user1, content='Me too', parent_message_id=parent.pk)
+        self.assertEqual(self.get(self.user2), 'user2 3')
+        self.get(self.user1)
+        reply = Message.objects.get(pk=reply.pk)
+        reply.content = 'Me three'
+        reply.save()
+        self.assertEqual(self.get(self.user2), 'user2 5')
+        reply.delete()
+        self.assertEqual(self.get(self.user2), 'user2 6')
+        bulk_send_messages([Message(sender=user3, receiver=self.user1, content='Again', parent_message=parent)])
+        self.assertEqual(self.get(self.user2), 'user2 7')
+
+    def test_notification_change_invalidates_user(self):
+        """Test that reading a notification refreshes its user's pages."""
+        with self.captureOnCommitCallbacks(execute=True):
+            Message.objects.create(sender=self.user1, receiver=self.user2, content='Hi')
+        self.get(self.user2)
+        notification = Notification.objects.get(user=self.user2)
+        notification.is_read = True
+        notification.save()
+        self.assertEqual(self.get(self.user2), 'user2 2')
+
+    def test_evicted_generation_does_not_revive_old_pages(self):
+        """Test that a lost counter restarts above its old values."""
+        bump_generation(self.user1.pk)
+        old = get_generation(self.user1.pk)
+        cache.delete(f'messaging:generation:{self.user1.pk}')
+        self.assertGreater(get_generation(self.user1.pk), old)
+
+    def test_cache_stats_view_is_staff_only(self):
+        """Test that cache stats are only shown to staff."""
+        client = Client()
+        client.force_login(self.user1)
+        self.assertEqual(client.get(reverse('cache_stats')).status_code, 302)
+        self.user1.is_staff = True
+        self.user1.save()
+        response = client.get(reverse('cache_stats'))
+        self.assertEqual(response.json()['hits'], 0)
+
+
+class MarkReadTest(TestCase):
+    """Test cases for bulk mark-as-read."""
+
+    def setUp(self):
+        """Set up three messages with notifications for user2."""
+        self.user1 = User.objects.create_user(username='user1', password='testpass123')
+        self.user2 = User.objects.create_user(username='user2', password='testpass123')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.messages = [
+                Message.objects.create(sender=self.user1, receiver=self.user2, content=str(i))
+                for i in range(3)
+            ]
+            Message.objects.create(sender=self.user2, receiver=self.user1, content='other way')
+        self.notifications = list(Notification.objects.filter(user=self.user2).order_by('pk'))
+        self.client = Client()
+        self.client.force_login(self.user2)
+
+    def test_manager_mark_read_is_one_update(self):
+        """Test that marking notifications read is a single UPDATE."""
+        with self.assertNumQueries(2):  # notifications and unread counter UPDATEs
+            self.assertEqual(Notification.objects.mark_read(self.user2), 3)
+        self.assertEqual(Notification.objects.mark_read(self.user2), 0)
+
+    def test_mark_read_by_ids_and_before(self):
+        """Test narrowing by ids and by time."""
+        first, second, third = self.messages
+        self.assertEqual(Message.unread.mark_read(self.user2, ids=[first.pk, self.messages[1].pk]), 2)
+        self.assertEqual(list(Message.unread.for_user(self.user2)), [third])
+        self.assertEqual(Notification.objects.mark_read(self.user2, before=self.notifications[0].created_at), 1)
+        self.assertEqual(Notification.objects.filter(user=self.user2, is_read=False).count(), 2)
+
+    def test_mark_read_only_touches_own_rows(self):
+        """Test that other users' rows are left alone."""
+        self.assertEqual(Message.unread.mark_read(self.user2), 3)
+        self.assertEqual(Message.unread.for_user(self.user1).count(), 1)
+
+    def test_bulk_endpoints(self):
+        """Test the bulk endpoints and their validation."""
+        response = self.client.post(reverse('mark_notifications_read'), {'ids': [self.notifications[0].pk]})
+        self.assertEqual(response.json(), {'updated': 1})
+        response = self.client.post(reverse('mark_messages_read'))
+        self.assertEqual(response.json(), {'updated': 3})
+        response = self.client.post(reverse('mark_messages_read'), {'before': 'yesterday'})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.client.get(reverse('mark_messages_read')).status_code, 405)
+
+    def test_mark_single_notification(self):
+        """Test the single notification endpoint."""
+        url = reverse('mark_notification_read', args=[self.notifications[0].pk])
+        self.assertRedirects(self.client.post(url), reverse('notifications'), fetch_redirect_response=False)
+        self.assertTrue(Notification.objects.get(pk=self.notifications[0].pk).is_read)
+        self.assertEqual(self.client.post(url).status_code, 302)
+        other = Notification.objects.get(user=self.user1)
+        url = reverse('mark_notification_read', args=[other.pk])
+        self.assertEqual(self.client.post(url).status_code, 404)
+        self.assertFalse(Notification.objects.get(pk=other.pk).is_read)
+
+    def test_mark_read_invalidates_cached_pages(self):
+        """Test that bulk marking bumps the user's cache generation."""
+        generation = get_generation(self.user2.pk)
+        Message.unread.mark_read(self.user2)
+        self.assertNotEqual(get_generation(self.user2.pk), generation)
+
+
+class UnreadCounterTest(TestCase):
+    """Test cases for the per-user unread counters."""
+
+    def setUp(self):
+        """Set up users and a clean cache."""
+        cache.clear()
+        self.user1 = User.objects.create_user(username='user1', password='testpass123')
+        self.user2 = User.objects.create_user(username='user2', password='testpass123')
+
+    def send(self, content='Hi'):
+        with self.captureOnCommitCallbacks(execute=True):
+            return Message.objects.create(sender=self.user1, receiver=self.user2, content=content)
+
+    def counts(self):
+        return get_unread_counts(self.user2.pk)
+
+    def test_counts_follow_every_path(self):
+        """Test that sends, reads and deletes keep the counts exact."""
+        first = self.send()
+        second = self.send()
+        self.send()
+        self.assertEqual(self.counts(), {'messages': 3, 'notifications': 3})
+        first.read = True
+        first.save()
+        second.mark_read()
+        self.assertEqual(self.counts()['messages'], 1)
+        Message.objects.get(read=False).delete()
+        self.assertEqual(self.counts(), {'messages': 0, 'notifications': 2})
+        Notification.objects.mark_read(self.user2)
+        self.assertEqual(self.counts(), {'messages': 0, 'notifications': 0})
+
+    def test_failed_save_leaves_counts_alone(self):
+        """Test that a save that fails does not move the counts."""
+        message = self.send()
+        message.read = True
+        with mock.patch.object(Message, '_do_update', side_effect=DatabaseError('boom')):
+            with self.assertRaises(DatabaseError):
+                message.save()
+        # Keep what ran before the failure, as autocommit would have.
+        transaction.set_rollback(False)
+        self.assertEqual(self.counts()['messages'], 1)
+        message.save()
+        self.assertEqual(self.counts()['messages'], 0)
+
+    def test_counts_are_constant_time(self):
+        """Test that reading counts is one lookup, then a cache hit."""
+        for i in range(5):
+            self.send(str(i))
+        cache.clear()
+        with self.assertNumQueries(1):
+            self.assertEqual(self.counts(), {'messages': 5, 'notifications': 5})
+        with self.assertNumQueries(0):
+            self.counts()
+
+    def test_reconcile_repairs_drift(self):
+        """Test that the command recounts drifted and missing counters."""
+        self.send()
+        Message.objects.update(read=True)  # bypasses the counters
+        out = StringIO()
+        call_command('reconcile_unread_counters', stdout=out)
+        self.assertIn('Repaired 2 unread counters', out.getvalue())
+        self.assertEqual(self.counts(), {'messages': 0, 'notifications': 1})
+        self.assertEqual(reconcile_unread_counters(), 0)
+
+    def test_unread_counts_view(self):
+        """Test the unread counts endpoint."""
+        self.send()
+        client = Client()
+        client.force_login(self.user2)
+        self.assertEqual(client.get(reverse('unread_counts')).json(), {'messages': 1, 'notifications': 1})
+
+
+class MessageExportTest(TestCase):
+    """Test cases for the streaming message export."""
+
+    def setUp(self):
+        """Set up messages between three users."""
+        self.user1 = User.objects.create_user(username='user1', password='testpass123')
+        self.user2 = User.objects.create_user(username='user2', password='testpass123')
+        self.user3 = User.objects.create_user(username='user3', password='testpass123')
+        self.sent = Message.objects.create(sender=self.user1, receiver=self.user2, content='Hi, "you"')
+        self.received = Message.objects.create(
+            sender=self.user2, receiver=self.user1, content='Héllo\nthere', parent_message=self.sent
+        )
+        Message.objects.create(sender=self.user2, receiver=self.user3, content='Not yours')
+
+    def test_ndjson_export(self):
+        """Test that the export holds only the user's messages, oldest first."""
+        with self.assertNumQueries(1):
+            lines = ''.join(export_messages(self.user1)).splitlines()
+        rows = [json.loads(line) for line in lines]
+        self.assertEqual([row['id'] for row in rows], [self.sent.pk, self.received.pk])
+        self.assertEqual(rows[1]['sender'], 'user2')
+        self.assertEqual(rows[1]['parent_message'], self.sent.pk)
+        self.assertEqual(rows[1]['content'], 'Héllo\nthere')
+        self.assertEqual(rows[0]['timestamp'], self.sent.timestamp.isoformat())
+
+    def test_csv_export(self):
+        """Test that CSV quoting survives commas, quotes and newlines."""
+        rows = list(csv.DictReader(StringIO(''.join(export_messages(self.user1, 'csv')))))
+        self.assertEqual(len(rows), 2)
+        self.assertEqual(rows[0]['content'], 'Hi, "you"')
+        self.assertEqual(rows[1]['content'], 'Héllo\nthere')
+
+    def test_unknown_format(self):
+        """Test that an unknown format is refused."""
+        with self.assertRaises(ValueError):
+            next(export_messages(self.user1, 'xml'))
+
+    def test_export_view_streams(self):
+        """Test the export endpoint."""
+        client = Client()
+        client.force_login(self.user1)
+        response = client.get(reverse('export_messages'), {'format': 'csv'})
+        self.assertTrue(response.streaming)
+        self.assertEqual(response['Content-Type'], 'text/csv')
+        self.assertIn('Hi, ""you""', b''.join(response.streaming_content).decode())
+        self.assertEqual(client.get(reverse('export_messages'), {'format': 'xml'}).status_code, 400)
+
+    def test_export_command(self):
+        """Test the export command, to a file and to stdout."""
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'export.ndjson')
+            call_command('export_messages', 'user3', output=path)
+            with open(path, encoding='utf-8') as exported:
+                self.assertEqual(json.loads(exported.read())['content'], 'Not yours')
+        out = StringIO()
+        call_command('export_messages', format='csv', stdout=out)
+        self.assertEqual(len(list(csv.reader(StringIO(out.getvalue())))), 4)
+
+
+class MessageSearchTest(TestCase):
+    """Test cases for full-text search over message content."""
+
+    def setUp(self):
+        """Set up messages with overlapping words."""
+        self.user1 = User.objects.create_user(username='user1', password='testpass123')
+        self.user2 = User.objects.create_user(username='user2', password='testpass123')
+        self.lunch = self.send('Lunch at noon? The lunch place by the station')
+        self.meeting = self.send('Meeting moved, lunch after')
+        self.other = self.send('Nothing to see here')
+
+    def send(self, content):
+        return Message.objects.create(sender=self.user1, receiver=self.user2, content=content)
+
+    def search(self, text, queryset=None):
+        return list(search_messages(queryset or Message.objects.all(), text))
+
+    def test_ranked_matches(self):
+        """Test that every word must match and denser matches rank first."""
+        results = self.search('lunch')
+        self.assertEqual(results, [self.lunch, self.meeting])
+        self.assertGreater(results[0].search_rank, results[1].search_rank)
+        self.assertEqual(self.search('lunch meeting'), [self.meeting])
+        self.assertEqual(self.search('lunch" (*'), [self.lunch, self.meeting])
+        self.assertEqual(self.search('!!'), [])
+
+    def test_index_follows_edits_and_deletes(self):
+        """Test that the signals and bulk sends keep the index in sync."""
+        self.other.content = 'Lunch is cancelled'
+        self.other.save()
+        self.meeting.delete()
+        self.assertEqual(set(self.search('lunch')), {self.lunch, self.other})
+        self.assertEqual(self.search('nothing'), [])
+        sent = bulk_send_messages([Message(sender=self.user2, receiver=self.user1, content='lunch again')])
+        self.assertIn(sent[0], self.search('again'))
+
+    def test_search_narrows_queryset(self):
+        """Test that search composes with other filters."""
+        reply = Message.objects.create(sender=self.user2, receiver=self.user1, content='lunch sounds good')
+        self.assertEqual(self.search('lunch', Message.objects.filter(sender=self.user2)), [reply])
+
+    def test_rebuild_command(self):
+        """Test that the rebuild command picks up content changed behind the signals."""
+        Message.objects.filter(pk=self.other.pk).update(content='Secret lunch')
+        self.assertEqual(self.search('secret'), [])
+        call_command('rebuild_search_index', stdout=StringIO())
+        self.assertEqual(self.search('secret'), [Message.objects.get(pk=self.other.pk)])
+
+    def test_admin_search(self):
+        """Test the admin changelist search, ranked and by username."""
+        admin = User.objects.create_superuser(username='admin', password='testpass123')
+        client = Client()
+        client.force_login(admin)
+        url = reverse('admin:messaging_message_changelist')
+        response = client.get(url, {'q': 'lunch'})
+        self.assertEqual(list(response.context['cl'].result_list), [self.lunch, self.meeting])
+        response = client.get(url, {'q': 'lunch', 'o': '-1'})
+        self.assertEqual(list(response.context['cl'].result_list), [self.meeting, self.lunch])
+        response = client.get(url, {'q': '@user1'})
+        self.assertEqual(response.context['cl'].result_count, 3)
+
+
+class HotQueryPlanTest(TestCase):
+    """Test cases for the hot query index advisor."""
+
+    def test_find_full_scans(self):
+        """Test that only scans without an index are flagged."""
+        self.assertEqual(find_full_scans('2 0 0 SCAN messaging_message'), ['messaging_message'])
+        self.assertEqual(find_full_scans('Seq Scan on messaging_message  (cost=0.00..1.01)'), ['messaging_message'])
+        self.assertEqual(find_full_scans('2 0 0 SCAN messaging_message USING INDEX msg_receiver_ts_idx'), [])
+        self.assertEqual(find_full_scans('2 0 0 SEARCH messaging_message USING INDEX msg_parent_ts_idx (parent_message_id=?)'), [])
+        self.assertEqual(find_full_scans('33 31 0 SCAN thread', tables={'messaging_message'}), [])
+
+    def test_hot_queries_use_indexes(self):
+        """Test that no registered hot query scans a whole table."""
+        out = StringIO()
+        call_command('explain_hot_queries', stdout=out)
+        self.assertEqual(out.getvalue().count(': ok'), len(HOT_QUERIES))
+
+    def test_inbox_query_runs(self):
+        """Test that the inbox query can be evaluated."""
+        user = User.objects.create_user(username='user1', password='testpass123')
+        self.assertEqual(list(HOT_QUERIES['inbox'](user, 1)), [])
+
+    def test_views_run_the_registered_queries(self):
+        """Test that the views render the querysets the registry explains."""
+        user = User.objects.create_user(username='user1', password='testpass123')
+        client = Client()
+        client.force_login(user)
+        for url, context_name, name in [
+            (reverse('inbox'), 'messages', 'inbox'),
+            (reverse('notifications'), 'notifications', 'notifications'),
+        ]:
+            with mock.patch('messaging.views.render', return_value=HttpResponse()) as render:
+                client.get(url)
+            queryset = render.call_args.args[2][context_name]
+            self.assertEqual(str(queryset.query), str(HOT_QUERIES[name](user, 1).query))
@@ -3,6 +3,7 @@ from . import views
 
 urlpatterns = [
     path('inbox/', views.inbox, name='inbox'),
+    path('inbox/read/', views.mark_messages_read, name='mark_messages_read'),
     path('delete-account/', views.delete_user, name='delete_user'),
     path('message/<int:message_id>/', views.message_thread, name='message_thread'),
     path('conversation/<int:message_id>/', views.conversation_thread, name='conversation_thread'),
@@ -10,5 +11,9 @@ urlpatterns = [
     path('message/<int:message_id>/edit/', views.edit_message, name='edit_message'),
     path('send/', views.send_message, name='send_message'),
     path('notifications/', views.notifications, name='notifications'),
+    path('notifications/read/', views.mark_notifications_read, name='mark_notifications_read'),
     path('notifications/<int:notification_id>/read/', views.mark_notification_read, name='mark_notification_read'),
+    path('export/', views.export_messages, name='export_messages'),
+    path('unread-counts/', views.unread_counts, name='unread_counts'),
+    path('cache-stats/', views.cache_stats, name='cache_stats'),
 ]
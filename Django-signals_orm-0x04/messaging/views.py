@@ -1,9 +1,17 @@
+from django.conf import settings
 from django.shortcuts import render, get_object_or_404, redirect
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth.models import User
 from django.contrib import messages as django_messages
-from django.http import JsonResponse
-from django.views.decorators.cache import cache_page
+from django.http import Http404, JsonResponse, StreamingHttpResponse
+from django.utils.dateparse import parse_datetime
+from django.views.decorators.http import require_POST
+from django.contrib.admin.views.decorators import staff_member_required
+from .cache import cache_per_user, cache_stats as get_cache_stats
+from .counters import get_unread_counts
+from .deletion import delete_account, request_account_deletion
+from .export import EXPORT_FORMATS, export_messages as stream_export
+from .managers import build_thread_tree
 from .models import Message, Notification, MessageHistory
 
 
@@ -11,37 +19,36 @@ from .models import Message, Notification, MessageHistory
 def delete_user(request):
     """
     View that allows a user to delete their account.
-    The post_delete signal on User model will handle cleanup of related data.
+    Their messages, notifications and edit history are deleted in batches
+    (see messaging.deletion) rather than loaded by the CASCADE of
+    user.delete(). With MESSAGING_DEFER_ACCOUNT_DELETION the account is
+    deactivated and queued for `manage.py process_account_deletions`.
     """
     if request.method == 'POST':
         user = request.user
         # Log out the user first
         from django.contrib.auth import logout
         logout(request)
-        # Delete the user (this triggers the post_delete signal)
-        user.delete()
-        django_messages.success(request, 'Your account has been successfully deleted.')
+        if getattr(settings, 'MESSAGING_DEFER_ACCOUNT_DELETION', False):
+            request_account_deletion(user)
+            django_messages.success(request, 'Your account has been deactivated and will be deleted shortly.')
+        else:
+            delete_account(user)
+            django_messages.success(request, 'Your account has been successfully deleted.')
         return redirect('home')
     
     return render(request, 'messaging/delete_user.html')
 
 
-@cache_page(60)
 @login_required
+@cache_per_user('inbox')
 def inbox(request):
     """
     Display unread messages for the logged-in user.
-    Uses Message.objects.filter with .only() optimization.
-    Cached for 60 seconds.
-    """
-    unread_messages = Message.objects.filter(
-        receiver=request.user,
-        read=False
-    ).select_related(
-        'sender', 'receiver'
-    ).only(
-        'id', 'sender', 'content', 'timestamp', 'parent_message'
-    )
+    Uses Message.objects.inbox, which defers the unused columns.
+    Cached per user until one of their messages or notifications changes.
+    """
+    unread_messages = Message.objects.inbox(request.user)
     return render(request, 'messaging/inbox.html', {'messages': unread_messages})
 
 
@@ -69,10 +76,18 @@ def message_thread(request, message_id):
 def conversation_thread(request, message_id):
     """
     Display a full conversation thread starting from a specific message.
-    Uses advanced ORM techniques for efficient querying.
+    The whole reply tree (or ?depth=N levels of it) is loaded in one query
+    and linked in memory; `root.thread_children` holds the replies.
     """
-    thread = Message.get_conversation_thread(message_id)
-    return render(request, 'messaging/conversation.html', {'thread': thread})
+    try:
+        max_depth = int(request.GET['depth'])
+    except (KeyError, ValueError):
+        max_depth = None
+    thread = list(Message.get_conversation_thread(message_id, max_depth))
+    root = build_thread_tree(thread, message_id)
+    if root is None:
+        raise Http404('No Message matches the given query.')
+    return render(request, 'messaging/conversation.html', {'thread': thread, 'root': root})
 
 
 @login_required
@@ -82,7 +97,7 @@ def message_history(request, message_id):
     Allows users to view previous versions of their messages.
     """
     message = get_object_or_404(Message, pk=message_id)
-    history = MessageHistory.objects.filter(message=message).select_related('edited_by')
+    history = MessageHistory.objects.for_message(message)
     
     return render(request, 'messaging/history.html', {
         'message': message,
@@ -95,9 +110,7 @@ def notifications(request):
     """
     Display notifications for the logged-in user.
     """
-    user_notifications = Notification.objects.filter(
-        user=request.user
-    ).select_related('message', 'message__sender')
+    user_notifications = Notification.objects.for_user(request.user)
     
     return render(request, 'messaging/notifications.html', {
         'notifications': user_notifications
@@ -107,15 +120,65 @@ def notifications(request):
 @login_required
 def mark_notification_read(request, notification_id):
     """
-    Mark a notification as read.
+    Mark a notification as read with a single UPDATE.
     """
-    notification = get_object_or_404(Notification, pk=notification_id, user=request.user)
-    notification.is_read = True
-    notification.save()
+    if not Notification.objects.mark_read(request.user, ids=[notification_id]):
+        # Already read, or not one of the user's notifications.
+        get_object_or_404(Notification, pk=notification_id, user=request.user)
     
     return redirect('notifications')
 
 
+def parse_mark_read(request):
+    """
+    Read the optional `ids` (repeated) and `before` (ISO 8601 datetime)
+    parameters of a bulk mark-read request.
+    Returns (ids, before), or None if either is malformed.
+    """
+    ids = request.POST.getlist('ids') or None
+    before = request.POST.get('before') or None
+    try:
+        if ids is not None:
+            ids = [int(pk) for pk in ids]
+        if before is not None:
+            before = parse_datetime(before)
+            if before is None:
+                return None
+    except ValueError:
+        return None
+    return ids, before
+
+
+@require_POST
+@login_required
+def mark_notifications_read(request):
+    """
+    Mark the user's notifications read: all of them, the given `ids`,
+    and/or those created at or before `before`.
+    Returns the number of notifications changed.
+    """
+    selection = parse_mark_read(request)
+    if selection is None:
+        return JsonResponse({'error': 'Invalid ids or before.'}, status=400)
+    ids, before = selection
+    return JsonResponse({'updated': Notification.objects.mark_read(request.user, ids, before)})
+
+
+@require_POST
+@login_required
+def mark_messages_read(request):
+    """
+    Mark the user's received messages read: all of them, the given `ids`,
+    and/or those sent at or before `before`.
+    Returns the number of messages changed.
+    """
+    selection = parse_mark_read(request)
+    if selection is None:
+        return JsonResponse({'error': 'Invalid ids or before.'}, status=400)
+    ids, before = selection
+    return JsonResponse({'updated': Message.unread.mark_read(request.user, ids, before)})
+
+
 @login_required
 def send_message(request):
     """
@@ -163,3 +226,36 @@ def edit_message(request, message_id):
         return redirect('message_thread', message_id=message_id)
     
     return render(request, 'messaging/edit_message.html', {'message': message})
+
+
+@login_required
+def unread_counts(request):
+    """
+    Return the user's unread message and notification counts, read from
+    their counter row instead of counting.
+    """
+    return JsonResponse(get_unread_counts(request.user.pk))
+
+
+@login_required
+def export_messages(request):
+    """
+    Stream every message the user sent or received, as NDJSON or
+    ?format=csv, without loading them into memory.
+    """
+    format = request.GET.get('format', 'ndjson')
+    if format not in EXPORT_FORMATS:
+        return JsonResponse({'error': 'Unknown format.'}, status=400)
+    response = StreamingHttpResponse(
+        stream_export(request.user, format), content_type=EXPORT_FORMATS[format]
+    )
+    response['Content-Disposition'] = f'attachment; filename="messages.{format}"'
+    return response
+
+
+@staff_member_required
+def cache_stats(request):
+    """
+    Report the message page cache hit and miss counts of this process.
+    """
+    return JsonResponse(get_cache_stats())
@@ -133,3 +133,16 @@ CACHES = {
         'LOCATION': 'unique-snowflake',
     }
 }
+
+# Per-user message pages (messaging.cache) are invalidated by signals, so
+# they can be kept much longer than a blind page cache.
+MESSAGING_CACHE_TIMEOUT = 60 * 60 * 24
+
+# Unread counts (messaging.counters) are cached in front of their counter
+# rows for this long; 0 reads the rows every time.
+MESSAGING_UNREAD_CACHE_TIMEOUT = 60 * 5
+
+# Account deletion (messaging.views.delete_user) deletes the user's data in
+# batches during the request; set this to deactivate the account and leave
+# the deletion to `manage.py process_account_deletions` instead.
+MESSAGING_DEFER_ACCOUNT_DELETION = False
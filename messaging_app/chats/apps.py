@@ -0,0 +1,10 @@
+from django.apps import AppConfig
+
+
+class ChatsConfig(AppConfig):
+    default_auto_field = 'django.db.models.BigAutoField'
+    name = 'chats'
+
+    def ready(self):
+        """Import signals when the app is ready."""
+        import chats.signals  # noqa: F401
@@ -0,0 +1,69 @@
+"""
+Streaming message export.
+
+Rows are read with values_list() through iterator(chunk_size=...), so the
+database hands them over a chunk at a time and no Message instances are
+built, and each row is encoded as soon as it arrives. Memory stays flat
+however many messages are exported.
+"""
+import csv
+import json
+
+EXPORT_COLUMNS = ('message_id', 'conversation_id', 'sent_at', 'sender', 'message_body')
+EXPORT_FIELDS = ('message_id', 'conversation_id', 'sent_at', 'sender__email', 'message_body')
+EXPORT_FORMATS = {
+    'ndjson': 'application/x-ndjson',
+    'csv': 'text/csv',
+}
+DEFAULT_CHUNK_SIZE = 2000
+# Lines are handed on in pieces of about this many characters rather
+# than one at a time.
+WRITE_SIZE = 64 * 1024
+
+def export_rows(messages, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Yields a tuple of EXPORT_COLUMNS values for every message in the
+    `messages` queryset, by conversation and then oldest first.
+    """
+    rows = messages.order_by('conversation_id', 'sent_at', 'message_id').values_list(
+        *EXPORT_FIELDS
+    ).iterator(chunk_size=chunk_size)
+    for message_id, conversation_id, sent_at, sender, message_body in rows:
+        yield str(message_id), str(conversation_id), sent_at.isoformat(), sender, message_body
+
+def ndjson_lines(rows):
+    for row in rows:
+        yield json.dumps(dict(zip(EXPORT_COLUMNS, row)), ensure_ascii=False) + '\n'
+
+class _Echo:
+    """
+    A file-like object whose write() returns what it is given, so
+    csv.writer formats one row at a time without a buffer.
+    """
+
+    def write(self, value):
+        return value
+
+def csv_lines(rows):
+    writer = csv.writer(_Echo())
+    yield writer.writerow(EXPORT_COLUMNS)
+    for row in rows:
+        yield writer.writerow(row)
+
+def export_messages(messages, format='ndjson', chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Yields the export of the `messages` queryset in `format` ('ndjson' or
+    'csv') as strings of about WRITE_SIZE characters.
+    """
+    if format not in EXPORT_FORMATS:
+        raise ValueError(f"Unknown export format {format!r}.")
+    encode = ndjson_lines if format == 'ndjson' else csv_lines
+    pending, size = [], 0
+    for line in encode(export_rows(messages, chunk_size)):
+        pending.append(line)
+        size += len(line)
+        if size >= WRITE_SIZE:
+            yield ''.join(pending)
+            pending, size = [], 0
+    if pending:
+        yield ''.join(pending)
@@ -0,0 +1,39 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from chats.export import DEFAULT_CHUNK_SIZE, EXPORT_FORMATS, export_messages
+from chats.models import Message
+
+
+class Command(BaseCommand):
+    help = (
+        "Stream messages as NDJSON or CSV with constant memory: those of the "
+        "given conversations and/or participant, or all of them."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'conversation_ids', nargs='*',
+            help='Only export these conversations (default: all).'
+        )
+        parser.add_argument('--user', help='Only export conversations this email address takes part in.')
+        parser.add_argument('--format', choices=sorted(EXPORT_FORMATS), default='ndjson')
+        parser.add_argument('--output', help='Write to this file instead of stdout.')
+        parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE)
+
+    def handle(self, *args, **options):
+        messages = Message.objects.all()
+        if options['conversation_ids']:
+            messages = messages.filter(conversation_id__in=options['conversation_ids'])
+        if options['user']:
+            try:
+                user = get_user_model().objects.get(email=options['user'])
+            except get_user_model().DoesNotExist:
+                raise CommandError(f"No user with email {options['user']!r}.")
+            messages = messages.filter(conversation__participants=user)
+        chunks = export_messages(messages, options['format'], chunk_size=options['chunk_size'])
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8', newline='') as output:
+                output.writelines(chunks)
+        else:
+            for chunk in chunks:
+                self.stdout.write(chunk, ending='')
@@ -1,5 +1,6 @@
 import uuid
 from django.db import models
+from django.db.models.functions import Coalesce
 from django.contrib.auth.models import AbstractUser
 
 class User(AbstractUser):
@@ -23,11 +24,43 @@ class User(AbstractUser):
     def __str__(self):
         return f"{self.first_name} {self.last_name}"
 
+class ConversationQuerySet(models.QuerySet):
+    def with_summary(self):
+        """
+        Annotate `message_count` and `last_message_at` from
+        ConversationSummary and order by most recent activity, so an inbox
+        never has to aggregate over Message.
+        """
+        return self.annotate(
+            message_count=Coalesce('summary__message_count', 0),
+            last_message_at=models.F('summary__last_message_at'),
+        ).order_by(models.F('summary__last_message_at').desc(nulls_last=True), '-created_at')
+
+class MessageQuerySet(models.QuerySet):
+    def latest_per_conversation(self, conversation_ids, limit):
+        """
+        The `limit` newest messages of each given conversation, oldest first.
+
+        Each conversation gets its own `message_id IN (SELECT ... LIMIT n)`
+        branch, which the (conversation, sent_at) index answers with a short
+        seek, so the cost does not depend on how long the histories are.
+        """
+        if limit <= 0 or not conversation_ids:
+            return self.none()
+        newest = models.Q()
+        for conversation_id in conversation_ids:
+            newest |= models.Q(pk__in=self.filter(
+                conversation_id=conversation_id
+            ).order_by('-sent_at', '-message_id').values('pk')[:limit])
+        return self.filter(newest).order_by('sent_at', 'message_id')
+
 class Conversation(models.Model):
     conversation_id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     participants = models.ManyToManyField(User, related_name='conversations')
     created_at = models.DateTimeField(auto_now_add=True)
 
+    objects = ConversationQuerySet.as_manager()
+
     def __str__(self):
         return f"Conversation {self.conversation_id}"
 
@@ -38,5 +71,79 @@ class Message(models.Model):
     message_body = models.TextField()
     sent_at = models.DateTimeField(auto_now_add=True)
 
+    objects = MessageQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            # Conversation previews read the newest messages per conversation.
+            models.Index(fields=['conversation', 'sent_at'], name='chats_msg_conv_sent_idx'),
+        ]
+
+    def __str__(self):
+        return f"Message by {self.sender} in {self.conversation}"
+
+class ConversationSummaryManager(models.Manager):
+    def rebuild(self, conversation_ids=None, batch_size=1000):
+        """
+        Recompute summaries from Message, for the given conversations or for
+        all of them, writing each batch with one upsert. Returns the number
+        of summaries written.
+        """
+        newest = Message.objects.filter(
+            conversation=models.OuterRef('pk')
+        ).order_by('-sent_at', '-message_id')
+        counts = Message.objects.filter(
+            conversation=models.OuterRef('pk')
+        ).order_by().values('conversation').annotate(total=models.Count('pk')).values('total')
+        conversations = Conversation.objects.order_by('pk').annotate(
+            last_id=models.Subquery(newest.values('pk')[:1]),
+            last_at=models.Subquery(newest.values('sent_at')[:1]),
+            total=Coalesce(models.Subquery(counts), 0),
+        ).values_list('pk', 'last_id', 'last_at', 'total')
+        if conversation_ids is not None:
+            conversations = conversations.filter(pk__in=conversation_ids)
+
+        written = 0
+        batch = []
+        for conversation_id, last_id, last_at, total in conversations.iterator(chunk_size=batch_size):
+            batch.append(self.model(
+                conversation_id=conversation_id,
+                last_message_id=last_id,
+                last_message_at=last_at,
+                message_count=total,
+            ))
+            if len(batch) == batch_size:
+                written += self._upsert(batch)
+                batch = []
+        if batch:
+            written += self._upsert(batch)
+        return written
+
+    def _upsert(self, summaries):
+        self.bulk_create(
+            summaries,
+            update_conflicts=True,
+            unique_fields=['conversation'],
+            update_fields=['last_message', 'last_message_at', 'message_count'],
+        )
+        return len(summaries)
+
+class ConversationSummary(models.Model):
+    """
+    Denormalised per-conversation activity, kept current by the Message
+    signals in chats.signals and rebuilt with `manage.py
+    rebuild_conversation_summaries`.
+    """
+    conversation = models.OneToOneField(
+        Conversation, primary_key=True, related_name='summary', on_delete=models.CASCADE
+    )
+    last_message = models.ForeignKey(
+        Message, null=True, blank=True, related_name='+', on_delete=models.SET_NULL
+    )
+    last_message_at = models.DateTimeField(null=True, blank=True, db_index=True)
+    message_count = models.PositiveIntegerField(default=0)
+
+    objects = ConversationSummaryManager()
+
     def __str__(self):
-        return f"Message by {self.sender} in {self.conversation}"
\ No newline at end of file
+        return f"Summary of {self.conversation}"
@@ -35,4 +35,24 @@ class ConversationSerializer(serializers.ModelSerializer):
         fields = ['conversation_id', 'participants', 'messages', 'created_at', 'participant_count']
 
     def get_participant_count(self, obj):
-        return obj.participants.count()
\ No newline at end of file
+        # ConversationViewSet annotates the count; fall back for other callers.
+        if hasattr(obj, 'participant_total'):
+            return obj.participant_total
+        return obj.participants.count()
+
+class ConversationListSerializer(serializers.ModelSerializer):
+    """
+    Conversation list entry: the most recent messages (set on
+    `recent_messages` by ConversationViewSet) and summary figures instead
+    of the whole history, which stays available through the messages
+    endpoint.
+    """
+    messages = MessageSerializer(source='recent_messages', many=True, read_only=True)
+    message_count = serializers.IntegerField(read_only=True)
+    last_message_at = serializers.DateTimeField(read_only=True)
+    participants = serializers.PrimaryKeyRelatedField(many=True, read_only=True)
+    participant_count = serializers.IntegerField(source='participant_total', read_only=True)
+
+    class Meta:
+        model = Conversation
+        fields = ['conversation_id', 'participants', 'messages', 'message_count', 'last_message_at', 'created_at', 'participant_count']
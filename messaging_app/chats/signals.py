@@ -0,0 +1,53 @@
+from django.db.models import Case, F, OuterRef, Q, Subquery, UUIDField, Value, When
+from django.db.models.functions import Greatest
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from .models import Conversation, ConversationSummary, Message
+
+
+@receiver(post_save, sender=Conversation)
+def create_conversation_summary(sender, instance, created, raw=False, **kwargs):
+    """
+    Start every new conversation with an empty summary row.
+    """
+    if created and not raw:
+        ConversationSummary.objects.get_or_create(conversation=instance)
+
+
+@receiver(post_save, sender=Message)
+def count_new_message(sender, instance, created, raw=False, **kwargs):
+    """
+    Bump the conversation summary in a single UPDATE. The last message only
+    moves forward, so messages committed out of order cannot roll it back.
+    """
+    if not created or raw:
+        return
+    is_newer = Q(last_message_at__isnull=True) | Q(last_message_at__lte=instance.sent_at)
+    updated = ConversationSummary.objects.filter(conversation_id=instance.conversation_id).update(
+        message_count=F('message_count') + 1,
+        last_message=Case(
+            When(is_newer, then=Value(instance.pk)), default=F('last_message'), output_field=UUIDField()
+        ),
+        last_message_at=Case(When(is_newer, then=Value(instance.sent_at)), default=F('last_message_at')),
+    )
+    if not updated:
+        # Conversation predates summaries; build its row from scratch.
+        ConversationSummary.objects.rebuild([instance.conversation_id])
+
+
+@receiver(post_delete, sender=Message)
+def uncount_deleted_message(sender, instance, **kwargs):
+    """
+    Decrement the count; if the deleted message was the last one (its
+    reference has been nulled by SET_NULL), pick the new last message in
+    the same UPDATE.
+    """
+    newest = Message.objects.filter(
+        conversation_id=OuterRef('conversation_id')
+    ).order_by('-sent_at', '-message_id')
+    was_last = Q(last_message__isnull=True)
+    ConversationSummary.objects.filter(conversation_id=instance.conversation_id).update(
+        message_count=Greatest(F('message_count') - 1, 0),
+        last_message=Case(When(was_last, then=Subquery(newest.values('pk')[:1])), default=F('last_message')),
+        last_message_at=Case(When(was_last, then=Subquery(newest.values('sent_at')[:1])), default=F('last_message_at')),
+    )
@@ -1,6 +1,13 @@
+import csv
+import json
+from io import StringIO
+from django.core.management import call_command
 from django.test import TestCase
 from django.contrib.auth import get_user_model
-from .models import Conversation, Message
+from rest_framework.test import APIRequestFactory, force_authenticate
+from .export import export_messages
+from .models import Conversation, ConversationSummary, Message
+from .views import ConversationViewSet, MessageViewSet
 
 User = get_user_model()
 
@@ -31,4 +38,179 @@ class MessagingTestCase(TestCase):
 
     def test_message_creation(self):
         self.assertEqual(self.message.sender, self.user1)
-        self.assertEqual(self.message.conversation, self.conversation)
\ No newline at end of file
+        self.assertEqual(self.message.conversation, self.conversation)
+
+class QueryCountTestCase(TestCase):
+    """
+    Listing endpoints must run a fixed number of queries however many
+    conversations, participants and messages there are.
+    """
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='owner@example.com',
+            email='owner@example.com',
+            password='password123',
+            first_name='Owner',
+            last_name='User'
+        )
+        self.others = [
+            User.objects.create_user(
+                username=f'other{i}@example.com',
+                email=f'other{i}@example.com',
+                password='password123',
+                first_name='Other',
+                last_name=str(i)
+            )
+            for i in range(3)
+        ]
+
+    def add_conversations(self, count, messages_each=3):
+        for _ in range(count):
+            conversation = Conversation.objects.create()
+            conversation.participants.add(self.user, *self.others)
+            for i in range(messages_each):
+                Message.objects.create(
+                    sender=self.others[i % len(self.others)],
+                    conversation=conversation,
+                    message_body=f'Message {i}'
+                )
+
+    def list(self, viewset):
+        request = APIRequestFactory().get('/')
+        force_authenticate(request, user=self.user)
+        response = viewset.as_view({'get': 'list'})(request)
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def test_conversation_list_queries_are_constant(self):
+        self.add_conversations(1)
+        with self.assertNumQueries(4) as small:
+            self.list(ConversationViewSet)
+        self.add_conversations(5, messages_each=6)
+        with self.assertNumQueries(len(small)):
+            data = self.list(ConversationViewSet)
+        self.assertEqual(data['count'], 6)
+        self.assertEqual({c['participant_count'] for c in data['results']}, {4})
+
+    def test_message_list_queries_are_constant(self):
+        self.add_conversations(1)
+        with self.assertNumQueries(2) as small:
+            self.list(MessageViewSet)
+        self.add_conversations(4, messages_each=5)
+        with self.assertNumQueries(len(small)):
+            self.list(MessageViewSet)
+
+    def test_conversation_list_embeds_bounded_preview(self):
+        self.add_conversations(2, messages_each=6)
+        data = self.list(ConversationViewSet)
+        for conversation in data['results']:
+            self.assertEqual(len(conversation['messages']), 3)
+            self.assertEqual(conversation['message_count'], 6)
+            self.assertEqual(
+                [m['message_body'] for m in conversation['messages']],
+                ['Message 3', 'Message 4', 'Message 5']
+            )
+
+class ConversationSummaryTestCase(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='grace@example.com',
+            email='grace@example.com',
+            password='password123',
+            first_name='Grace',
+            last_name='Hopper'
+        )
+        self.conversation = Conversation.objects.create()
+        self.conversation.participants.add(self.user)
+
+    def send(self, body, conversation=None):
+        return Message.objects.create(
+            sender=self.user, conversation=conversation or self.conversation, message_body=body
+        )
+
+    def summary(self):
+        return ConversationSummary.objects.get(conversation=self.conversation)
+
+    def test_messages_update_summary(self):
+        self.send('first')
+        with self.assertNumQueries(2):  # INSERT + summary UPDATE
+            second = self.send('second')
+        summary = self.summary()
+        self.assertEqual(summary.message_count, 2)
+        self.assertEqual(summary.last_message, second)
+        self.assertEqual(summary.last_message_at, second.sent_at)
+
+    def test_deleting_last_message_moves_summary_back(self):
+        first = self.send('first')
+        self.send('second').delete()
+        summary = self.summary()
+        self.assertEqual(summary.message_count, 1)
+        self.assertEqual(summary.last_message, first)
+        first.delete()
+        summary = self.summary()
+        self.assertEqual(summary.message_count, 0)
+        self.assertIsNone(summary.last_message_at)
+
+    def test_rebuild_command_repairs_bulk_imports(self):
+        Message.objects.bulk_create([
+            Message(sender=self.user, conversation=self.conversation, message_body=str(i)) for i in range(3)
+        ])
+        ConversationSummary.objects.all().delete()
+        call_command('rebuild_conversation_summaries', stdout=StringIO())
+        self.assertEqual(self.summary().message_count, 3)
+
+    def test_conversation_list_is_ordered_by_activity(self):
+        other = Conversation.objects.create()
+        other.participants.add(self.user)
+        self.send('old', other)
+        self.send('new')
+        request = APIRequestFactory().get('/')
+        force_authenticate(request, user=self.user)
+        data = ConversationViewSet.as_view({'get': 'list'})(request).data
+        self.assertEqual(
+            [c['conversation_id'] for c in data['results']],
+            [str(self.conversation.pk), str(other.pk)]
+        )
+        self.assertEqual(data['results'][0]['message_count'], 1)
+
+class MessageExportTestCase(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='ada@example.com',
+            email='ada@example.com',
+            password='password123',
+            first_name='Ada',
+            last_name='Lovelace'
+        )
+        self.conversation = Conversation.objects.create()
+        self.conversation.participants.add(self.user)
+        for body in ('Hi, "all"', 'line\nbreak'):
+            Message.objects.create(sender=self.user, conversation=self.conversation, message_body=body)
+        Message.objects.create(sender=self.user, conversation=Conversation.objects.create(), message_body='elsewhere')
+
+    def export(self, url):
+        request = APIRequestFactory().get(url)
+        force_authenticate(request, user=self.user)
+        response = MessageViewSet.as_view({'get': 'export'})(request)
+        self.assertTrue(response.streaming)
+        return b''.join(response.streaming_content).decode()
+
+    def test_ndjson_streams_only_participant_messages(self):
+        rows = [json.loads(line) for line in self.export('/api/messages/export/').splitlines()]
+        self.assertEqual([row['message_body'] for row in rows], ['Hi, "all"', 'line\nbreak'])
+        self.assertEqual(rows[0]['conversation_id'], str(self.conversation.pk))
+        self.assertEqual(rows[0]['sender'], 'ada@example.com')
+
+    def test_csv(self):
+        rows = list(csv.DictReader(StringIO(self.export('/api/messages/export/?output=csv'))))
+        self.assertEqual([row['message_body'] for row in rows], ['Hi, "all"', 'line\nbreak'])
+
+    def test_one_query(self):
+        with self.assertNumQueries(1):
+            self.assertEqual(len(''.join(export_messages(Message.objects.all())).splitlines()), 3)
+
+    def test_command(self):
+        out = StringIO()
+        call_command('export_messages', str(self.conversation.pk), format='csv', stdout=out)
+        self.assertEqual(len(list(csv.reader(StringIO(out.getvalue())))), 3)
@@ -1,16 +1,68 @@
+from django.db.models import Count, Prefetch
+from django.http import StreamingHttpResponse
 from rest_framework import viewsets, status
+from rest_framework.decorators import action
 from rest_framework.permissions import IsAuthenticated
+from rest_framework.response import Response
 from django_filters import rest_framework as filters
+from .export import EXPORT_FORMATS, export_messages
 from .models import Conversation, Message
-from .serializers import ConversationSerializer, MessageSerializer
+from .serializers import ConversationListSerializer, ConversationSerializer, MessageSerializer
 
 class ConversationViewSet(viewsets.ModelViewSet):
     queryset = Conversation.objects.all()
     serializer_class = ConversationSerializer
     permission_classes = [IsAuthenticated]
 
+    message_preview_size = 3
+    max_message_preview_size = 20
+
     def get_queryset(self):
-        return self.request.user.conversations.all()
+        # Annotate before filtering on participants, otherwise the count
+        # would only see the requesting user's row of the join.
+        queryset = Conversation.objects.annotate(
+            participant_total=Count('participants', distinct=True)
+        ).filter(
+            participants=self.request.user
+        ).prefetch_related('participants')
+        if self.action == 'list':
+            # Lists are ordered by activity and carry a count and a bounded
+            # preview, see paginate_queryset.
+            return queryset.with_summary()
+        return queryset.prefetch_related(
+            Prefetch('messages', queryset=Message.objects.select_related('sender')),
+        )
+
+    def get_serializer_class(self):
+        if self.action == 'list':
+            return ConversationListSerializer
+        return super().get_serializer_class()
+
+    def paginate_queryset(self, queryset):
+        page = super().paginate_queryset(queryset)
+        if self.action == 'list':
+            self.attach_recent_messages(queryset if page is None else page)
+        return page
+
+    def attach_recent_messages(self, conversations):
+        """
+        Set `recent_messages` to the last ?preview=N messages of each
+        conversation on the page, fetched in one query.
+        """
+        by_id = {}
+        for conversation in conversations:
+            conversation.recent_messages = []
+            by_id[conversation.pk] = conversation
+        messages = Message.objects.latest_per_conversation(list(by_id), self.get_preview_size())
+        for message in messages.select_related('sender'):
+            by_id[message.conversation_id].recent_messages.append(message)
+
+    def get_preview_size(self):
+        try:
+            size = int(self.request.query_params['preview'])
+        except (KeyError, ValueError):
+            return self.message_preview_size
+        return min(max(size, 0), self.max_message_preview_size)
 
 class MessageViewSet(viewsets.ModelViewSet):
     queryset = Message.objects.all()
@@ -18,4 +70,22 @@ class MessageViewSet(viewsets.ModelViewSet):
     permission_classes = [IsAuthenticated]
 
     def get_queryset(self):
-        return Message.objects.filter(conversation__participants=self.request.user)
+        return Message.objects.filter(
+            conversation__participants=self.request.user
+        ).select_related('sender')
+
+    @action(detail=False)
+    def export(self, request):
+        """
+        Stream the user's messages as NDJSON or ?output=csv without loading
+        them into memory. (?format is DRF's renderer override.)
+        """
+        output = request.query_params.get('output', 'ndjson')
+        if output not in EXPORT_FORMATS:
+            return Response({'detail': 'Unknown output format.'}, status=status.HTTP_400_BAD_REQUEST)
+        messages = self.filter_queryset(self.get_queryset())
+        response = StreamingHttpResponse(
+            export_messages(messages, output), content_type=EXPORT_FORMATS[output]
+        )
+        response['Content-Disposition'] = f'attachment; filename="messages.{output}"'
+        return response